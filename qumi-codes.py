@@ -1,10 +1,73 @@
 #!/usr/bin/env python3
 import argparse
+import ast
+import concurrent.futures
+import contextlib
+import contextvars
+import csv
+import functools
 import hashlib
+import inspect
+import itertools
+import json
 import logging
 import numpy as np
+import operator
+import os
 import pandas as pd
 import re
+import shutil
+import sqlite3
+import tempfile
+
+from src.common.logger_config import stage_metrics
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = feather = pq = None
+
+# Text columns are held in pandas' string dtype, backed by pyarrow when it is installed
+TEXT_DTYPE = pd.StringDtype('pyarrow' if feather is not None else 'python')
+
+# Declared dtypes of the NDC data, where every column not listed is text. Few-valued columns are categorical, and
+# missing values are real NAs throughout
+NDC_SCHEMA = {
+    'DOSAGEFORMNAME': 'category',
+    'ROUTENAME': 'category',
+    'LABELERNAME': 'category',
+    'DEASCHEDULE': 'category',
+    'NDC Row': 'int64',
+    'Package Count': 'int64',
+}
+
+# The only columns of the FDA NDC Directory files the codes are built from, the rest are never read
+FDA_PACKAGE_COLUMNS = ['PRODUCTNDC', 'NDCPACKAGECODE', 'PACKAGEDESCRIPTION']
+FDA_PRODUCT_COLUMNS = ['PRODUCTNDC', 'PROPRIETARYNAME', 'NONPROPRIETARYNAME', 'DOSAGEFORMNAME', 'ROUTENAME', 
+                       'APPLICATIONNUMBER', 'LABELERNAME', 'SUBSTANCENAME', 'ACTIVE_NUMERATOR_STRENGTH', 
+                       'ACTIVE_INGRED_UNIT', 'DEASCHEDULE']
+
+# How a missing value reads wherever one is written into a pre-hash code or a description. This is the str() of NaN
+# the codes have always been built with, so published QUMI Codes and descriptions stay the same
+MISSING_TEXT = "nan"
+
+# Casts every column to its declared dtype, keeping the str() text of each present value and a real NA for the rest
+def apply_schema(df, schema=NDC_SCHEMA):
+    for column in df.columns:
+        dtype = schema.get(column, TEXT_DTYPE)
+        if df[column].dtype == dtype:
+            continue
+        if dtype in ['category', TEXT_DTYPE]:
+            df[column] = df[column].astype(str).where(df[column].notna()).astype(dtype)
+        else:
+            df[column] = df[column].astype(dtype)
+    return df
+
+# Reads a value as text, spelling a missing one as MISSING_TEXT
+def as_text(value):
+    return MISSING_TEXT if pd.isna(value) else value
 
 # Checks if the filename is valid
 def valid_filename(s):
@@ -30,23 +93,92 @@ def ndc_eleven_digits(ndc):
             ndc = ndc[:11] + '0' + ndc[11:]
     return ndc
 
+# NDC layouts handled by ndc_eleven_digits_column: a pattern of digits (d) and dashes (-), and the position in the
+# original value of each character of the 5-4-2 result (-1 inserts a '0', -2 inserts a '-')
+NDC_LAYOUTS = [
+    ('ddddddddddd', [0, 1, 2, 3, 4, -2, 5, 6, 7, 8, -2, 9, 10]),
+    ('dddddddddddd', [1, 2, 3, 4, 5, -2, 6, 7, 8, 9, -2, 10, 11]),
+    ('dddd-dddd-dd', [-1, 0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11]),
+    ('ddddd-ddd-dd', [0, 1, 2, 3, 4, 5, -1, 6, 7, 8, 9, 10, 11]),
+    ('ddddd-dddd-d', [0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, -1, 11]),
+    ('ddddd-dddd-dd', [0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12]),
+]
+
+# Converts a whole column of NDC values to the 11-digit format, matching ndc_eleven_digits value for value
+def ndc_eleven_digits_column(ndcs, source='NDC'):
+    values = ndcs.to_numpy(dtype=object)
+    present = pd.notna(values)
+    # One row of 16 character codes per NDC, zero-padded past the end of the value
+    chars = np.array(values[present], dtype='U16').view(np.uint32).reshape(-1, 16)
+    # Classify every character (0 end, 1 digit, 2 dash, 3 other) and compare the classes eight at a time
+    char_classes = np.full(256, 3, dtype=np.uint8)
+    char_classes[0] = 0
+    char_classes[ord('0'):ord('9') + 1] = 1
+    char_classes[ord('-')] = 2
+    classes = char_classes[np.minimum(chars, 255)].view(np.uint64)
+    known = np.zeros(len(chars), dtype=bool)
+    formatted = np.zeros((len(chars), 13), dtype=np.uint32)
+    for layout, positions in NDC_LAYOUTS:
+        template = np.array([' d-'.index(c) for c in layout.ljust(16)], dtype=np.uint8).view(np.uint64)
+        rows = (classes[:, 0] == template[0]) & (classes[:, 1] == template[1])
+        if not rows.any():
+            continue
+        if rows.all():
+            formatted = chars[:, np.maximum(positions, 0)]
+        else:
+            formatted[rows] = chars[rows][:, np.maximum(positions, 0)]
+        for i, position in enumerate(positions):
+            if position < 0:
+                formatted[rows, i] = ord('0') if position == -1 else ord('-')
+        known |= rows
+    normalized = np.where(known, np.ascontiguousarray(formatted).view('U13').ravel().astype(object), values[present])
+    malformed_count = int((~known).sum() + (~present).sum())
+    if malformed_count:
+        # Log up to 10 example values to avoid noisy logs
+        samples = pd.unique(values[present][~known]).astype(str)[:10]
+        logging.warning(f"Found {malformed_count} {source} value(s) that are not a 10, 11 or 12-digit NDC. "
+                        f"Example(s): {', '.join(samples)}")
+        for i in np.flatnonzero(~known):
+            try:
+                normalized[i] = ndc_eleven_digits(normalized[i])
+            except (AttributeError, IndexError):
+                pass
+    result = values.copy()
+    result[present] = normalized
+    return pd.Series(result, index=ndcs.index, name=ndcs.name)
+
+# Precompiled patterns for reading the package description
+UNIT_DOSE_PATTERN = re.compile(r"\s*(\d*\.\d+|\d+)\s*([^\d\(\)\s][^\(\)]*?)\s*in\s*(\d+)\s*([^\d\(\)\s][^\(\)]*)")
+PACKAGE_PART_PATTERN = re.compile(r"(\d+(\.\d+)?)\s*([^\d\(\)]*)\s*in\s*(\d+)\s*([^\d\(\)]*)")
+PARENTHESES_PATTERN = re.compile(r'\([^)]*\)')
+# Parenthesized package NDCs, which neither parse can match into, so descriptions differing only by them parse the same
+PACKAGE_NDC_PATTERN = r'\(\d[\d-]*\)'
+
 # Processes the description to separate out useful information on the unit dosage
 def process_description(desc):
     parts = desc.split('/')
     last_part = parts[-1]
-    pattern = r"\s*(\d*\.\d+|\d+)\s*([^\d\(\)\s][^\(\)]*?)\s*in\s*(\d+)\s*([^\d\(\)\s][^\(\)]*)"
-    match = re.search(pattern, last_part.strip())
+    match = UNIT_DOSE_PATTERN.search(last_part.strip())
     if match:
         unit_num, unit, form_num, form = match.groups()
         return unit_num.strip(), unit.strip(), form_num.strip(), form.strip()
     else:
         return np.nan, np.nan, np.nan, np.nan
 
-# Assigns each of the separated unit dosage parts from the description to new columns
+# Parses the package description once into the unit dosage parts and the package count
+def parse_package_description(desc):
+    return process_description(desc) + (package_count(desc),)
+
+# Assigns each of the separated unit dosage parts and the package count from the description to new columns
 def unit_dosage(df, column='PACKAGEDESCRIPTION'):
     assert column in df.columns, f"{column} not in DataFrame"
-    new_desc = df[column].map(process_description)
-    df['DOSE_UNIT_VALUE'], df['DOSE_UNIT'], df['DOSE_QUANTITY'], df['DOSE'] = zip(*new_desc)
+    codes, descriptions = pd.factorize(df[column].str.replace(PACKAGE_NDC_PATTERN, '()', regex=True),
+                                       use_na_sentinel=False)
+    parsed = pd.DataFrame([parse_package_description(desc) for desc in descriptions],
+                          columns=['DOSE_UNIT_VALUE', 'DOSE_UNIT', 'DOSE_QUANTITY', 'DOSE', 'Package Count'])
+    parsed = parsed.astype({'Package Count': NDC_SCHEMA['Package Count']})
+    for name in parsed.columns:
+        df[name] = parsed[name].to_numpy()[codes]
     return df
 
 # Adjusts the processed data from the description to only utilize data that can be used to calculate unit dosages
@@ -77,80 +209,86 @@ def round_nine(n):
             result = float(rounded)
     return result
 
+# Correction rules for weight_sig_figs and mole_converter, kept as data so they can change without touching the code
+UNIT_CORRECTIONS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src', 'qumi_codes', 'data',
+                                     'unit-corrections.csv')
+UNIT_CORRECTION_PARTS = ["v", "an", "wc", "unit"]
+
+# Evaluates a correction such as "649.6" or "50/10.8", keeping whole numbers as ints like the literals they replace
+def correction_number(text):
+    operators = {ast.Add: operator.add, ast.Sub: operator.sub, ast.Mult: operator.mul, ast.Div: operator.truediv}
+    def evaluate(node):
+        if isinstance(node, ast.Constant) and type(node.value) in (int, float):
+            return node.value
+        if isinstance(node, ast.BinOp) and type(node.op) in operators:
+            return operators[type(node.op)](evaluate(node.left), evaluate(node.right))
+        raise ValueError(f"Invalid unit correction '{text}', only numbers and + - * / are allowed")
+    return evaluate(ast.parse(text.strip(), mode='eval').body)
+
+# Loads the versioned correction rules once and compiles them into an index keyed by (substance, part, value)
+@functools.lru_cache(maxsize=None)
+def load_unit_corrections(path=UNIT_CORRECTIONS_FILE):
+    version = None
+    rules = {}
+    with open(path, newline='') as f:
+        lines = []
+        for line in f:
+            if line.startswith('#'):
+                if line[1:].strip().startswith('version:'):
+                    version = line.split(':', 1)[1].strip()
+            else:
+                lines.append(line)
+    for row in csv.DictReader(lines):
+        part = row['part']
+        if part not in UNIT_CORRECTION_PARTS:
+            raise ValueError(f"Unknown unit correction part '{part}' for {row['substance']} in {path}")
+        value = row['value'] if part == "unit" else float(row['value'])
+        key = (row['substance'], part, value)
+        if key in rules:
+            raise ValueError(f"Duplicate unit correction for {key} in {path}")
+        rules[key] = (correction_number(row['corrected']), row['unit'] or None)
+    logging.debug(f"Loaded {len(rules)} unit corrections (version {version}) from {path}")
+    return version, rules
+
+# Builds the join table of the correction rules for one part
+@functools.lru_cache(maxsize=None)
+def unit_correction_table(part):
+    _, rules = load_unit_corrections()
+    matching = [(substance, value, corrected, unit) for (substance, rule_part, value), (corrected, unit) in rules.items()
+                if rule_part == part]
+    table = pd.DataFrame({
+        'substance': [rule[0] for rule in matching],
+        'value': pd.Series([rule[1] for rule in matching], dtype=object if part == "unit" else float),
+        'corrected': pd.Series([rule[2] for rule in matching], dtype=object),
+        'unit': pd.Series([rule[3] for rule in matching], dtype=object),
+    })
+    return table
+
+# Applies the correction rules for one part to whole columns of substances and values with a single join
+def apply_unit_corrections(substances, values, part):
+    values = pd.Series(values, dtype=object if part == "unit" else float).reset_index(drop=True)
+    lookup = pd.DataFrame({'substance': pd.Series(substances, dtype=object).reset_index(drop=True), 'value': values})
+    corrected = pd.merge(lookup, unit_correction_table(part), on=['substance', 'value'], how='left')
+    found = corrected['corrected'].notna().to_numpy()
+    result = values.to_numpy(dtype=object)
+    result[found] = corrected['corrected'].to_numpy()[found]
+    return result, corrected['unit'].to_numpy()
+
 # Accounts for discrepancies in values due to the number of significant figures taken in measurements
 def weight_sig_figs(std_name, n, part):
-    v_dict = {
-        "ACETAMINOPHEN": {650: 649.6},
-        "ACETIC ACID": {20.65: 20},
-        "APRACLONIDINE HYDROCHLORIDE": {5.75: 5},
-        "BENZOYL PEROXIDE; CLINDAMYCIN PHOSPHATE": {12: 10},
-        "BETAMETHASONE DIPROPIONATE; CLOTRIMAZOLE": {0.64: 0.5},
-        "BROMFENAC SODIUM": {1.035: 0.9},
-        "BUPIVACAINE HYDROCHLORIDE; EPINEPHRINE BITARTRATE": {0.0091: 0.005},
-        "CASPOFUNGIN ACETATE": {5: 50/10.8, 7: 70/10.8},
-        "CEFAZOLIN SODIUM": {225: 500/2.2},
-        "CLOBETASOL PROPIONATE": {0.4625: 0.5},
-        "DEFEROXAMINE MESYLATE": {95: 2000/(2000.04/95)},
-        "DEXTROSE MONOHYDRATE; POTASSIUM CHLORIDE; SODIUM CHLORIDE": {.745: .75, 2.25: 2, 2.98: 3},
-        "GEMCITABINE HYDROCHLORIDE": {1: 50/52.6, 38: 2000/52.6},
-        "KETOTIFEN FUMARATE": {0.35: 0.25},
-        "LEVOTHYROXINE SODIUM": {0.175: 0.18},
-        "METHYLPHENIDATE": {1.6: 15/9, 2.2: 20/9},
-        "NEOSTIGMINE METHYLSULFATE": {1.02: 1},
-        "OMEPRAZOLE MAGNESIUM": {20.6: 20},
-        "POTASSIUM CHLORIDE": {7.46: 7.45, 40: 3000/74.5, 600: 596, 750: 745}
-    }
-    an_dict = {
-        "CICLOPIROX": {0.96: 1},
-        "GEMCITABINE HYDROCHLORIDE": {26.3: (50/52.6)*26.3},
-        "POTASSIUM CHLORIDE": {1.54: 1.5},
-        "SODIUM PHOSPHATE, DIBASIC, UNSPECIFIED FORM; SODIUM PHOSPHATE, MONOBASIC, UNSPECIFIED FORM": {118 : 133},
-        "SULFACETAMIDE; SULFUR": {473.2: 473.2/473}
-    }
-    wc_dict = {
-        "ACETAMINOPHEN; DEXTROMETHORPHAN HYDROBROMIDE; DOXYLAMINE SUCCINATE": {236: 237},
-        "BACITRACIN": {28: 30, 28.4: 30},
-        "BACITRACIN ZINC": {28.35: 28},
-        "CASPOFUNGIN ACETATE": {10: 10.8},
-        "CHOLESTYRAMINE": {239.6: 239.4},
-        "CLOTRIMAZOLE": {28: 30, 28.35: 30},
-        "DEFEROXAMINE MESYLATE": {5.3: 500/95, 21.1: 21.053},
-        "DEXTROMETHORPHAN HYDROBROMIDE; GUAIFENESIN": {236: 237},
-        "GUAIFENESIN": {237: 236},
-        "HYDROCORTISONE": {28: 30, 28.35: 30, 28.4: 30, 118: 120, 553.6: 554},
-        "LIDOCAINE": {28: 30, 28.35: 30},
-        "LIDOCAINE HYDROCHLORIDE": {28.35: 28.3},
-        "METRONIDAZOLE": {59.7: 59},
-        "MICONAZOLE NITRATE": {28: 30},
-        "SUCRALFATE": {414: 420},
-        "SULFACETAMIDE SODIUM": {473: 480},
-        "SULFACETAMIDE SODIUM; SULFUR": {170.3: 170},
-        "TOBRAMYCIN SULFATE": {50: 30},
-        "HYDROCORTISONE ACETATE; LIDOCAINE HYDROCHLORIDE": {28.35: 28.3},
-        "UREA": {198.4: 198}
-    }
-    part_dict = {"v": v_dict, "an": an_dict, "wc": wc_dict}
-    new_value_dict = part_dict[part]
-    if std_name in new_value_dict:
-        if n in new_value_dict[std_name]:
-            n = new_value_dict[std_name][n]
+    _, rules = load_unit_corrections()
+    rule = rules.get((std_name, part, n))
+    if rule is not None:
+        n = rule[0]
     return n
 
 # Carries out moles and other substance dependent unit conversions
 def mole_converter(std_name, before_unit):
-    meq_dict = {"POTASSIUM CHLORIDE": 74.5, "SODIUM CHLORIDE": 58.5}
-    iu_dict = {"BLEOMYCIN SULFATE": [1/1000, "[USP'U]"], "HUMAN RHO(D) IMMUNE GLOBULIN" : [1/5000, "mg"]}
-    usp_dict = {"PETROLATUM": [1000, "mg"]}
+    _, rules = load_unit_corrections()
     divider = 1
-    if before_unit == "meq" and std_name in meq_dict:
-        divider = meq_dict[std_name]
-        before_unit = "mg"
-    elif before_unit == "[iU]" and std_name in iu_dict:
-        divider = iu_dict[std_name][0]
-        before_unit = iu_dict[std_name][1]
-    elif before_unit == "[USP'U]" and std_name in usp_dict:
-        divider = usp_dict[std_name][0]
-        before_unit = usp_dict[std_name][1]
+    rule = rules.get((std_name, "unit", before_unit))
+    if rule is not None:
+        divider, before_unit = rule
     return divider, before_unit
 
 # Processes all unit dosage related data to result in a standardized API (active pharmaceutical ingredient) amount
@@ -190,13 +328,89 @@ def process_unit(unit, value, unit_compare, unit_num, std_name):
             new_values.append(v)
     return "; ".join(new_units), "; ".join([str(x) for x in new_values])
 
-# Carries out process_unit
+# Pattern splitting an ingredient unit such as "mg/5mL" into its amounts and units
+INGREDIENT_UNIT_PATTERN = r"(\d*\.?\d*)?([^/]*)/(\d*\.?\d*)?([^/]*)"
+# Units converted to mg regardless of the substance, with their dividers
+WEIGHT_UNIT_DIVIDERS = {"g": 1000, "ug": 1/1000}
+
+# Carries out process_unit for every distinct combination of unit, strength, dose unit and substance at once
 def convert_units(df, strength_col='ACTIVE_NUMERATOR_STRENGTH', unit_col='ACTIVE_INGRED_UNIT', 
                   dose_unit_col='DOSE_UNIT', dose_unit_val_col='DOSE_UNIT_VALUE', 
                   generic_name_col='SUBSTANCENAME'):  
-    new_units_values = df.apply(lambda row: process_unit(row[unit_col], row[strength_col], row[dose_unit_col],
-                                                         row[dose_unit_val_col], row[generic_name_col]), axis=1)
-    df[unit_col], df[strength_col] = zip(*new_units_values)
+    columns = [unit_col, strength_col, dose_unit_col, dose_unit_val_col, generic_name_col]
+    combo_ids = df.groupby(columns, sort=False, dropna=False).ngroup().to_numpy()
+    first_rows = np.flatnonzero(~pd.Series(combo_ids).duplicated().to_numpy())
+    combos = df[columns].iloc[first_rows].set_axis(combo_ids[first_rows]).sort_index()
+
+    # One row per ingredient, pairing the ';'-separated units and strengths by position like zip
+    units = combos[unit_col].str.split(';').explode()
+    values = combos[strength_col].str.split(';').explode().astype(float)
+    units = pd.DataFrame({'combo': units.index, 'position': units.groupby(level=0).cumcount(), 'unit': units})
+    values = pd.DataFrame({'combo': values.index, 'position': values.groupby(level=0).cumcount(), 'value': values})
+    ingredients = pd.merge(units, values, on=['combo', 'position']).join(combos, on='combo')
+    ingredients = ingredients.reset_index(drop=True)
+    parts = ingredients['unit'].str.strip().str.extract('^' + INGREDIENT_UNIT_PATTERN)
+    matched = parts[1].notna().to_numpy()
+    ingredients['new_unit'] = ingredients['unit']
+    ingredients['new_value'] = ingredients['value'].astype(object)
+
+    # Scales the strength of every parsed ingredient to mg per dose unit. Corrections and dividers may be ints, and a
+    # result that stays an int all the way through is written without a decimal, so exact ints are tracked alongside
+    parsed = ingredients[matched]
+    parts = parts[matched]
+    std_names = parsed[generic_name_col].tolist()
+    v, _ = apply_unit_corrections(std_names, parsed['value'], "v")
+    exact_int = np.array([isinstance(n, int) for n in v], dtype=bool)
+    v = v.astype(float)
+    before_unit = parts[1].to_numpy(dtype=object)
+    after_unit = parts[3].to_numpy(dtype=object)
+    mole_divider, new_unit = apply_unit_corrections(std_names, before_unit, "unit")
+    converted = pd.notna(new_unit)
+    divider = np.where(converted, mole_divider, 1)
+    for unit, unit_divider in WEIGHT_UNIT_DIVIDERS.items():
+        divider[before_unit == unit] = unit_divider
+        new_unit[before_unit == unit] = "mg"
+        converted |= before_unit == unit
+    before_unit[converted] = new_unit[converted]
+    exact_int &= np.array([isinstance(n, int) for n in divider], dtype=bool)
+    divider = divider.astype(float)
+    weight_converter = np.ones(len(parsed))
+    weighed = (parsed[dose_unit_col] == parts[3]).to_numpy()
+    weighed[weighed] = parsed[dose_unit_val_col][weighed].astype(float).to_numpy() != 0
+    converter, _ = apply_unit_corrections(np.array(std_names, dtype=object)[weighed],
+                                          parsed[dose_unit_val_col][weighed].astype(float), "wc")
+    weight_converter[weighed] = converter.astype(float)
+    exact_int[weighed] &= np.array([isinstance(n, int) for n in converter], dtype=bool)
+    after_unit[weighed] = ""
+    before_num_divider = np.ones(len(parsed))
+    has_before_num = parts[0].fillna("").to_numpy(dtype=bool)
+    before_num_divider[has_before_num] = parts[0][has_before_num].astype(float)
+    after_num_divider = np.ones(len(parsed))
+    has_after_num = parts[2].fillna("").to_numpy(dtype=bool)
+    after_num, _ = apply_unit_corrections(np.array(std_names, dtype=object)[has_after_num],
+                                          parts[2][has_after_num].astype(float), "an")
+    after_num_divider[has_after_num] = 1/after_num.astype(float)
+    exact_int &= ~has_before_num & ~has_after_num
+    divider *= before_num_divider * after_num_divider
+    scaled = (v * divider * weight_converter).tolist()
+    scaled = [int(n) if is_int else n for n, is_int in zip(scaled, exact_int.tolist())]
+    ingredients.loc[matched, 'new_unit'] = before_unit + "/" + after_unit
+    ingredients.loc[matched, 'new_value'] = pd.Series([round_nine(round(n, 2)) for n in scaled], dtype=object).values
+
+    # Folds the ingredients back into the "; "-joined form, one ingredient position at a time
+    new_units = pd.Series(np.nan, index=combos.index, dtype=object)
+    new_values = pd.Series(np.nan, index=combos.index, dtype=object)
+    for position, ingredient in ingredients.groupby('position'):
+        ingredient = ingredient.set_index('combo')
+        ingredient_values = ingredient['new_value'].map(str)
+        if position == 0:
+            new_units[ingredient.index] = ingredient['new_unit']
+            new_values[ingredient.index] = ingredient_values
+        else:
+            new_units[ingredient.index] = new_units[ingredient.index] + "; " + ingredient['new_unit']
+            new_values[ingredient.index] = new_values[ingredient.index] + "; " + ingredient_values
+    df[unit_col] = new_units.to_numpy()[combo_ids]
+    df[strength_col] = new_values.to_numpy()[combo_ids]
     return df
 
 # Removes the straggling decimal from when the RXCUI column converted from float to string
@@ -236,7 +450,7 @@ def route_to_dosage(row):
     if (row['DOSAGEFORMNAME2'] == "INJECTION" or (row['ROUTENAME2'] in injection_routes) or 
         row['DOSE'] == "INJECTION"):
         return "INJECTABLE"
-    elif "INHALATION" in row['ROUTENAME2']:
+    elif row['ROUTENAME2'] is not None and "INHALATION" in row['ROUTENAME2']:
         return "INHALANT"
     elif row["ROUTENAME2"] in drops_routes:
         return drops_routes[row["ROUTENAME2"]]
@@ -246,12 +460,10 @@ def route_to_dosage(row):
 # Extract the parts of the package description to calculate the package count
 def extract_parts(description):
     sections = description.split(" / ")
-    pattern = r"(\d+(\.\d+)?)\s*([^\d\(\)]*)\s*in\s*(\d+)\s*([^\d\(\)]*)"
-    remove_parentheses_pattern = r'\([^)]*\)'
     results = []
     for section in sections:
-        section_without_parentheses = re.sub(remove_parentheses_pattern, '', section)
-        match = re.match(pattern, section_without_parentheses)
+        section_without_parentheses = PARENTHESES_PATTERN.sub('', section)
+        match = PACKAGE_PART_PATTERN.match(section_without_parentheses)
         if match:
             results.append([match.group(1), match.group(3).strip(), match.group(4), match.group(5).strip()])
     return results
@@ -276,67 +488,213 @@ def package_count(desc):
         else:
             break
         i += 1
-    return str(count)
+    return count
 
-# Strategically eliminates duplicate NDC rows with different RXCUI
+# Strategically eliminates duplicate NDC rows with different RXCUI, keeping the row whose code is shared by the most
+# rows (the first of those on ties) and returning one row per NDC in NDC order
 def rxcui_chooser(df, col):
-    col_counts = df[col].value_counts().to_dict()
-    count_name = col + '_Counts'
-    df[count_name] = df[col].apply(lambda x: col_counts[x])
-    df = df.sort_values(['NDC', count_name], ascending = [True, False])
-    df = df.drop_duplicates(subset = 'NDC', keep = 'first')
-    return df
+    counts = df.groupby(col, sort=False, dropna=False)[col].transform('size').to_numpy()
+    ndc_codes, ndcs = pd.factorize(df['NDC'], sort=True)
+    most = pd.Series(counts).groupby(ndc_codes).transform('max').to_numpy()
+    candidates = np.flatnonzero(counts == most)
+    chosen = candidates[~pd.Series(ndc_codes[candidates]).duplicated().to_numpy()]
+    rows = np.empty(len(ndcs), dtype=np.int64)
+    rows[ndc_codes[chosen]] = chosen
+    return df.iloc[rows].reset_index(drop=True)
 
-# Helps fix RXCUI ambiguity and fill in missing data
-def fix_ambiguity(df, name):
-    rxcui_two_counts = df['RXCUI2'].value_counts().to_dict()
-    rxcui_two_counts["nan"] = 0
-    df['RXCUI2_Counts'] = df['RXCUI2'].apply(lambda x: rxcui_two_counts[x])
-    if name != 'SUBSTANCENAME':
-        df[name] = df[name].apply(lambda x: x.lower())
-    df_unique = df.sort_values('RXCUI2_Counts', ascending=False).drop_duplicates(subset=['Code Dosage', name])
-    df = df.drop('RXCUI2', axis=1)
-    df = df.drop('RXCUI2_Counts', axis=1)
-    df = pd.merge(df, df_unique[['Code Dosage', name, 'RXCUI2', 'RXCUI2_Counts']], on=['Code Dosage', name], 
-                  how='left')
-    return df
+# Converts RXCUI text to integers, with -1 for a missing RXCUI
+def rxcui_integers(rxcuis):
+    return rxcuis.astype('Int64').to_numpy(dtype=np.int64, na_value=-1)
 
-# Ensures end case ambiguous RXCUI with a last digit of 9 are properly adjusted
-def rxcui_nine(row):
-    if row['RXCUI'][-1] == "9" and (int(row['RXCUI'][:-1]) + 1) != int(row['RXCUI2'][:-1]):
-        return row['RXCUI']
-    return row['RXCUI2']
-
-# Ensures ambiguous RXCUI within a range of 10 can be accounted for
-def rxcui_two(rxcui):
-    if rxcui != "nan":
-        rxcui = rxcui[:-1]
-    return rxcui
+# Helps fix RXCUI ambiguity and fill in missing data: every row of a group takes the RXCUI most common across all rows.
+# Ties go to the row a descending quicksort of the counts puts first, the order the codes have always been built with
+def fix_ambiguity(rxcuis, groups):
+    counts = pd.Series(rxcuis).groupby(rxcuis).transform('size').to_numpy()
+    counts[rxcuis < 0] = 0
+    order = pd.Series(counts).sort_values(ascending=False).index.to_numpy()
+    rank = np.empty(len(order), dtype=np.int64)
+    rank[order] = np.arange(len(order))
+    best = pd.Series(rank).groupby([groups[column].to_numpy() for column in groups.columns], sort=False, 
+                                   dropna=False).transform('min').to_numpy()
+    return rxcuis[order[best]]
 
 # Standardizes the formatting of the 'DFG' column
 def dfg_std(dfg):
     if dfg.find(" Product") > -1:
         dfg = dfg[:-8]
-    if dfg != "nan":
-        dfg = dfg.upper()
-    return dfg
+    return dfg.upper()
 
 # Standardizes the formatting for the 'Dosage Form' column
 def dosage_form_std(row):
     df_list = ["Injectable Solution", "Injectable Suspension", "Injection"]
-    if row['DF'] in df_list or row['DF'] == "nan":
-        return row['DOSE'].title()
+    if row['DF'] is None or row['DF'] in df_list:
+        return as_text(row['DOSE']).title()
     return row['DF']
 
 # Helps specify the descriptions given by RxNorm further by replacing the attribute found in the 'DF' column
 def replace_df(row):
     result = row['Description']
-    if result == "nan":
-        return "nan"
-    elif row['DF'] != row['Dosage Form']:
-        result = result.replace(row['DF'], row['Dosage Form'])
+    if result is None:
+        return None
+    elif as_text(row['DF']) != row['Dosage Form']:
+        result = result.replace(as_text(row['DF']), row['Dosage Form'])
     return result
 
+# Indexes the refinement query relies on, each led by the columns it filters on and covering the columns it reads
+RXNORM_INDEXES = {
+    "RXNREL": ["SAB", "RELA", "RXCUI1", "RXCUI2"],
+    "RXNCONSO": ["SAB", "TTY", "RXCUI", "STR"],
+}
+
+# Maps each RXCUI to its dose form, dose form group and description, taking the first row by rowid at every step
+RXNORM_REFINEMENT_QUERY = """
+WITH rels AS (
+    SELECT p.RXCUI,
+        (SELECT RXCUI2 FROM RXNREL WHERE SAB = 'RXNORM' AND RELA = 'dose_form_of' AND RXCUI1 = p.RXCUI
+         ORDER BY rowid LIMIT 1) AS DF_RXCUI,
+        (SELECT RXCUI2 FROM RXNREL WHERE SAB = 'RXNORM' AND RELA = 'tradename_of' AND RXCUI1 = p.RXCUI
+         ORDER BY rowid LIMIT 1) AS TRADENAME_RXCUI
+    FROM temp.refinement_rxcui p
+), groups AS (
+    SELECT rels.*,
+        (SELECT RXCUI2 FROM RXNREL WHERE SAB = 'RXNORM' AND RELA = 'inverse_isa' AND RXCUI1 = rels.DF_RXCUI
+         ORDER BY rowid LIMIT 1) AS DFG_RXCUI
+    FROM rels
+)
+SELECT RXCUI,
+    (SELECT STR FROM RXNCONSO WHERE SAB = 'RXNORM' AND TTY = 'DF' AND RXCUI = groups.DF_RXCUI
+     ORDER BY rowid LIMIT 1) AS DF,
+    (SELECT STR FROM RXNCONSO WHERE SAB = 'RXNORM' AND TTY = 'DFG' AND RXCUI = groups.DFG_RXCUI
+     ORDER BY rowid LIMIT 1) AS DFG,
+    COALESCE(
+        (SELECT STR FROM RXNCONSO WHERE SAB = 'RXNORM' AND TTY = 'SBD' AND RXCUI = groups.TRADENAME_RXCUI
+         ORDER BY rowid LIMIT 1),
+        (SELECT STR FROM RXNCONSO WHERE SAB = 'RXNORM' AND TTY = 'SBD' AND RXCUI = groups.RXCUI
+         ORDER BY rowid LIMIT 1),
+        (SELECT STR FROM RXNCONSO WHERE SAB = 'RXNORM' AND TTY = 'SCD' AND RXCUI = groups.RXCUI
+         ORDER BY rowid LIMIT 1)
+    ) AS Description
+FROM groups
+"""
+
+# Opens rxnorm.db once for every query, without creating an empty database when the file is missing
+def connect_rxnorm(path='data/rxnorm.db'):
+    return sqlite3.connect(f'file:{path}?mode=rw', uri=True)
+
+# Creates the refinement indexes unless an index with the same leading columns already exists
+def ensure_rxnorm_indexes(conn):
+    for table, columns in RXNORM_INDEXES.items():
+        existing = [[info[2] for info in conn.execute(f"PRAGMA index_info('{index[1]}')")]
+                    for index in conn.execute(f"PRAGMA index_list('{table}')")]
+        if any(indexed[:len(columns)] == columns for indexed in existing):
+            continue
+        name = f"idx_{table}_{'_'.join(columns)}".lower()
+        logging.debug(f"Creating index {name} on {table}...")
+        try:
+            conn.execute(f"CREATE INDEX {name} ON {table} ({', '.join(columns)})")
+            conn.commit()
+        except sqlite3.OperationalError as e:
+            logging.warning(f"Could not create index {name} on {table} ({e}), the refinement query will be slower")
+
+# Retrieves the DF, DFG and description for the given RXCUIs in a single query
+def rxnorm_refinement(conn, rxcuis):
+    conn.execute("CREATE TEMP TABLE refinement_rxcui (RXCUI TEXT PRIMARY KEY)")
+    try:
+        conn.executemany("INSERT OR IGNORE INTO temp.refinement_rxcui VALUES (?)", ((rxcui,) for rxcui in rxcuis))
+        refinement = pd.read_sql_query(RXNORM_REFINEMENT_QUERY, conn)
+        return refinement.where(refinement.notna())
+    finally:
+        conn.execute("DROP TABLE temp.refinement_rxcui")
+
+# Bumped whenever the extracted tables or the refinement query change, so stale caches are rebuilt
+RXNORM_EXTRACT_VERSION = 1
+RXNORM_EXTRACT_TABLES = ["NDC", "refinement"]
+
+# Fingerprints a file by size, modification time and SHA-256, reusing a known hash if size and mtime still match
+def file_fingerprint(path, known=None):
+    stat = os.stat(path)
+    fingerprint = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+    if known and known.get('size') == stat.st_size and known.get('mtime_ns') == stat.st_mtime_ns:
+        fingerprint['sha256'] = known['sha256']
+        return fingerprint
+    content_hash = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            content_hash.update(chunk)
+    fingerprint['sha256'] = content_hash.hexdigest()
+    return fingerprint
+
+# Extracts the NDC table and the refinement data for every RXCUI it contains from rxnorm.db
+def extract_rxnorm(path):
+    logging.debug("Retrieving the NDC table from rxnorm.db...")
+    try:
+        conn = connect_rxnorm(path)
+        ndc_table = pd.read_sql_query("SELECT * FROM NDC", conn)
+    except:
+        logging.error("'rxnorm.db' not found, ensure it is in the data subdirectory and named the same")
+        raise
+    logging.debug("Done")
+    logging.debug("Querying the DF, DFG and description of each RXCUI from RXNREL and RXNCONSO...")
+    try:
+        ensure_rxnorm_indexes(conn)
+        refinement = rxnorm_refinement(conn, ndc_table['RXCUI'].astype(str).apply(rxcui_std).unique())
+    except:
+        logging.error("Querying unsuccessful, ensure the full 'rxnorm.db' is still in the data subdirectory")
+        raise
+    finally:
+        conn.close()
+    logging.debug("Done")
+    return ndc_table, refinement
+
+# Loads the RxNorm extract from its Feather cache, rebuilding the cache whenever rxnorm.db has changed
+def load_rxnorm_extract(path='data/rxnorm.db', cache_dir='data/rxnorm-cache', use_cache=True):
+    if not use_cache:
+        return extract_rxnorm(path)
+    if feather is None:
+        logging.info("pyarrow is not installed, extracting from rxnorm.db without caching")
+        return extract_rxnorm(path)
+    manifest_file = os.path.join(cache_dir, 'manifest.json')
+    try:
+        with open(manifest_file) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        manifest = {}
+    try:
+        fingerprint = file_fingerprint(path, manifest.get('rxnorm.db'))
+    except:
+        logging.error("'rxnorm.db' not found, ensure it is in the data subdirectory and named the same")
+        raise
+    if manifest.get('version') == RXNORM_EXTRACT_VERSION and manifest['rxnorm.db']['sha256'] == fingerprint['sha256']:
+        logging.debug("Loading the cached RxNorm extract...")
+        try:
+            ndc_table, refinement = [feather.read_table(os.path.join(cache_dir, f'{table}.feather'), 
+                                                        memory_map=True).to_pandas()
+                                     for table in RXNORM_EXTRACT_TABLES]
+        except Exception as e:
+            logging.warning(f"Could not read the cached RxNorm extract ({e}), rebuilding it")
+        else:
+            if manifest['rxnorm.db'] != fingerprint:
+                manifest['rxnorm.db'] = fingerprint
+                with open(manifest_file, 'w') as f:
+                    json.dump(manifest, f, indent=2)
+            logging.debug("Done")
+            return ndc_table, refinement.where(refinement.notna())
+    else:
+        logging.info("rxnorm.db has changed since the last run, rebuilding the cached RxNorm extract...")
+    ndc_table, refinement = extract_rxnorm(path)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        if os.path.exists(manifest_file):
+            os.remove(manifest_file)
+        for table, frame in zip(RXNORM_EXTRACT_TABLES, [ndc_table, refinement]):
+            feather.write_feather(frame, os.path.join(cache_dir, f'{table}.feather'), compression='uncompressed')
+        manifest = {'version': RXNORM_EXTRACT_VERSION, 'rxnorm.db': file_fingerprint(path, fingerprint)}
+        with open(manifest_file, 'w') as f:
+            json.dump(manifest, f, indent=2)
+    except Exception as e:
+        logging.warning(f"Could not write the cached RxNorm extract ({e}), the next run will query rxnorm.db again")
+    return ndc_table, refinement
+
 # Enforces that the Dosage Routes are viable classes
 def use_dfg(row):
     dfg_list = ['BUCCAL', 'CHEWABLE', 'DENTAL', 'DISINTEGRATING ORAL', 'DRUG IMPLANT', 'GRANULE', 'INHALANT', 
@@ -345,7 +703,7 @@ def use_dfg(row):
                 'ORAL GEL', 'ORAL LIQUID', 'ORAL OINTMENT', 'ORAL PASTE', 'ORAL POWDER', 'ORAL SPRAY', 'OTIC', 
                 'PASTE', 'PELLET', 'PILL', 'PYELOCALYCEAL', 'RECTAL', 'SHAMPOO', 'SOAP', 'SUBLINGUAL', 
                 'TOOTHPASTE', 'TOPICAL', 'TRANSDERMAL', 'URETHRAL', 'VAGINAL']
-    if row['DFG'] != "nan" and row['Dosage Route'] not in dfg_list:
+    if row['DFG'] is not None and row['Dosage Route'] not in dfg_list:
         row['Dosage Route'] = row['DFG']
     return row['Dosage Route']
 
@@ -356,7 +714,7 @@ def use_df(row):
     dose_list = ["AMPULE", "SYRINGE"]
     dosage_form_list = ["Auto-Injector"]
     brand_list = ["solu-medrol"]
-    if rxcuish == "nan":
+    if rxcuish is None:
         rxcuish = row['SUBSTANCENAME']
     if row['DOSE'] in dose_list:
         specifier = row['DOSE']
@@ -364,7 +722,7 @@ def use_df(row):
         specifier += row['Dosage Form']
     if row['PROPRIETARYNAME'] in brand_list:
         specifier += row['PROPRIETARYNAME']
-    return rxcuish + row['Dosage Route'] + row['ACTIVE_NUMERATOR_STRENGTH'] + specifier
+    return as_text(rxcuish) + as_text(row['Dosage Route']) + row['ACTIVE_NUMERATOR_STRENGTH'] + specifier
 
 # Standardizes the formatting of the 'API Measure' column
 def api_measure_std(unit):
@@ -376,13 +734,13 @@ def api_measure_std(unit):
 
 # Makes descriptions for NDCs without preformatted descriptions in RxNorm
 def make_desc(row):
-    np_name = row['NONPROPRIETARYNAME'].lower()
+    np_name = as_text(row['NONPROPRIETARYNAME']).lower()
     np_name = np_name.replace(", and", ",")
     np_name = np_name.replace(" and", ",")
     np_name = np_name.replace(", ", ",")
     np_names = sorted(np_name.split(","))
     use_np_names = False
-    substances = row['SUBSTANCENAME'].lower().split("; ")
+    substances = as_text(row['SUBSTANCENAME']).lower().split("; ")
     nums = row['ACTIVE_NUMERATOR_STRENGTH'].split("; ")
     units = row['API Measure'].split("; ")
     amount = ""
@@ -403,9 +761,9 @@ def make_desc(row):
             units[i] = " " + units[i]
         amount += nums[i] + units[i] + "; "
     amount = amount[:-2]
-    d_f = row['Dosage Form']
-    p_name = row['PROPRIETARYNAME'].title()
-    if p_name.lower() == row['NONPROPRIETARYNAME'].lower():
+    d_f = as_text(row['Dosage Form'])
+    p_name = as_text(row['PROPRIETARYNAME']).title()
+    if p_name.lower() == as_text(row['NONPROPRIETARYNAME']).lower():
         p_name = ""
     else:
         p_name = " [" + p_name + "]"
@@ -436,12 +794,60 @@ def get_qsrx_code_from_gcp(generic_code_plus):
     result = encode_custom_alphanumeric(gcp_hex)
     return result
 
+# The alphabet of QUMI Codes, with a trailing empty symbol used to pad codes shorter than 7 characters
+QUMI_ALPHABET = np.array(list('0123456789abcdefghjkmnpqrstvwxyz') + [''])
+QUMI_CODE_LENGTH = 7
+
+# Encodes 40-bit integers the same way as encode_custom_alphanumeric, for a whole array at once
+def encode_custom_alphanumeric_array(gcp_ints):
+    gcp_ints = np.asarray(gcp_ints, dtype=np.uint64)
+    shifts = np.arange(35, -1, -5, dtype=np.uint64)
+    digits = ((gcp_ints[:, None] >> shifts) & np.uint64(31)).astype(np.intp)
+    significant = digits != 0
+    first = np.where(significant.any(axis=1), significant.argmax(axis=1), len(shifts) - 1)
+    positions = first[:, None] + np.arange(QUMI_CODE_LENGTH)
+    symbols = np.where(positions < len(shifts), 
+                       np.take_along_axis(digits, np.minimum(positions, len(shifts) - 1), axis=1), 
+                       len(QUMI_ALPHABET) - 1)
+    return np.ascontiguousarray(QUMI_ALPHABET[symbols]).view(f'U{QUMI_CODE_LENGTH}').ravel()
+
+# Makes the short codes for many long codes, hashing each distinct long code once
+def get_qsrx_codes_from_gcps(generic_codes_plus):
+    codes, uniques = pd.factorize(generic_codes_plus, use_na_sentinel=False)
+    gcp_ints = [int.from_bytes(hashlib.shake_256(gcp.encode('utf-8')).digest(5), 'big') for gcp in uniques]
+    unique_codes = encode_custom_alphanumeric_array(gcp_ints).astype(object)
+    collisions = pd.DataFrame({'QUMI Code': unique_codes, 'Pre-Hash Code': uniques})
+    collisions = collisions[collisions['QUMI Code'].duplicated(keep=False)].sort_values(['QUMI Code', 'Pre-Hash Code'])
+    qumi_codes = pd.Series(unique_codes[codes], name='QUMI Code')
+    if isinstance(generic_codes_plus, pd.Series):
+        qumi_codes.index = generic_codes_plus.index
+    return qumi_codes, collisions.reset_index(drop=True)
+
+# Rewrite rules of the display fields, each compiled into one alternation. Every key starts with a character found
+# nowhere else in the keys and no replacement creates a key, so matching the alternation left to right replaces exactly
+# what replacing the keys one after another in this order did
+DEA_NUMBERS = {"CII": "2", "CIII": "3", "CIV": "4", "CV": "5", "CVI": "6"}
+DEA_PATTERN = re.compile("|".join(DEA_NUMBERS))
+UNIT_SPELLINGS = {"ML": "mL", "MG": "mg", "MCG": "mcg", "MEQ": "mEq"}
+UNIT_PATTERN = re.compile("|".join(UNIT_SPELLINGS))
+HCL_PATTERN = re.compile("HYDROCHLORIDE|Hydrochloride|hydrochloride|Hcl")
+# Whole values displayed as HCl in every output column
+HCL_VALUES = ["HYDROCHLORIDE", "hydrochloride"]
+
+# Description units between a space or slash and a space, slash or semicolon, and the description reorderings
+DESCRIPTION_UNIT_PATTERN = re.compile(r'[ /](?:ML|MG|MCG|MEQ)[ /;]')
+SIZE_FIRST_PATTERN = re.compile(r'^(\d+(?:\.\d+)?+\s+\w+)\s+(.*\d+\s+\w+/\w+)(.*)')
+HOURS_FIRST_PATTERN = re.compile(r'^((?:3-Bead+\s)?+\d+\s+HR)\s+(.*mg)(.*)')
+
+# Applies a per-value function once per distinct value of a column, keeping missing values missing
+def map_unique(values, func, workers=1):
+    codes, uniques = pd.factorize(values)
+    mapped = apply_rows(pd.Series(uniques, dtype=object), func, workers).to_numpy(dtype=object)
+    return pd.Series(np.append(mapped, None)[codes], index=values.index, dtype=object)
+
 # Standardizes the formatting of the DEA Schedule
 def dea_std(dea):
-    dea_dict = {"CII": "2", "CIII": "3", "CIV": "4", "CV": "5", "CVI": "6"}
-    for key in dea_dict:
-        dea = dea.replace(key, dea_dict[key])
-    return dea
+    return DEA_PATTERN.sub(lambda match: DEA_NUMBERS[match.group()], dea)
 
 # Standardizes the formatting of the strength
 def strength_std(strength):
@@ -455,39 +861,32 @@ def strength_std(strength):
 
 # Standardizes the formatting of the measure
 def measure_std(unit):
-    unit_dict = {"ML": "mL", "MG": "mg", "MCG": "mcg", "MEQ": "mEq"}
-    for key in unit_dict:
-        unit = unit.replace(key, unit_dict[key])
-    return unit
+    return UNIT_PATTERN.sub(lambda match: UNIT_SPELLINGS[match.group()], unit)
 
 # Standardizes the formatting of HCl.
 def to_hcl(desc):
-    desc = desc.replace("HYDROCHLORIDE", "HCl")
-    desc = desc.replace("Hydrochloride", "HCl")
-    desc = desc.replace("hydrochloride", "HCl")
-    desc = desc.replace("Hcl", "HCl")
-    return desc
+    return HCL_PATTERN.sub("HCl", desc)
 
 # Standardizes the formatting of the description
 def description_std(desc):
     desc = to_hcl(desc)
     desc = desc[0].capitalize() + desc[1:]
     desc = desc.replace(".0 ", " ")
-    unit_dict = {"ML": "mL", "MG": "mg", "MCG": "mcg", "MEQ": "mEq"}
-    for u in unit_dict:
-        pre_list = [" ", "/"]
-        for pre in pre_list:
-            post_list = [" ", "/", ";"]
-            for post in post_list:
-                upper_unit = pre + u + post
-                desc = desc.replace(upper_unit, pre + unit_dict[u] + post)
-    pattern = r'^(\d+(?:\.\d+)?+\s+\w+)\s+(.*\d+\s+\w+/\w+)(.*)'
-    match = re.search(pattern, desc)
+    # A unit is only rewritten between these separators, and an occurrence sharing a separator with the one before it
+    # is left alone, so the replacements only run when there is a unit to rewrite
+    if DESCRIPTION_UNIT_PATTERN.search(desc):
+        for u in UNIT_SPELLINGS:
+            pre_list = [" ", "/"]
+            for pre in pre_list:
+                post_list = [" ", "/", ";"]
+                for post in post_list:
+                    upper_unit = pre + u + post
+                    desc = desc.replace(upper_unit, pre + UNIT_SPELLINGS[u] + post)
+    match = SIZE_FIRST_PATTERN.search(desc)
     if match:
         size, info, extra = match.groups()
         desc = info + " " + size + extra
-    pattern = r'^((?:3-Bead+\s)?+\d+\s+HR)\s+(.*mg)(.*)'
-    match = re.search(pattern, desc)
+    match = HOURS_FIRST_PATTERN.search(desc)
     if match:
         time, info, extra = match.groups()
         desc = info + " " + time + extra
@@ -499,238 +898,962 @@ def description_std(desc):
     desc = "; ".join(desc_parts)
     return desc
 
-def validate_csv(new_data_csv, reference_csv='universal-med-ids.csv'):
+# The process pools of the run in progress by worker count, or None outside of a run
+RUN_POOLS = contextvars.ContextVar('RUN_POOLS', default=None)
+
+# Shares one process pool per worker count across every stage of a run and shuts them down when the run ends, so no
+# idle worker processes outlive it. A run started within another shares the pools of the outer one
+@contextlib.contextmanager
+def worker_pools():
+    if RUN_POOLS.get() is not None:
+        yield
+        return
+    token = RUN_POOLS.set({})
     try:
-        new_data = pd.read_csv(new_data_csv)
-    except:
-        logging.error(f"'{new_data_csv}' not found, ensure it is in the directory and named the same")
-        raise
-    reference  = pd.read_csv(reference_csv)
-    merged_df = pd.merge(reference, new_data, on='NDC', how='outer', suffixes=('_old', '_new'))
-
-    # Check for differences in QUMI Code
-    for index, row in merged_df.iterrows():
-        old_qumi = row['QUMI Code_old']
-        new_qumi = row['QUMI Code_new']
-        if pd.isna(old_qumi) and not pd.isna(new_qumi):
-            print(f"{row['NDC']}:\tNew NDC -> {new_qumi}\t{row['Description_new']} \t{row['Strength_new']} {row['Measure_new']}")
-        elif not pd.isna(old_qumi) and pd.isna(new_qumi):
-            print(f"{row['NDC']}:\t{old_qumi} -> NDC deprecated\t{row['Description_old']} \t{row['Strength_old']} {row['Measure_old']}")
-        elif old_qumi != new_qumi:
-            print(f"{row['NDC']}:\t{old_qumi} -> {new_qumi}\t{row['Description_new']} \t{row['Strength_new']} {row['Measure_new']}")
-        old_desc = row['Description_old']
-        new_desc = row['Description_new']
-        if (not pd.isna(old_qumi) or not pd.isna(new_qumi)) and old_desc != new_desc:
-            print(f"{row['NDC']}:\t{old_desc} -> {new_desc}")
-
-def main(operation, filename, log_level):
-    # Set up logging level
-    numeric_level = getattr(logging, log_level.upper(), None)
-    if not isinstance(numeric_level, int):
-        raise ValueError(f'Invalid log level: {log_level}')
-    logging.basicConfig(format='%(asctime)s %(name)s:%(levelname)s: %(message)s', level=numeric_level)
+        yield
+    finally:
+        pools = RUN_POOLS.get()
+        RUN_POOLS.reset(token)
+        for pool in pools.values():
+            pool.shutdown()
 
-    if operation == "validate":
-        validate_csv(filename)
+# Lends the run's process pool of a worker count, or one of its own outside of a run
+@contextlib.contextmanager
+def worker_pool(workers):
+    pools = RUN_POOLS.get()
+    if pools is None:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+            yield pool
         return
+    if workers not in pools:
+        pools[workers] = concurrent.futures.ProcessPoolExecutor(max_workers=workers)
+    yield pools[workers]
 
-    # Converting the NDC-inclusive data to pandas DataFrames
-    logging.info("Converting the NDC-inclusive data to pandas DataFrames...")
-    logging.debug("Retrieving 'package.csv'...")
-    try:
-        fda_package = pd.read_csv('data/package.csv')
-    except:
-        logging.error("'package.csv' not found, ensure it is in the data subdirectory and named the same")
-        raise
-    logging.debug("Done")
+# Applies a per-row (or per-value for a Series) function to one chunk inside a worker process
+def apply_chunk(func, chunk):
+    if isinstance(chunk, pd.DataFrame):
+        return chunk.apply(func, axis=1).tolist()
+    return chunk.apply(func).tolist()
+
+# Applies a pure per-row function, splitting the rows across worker processes and reassembling them in order.
+# Missing values reach the function as None
+def apply_rows(data, func, workers=1):
+    data = data.astype(object).where(data.notna(), None)
+    # Applying along the rows of an empty frame returns the empty frame rather than an empty column
+    if not len(data):
+        return pd.Series([], index=data.index, dtype=object)
+    if workers <= 1 or len(data) < workers:
+        return data.apply(func, axis=1) if isinstance(data, pd.DataFrame) else data.apply(func)
+    bounds = np.linspace(0, len(data), workers * 4 + 1).astype(int)
+    chunks = [data.iloc[start:end] for start, end in zip(bounds[:-1], bounds[1:]) if end > start]
+    with worker_pool(workers) as pool:
+        results = list(pool.map(apply_chunk, itertools.repeat(func), chunks))
+    return pd.Series(list(itertools.chain.from_iterable(results)), index=data.index, dtype=object)
+
+# Reads the FDA package and product data
+def load_fda_data(chunksize=None):
+    with stage_metrics.stage('load') as stage:
+        fda_package, fda_product = read_fda_data(chunksize)
+        stage['rows_out'] = len(fda_package) + len(fda_product)
+    return fda_package, fda_product
+
+# Reads the given columns of an FDA CSV as text, as chunks of rows when a chunk size is given and otherwise whole with
+# the pyarrow engine when it is installed
+def read_fda_csv(path, columns, chunksize=None):
+    if chunksize:
+        return pd.read_csv(path, usecols=columns, dtype=TEXT_DTYPE, chunksize=chunksize)
+    return [pd.read_csv(path, usecols=columns, dtype=TEXT_DTYPE, engine='pyarrow' if feather is not None else 'c')]
+
+# Spells strengths the way pandas reads a column of nothing but numbers, as floats, so reading them as text keeps the
+# codes built from them
+def strength_text(strengths):
+    numbers = pd.to_numeric(strengths.astype(object), errors='coerce')
+    if numbers.isna().any():
+        return strengths
+    return numbers.astype('float64').astype(str).astype(TEXT_DTYPE)
+
+# Fills in the strength and unit of products listing none
+def fill_fda_product(fda_product):
+    fda_product['ACTIVE_NUMERATOR_STRENGTH'] = fda_product['ACTIVE_NUMERATOR_STRENGTH'].fillna("1")
+    fda_product['ACTIVE_INGRED_UNIT'] = fda_product['ACTIVE_INGRED_UNIT'].fillna("mL/mL")
+    return fda_product
+
+# Separates the parts of kit package descriptions with "/" rather than "*"
+def fill_fda_package(fda_package):
+    return fda_package.assign(PACKAGEDESCRIPTION=fda_package['PACKAGEDESCRIPTION'].str.replace("*", "/", regex=False))
+
+# Reads the FDA package and product CSVs, keeping only the packages of a listed product and normalizing while reading
+def read_fda_data(chunksize=None):
     logging.debug("Retrieving 'product.csv'...")
     try: 
-        fda_product = pd.read_csv('data/product.csv')
+        fda_product = pd.concat(read_fda_csv('data/product.csv', FDA_PRODUCT_COLUMNS, chunksize), ignore_index=True)
     except:
         logging.error("'product.csv' not found, ensure it is in the data subdirectory and named the same")
         raise
+    fda_product = fill_fda_product(fda_product)
+    fda_product['ACTIVE_NUMERATOR_STRENGTH'] = strength_text(fda_product['ACTIVE_NUMERATOR_STRENGTH'])
     logging.debug("Done")
-    logging.debug("Retrieving the NDC table from rxnorm.db...")
+    logging.debug("Retrieving 'package.csv'...")
     try:
-        rxnorm_rxcui = pd.read_sql_table('NDC', 'sqlite:///data/rxnorm.db')
+        package_chunks = read_fda_csv('data/package.csv', FDA_PACKAGE_COLUMNS, chunksize)
     except:
-        logging.error("'rxnorm.db' not found, ensure it is in the data subdirectory and named the same")
+        logging.error("'package.csv' not found, ensure it is in the data subdirectory and named the same")
         raise
+    listed = fda_product['PRODUCTNDC'].to_numpy(dtype=object)
+    fda_package = []
+    for chunk in package_chunks:
+        fda_package.append(fill_fda_package(chunk[chunk['PRODUCTNDC'].astype(object).isin(listed)]))
+    fda_package = pd.concat(fda_package, ignore_index=True)
     logging.debug("Done")
-    logging.info("Data retrieval successful")
+    return fda_package, fda_product
 
-    # Making the datasets uniformly formatted
+# Formats the FDA and RxNorm data uniformly, keeping the first FDA row of each NDC and every distinct RxNorm row
+def format_data(fda_package, fda_product, rxnorm_rxcui):
     logging.info("Making these datasets uniformly formatted...")
-    logging.debug("Formatting the RxNorm NDC data...")
-    rxnorm_rxcui['NDC'] = rxnorm_rxcui['NDC'].apply(ndc_eleven_digits)
-    logging.debug("Done")
-    logging.debug("Formatting the FDA data...")
-    fda = pd.merge(fda_package, fda_product, on='PRODUCTNDC')
-    fda = fda.rename(columns={'NDCPACKAGECODE': 'NDC'})
-    fda['NDC'] = fda['NDC'].apply(ndc_eleven_digits)
-    fda = fda.drop_duplicates(subset='NDC', keep='first')
-    fda['PACKAGEDESCRIPTION'] = fda['PACKAGEDESCRIPTION'].apply(lambda x: x.replace("*", "/"))
-    fda['ACTIVE_NUMERATOR_STRENGTH'] = fda['ACTIVE_NUMERATOR_STRENGTH'].fillna(1)
-    fda['ACTIVE_INGRED_UNIT'] = fda['ACTIVE_INGRED_UNIT'].fillna("mL/mL")
-    logging.debug("Done")
+    with stage_metrics.stage('format', len(fda_package) + len(rxnorm_rxcui)) as stage:
+        logging.debug("Formatting the RxNorm NDC data...")
+        rxnorm_rxcui['NDC'] = ndc_eleven_digits_column(rxnorm_rxcui['NDC'], 'RxNorm NDC')
+        rxnorm_rxcui['RXCUI'] = rxnorm_rxcui['RXCUI'].astype(str).apply(rxcui_std)
+        rxnorm_rxcui = apply_schema(rxnorm_rxcui).drop_duplicates(keep='first')
+        logging.debug("Done")
+        logging.debug("Formatting the FDA data...")
+        fda_package = apply_schema(fda_package)
+        fda_product = apply_schema(fda_product)
+        fda = pd.merge(fda_package, fda_product, on='PRODUCTNDC')
+        fda = fda.rename(columns={'NDCPACKAGECODE': 'NDC'})
+        fda['NDC'] = ndc_eleven_digits_column(fda['NDC'], 'FDA NDC').astype(TEXT_DTYPE)
+        fda = fda.drop_duplicates(subset='NDC', keep='first')
+        logging.debug("Done")
+        stage['rows_out'] = len(fda) + len(rxnorm_rxcui)
     logging.info("Formatting complete")
+    return fda, rxnorm_rxcui
 
-    # Unifying the NDC-inclusive data
+# Joins the formatted FDA and RxNorm data into one row per NDC and RXCUI, in the order of the FDA rows
+def join_data(fda, rxnorm_rxcui):
     logging.info("Unifying the NDC-inclusive data...")
-    ndc_data = pd.merge(rxnorm_rxcui, fda, on='NDC', how='right')
-    ndc_data = ndc_data.astype(str) 
+    with stage_metrics.stage('unify', len(fda) + len(rxnorm_rxcui)) as stage:
+        ndc_data = pd.merge(rxnorm_rxcui, fda, on='NDC', how='right')
+        stage['rows_out'] = len(ndc_data)
     logging.info("Merging complete")
+    return ndc_data
 
+# Formats the FDA and RxNorm data uniformly and joins them into one row per NDC and RXCUI
+def unify_data(fda_package, fda_product, rxnorm_rxcui):
+    fda, rxnorm_rxcui = format_data(fda_package, fda_product, rxnorm_rxcui)
+    return join_data(fda, rxnorm_rxcui)
+
+# Derives the unit dosage and pre-ambiguity codes, which only depend on each row's own data
+def prepare_codes(ndc_data, workers=1):
     # Processing all unit dosage related data
     logging.info("Processing all unit dosage related data...")
-    ndc_data = unit_dosage(ndc_data)
-    ndc_data = adjust_units(ndc_data)
-    ndc_data = convert_units(ndc_data)
+    with stage_metrics.stage('unit dosage', len(ndc_data)) as stage:
+        ndc_data = unit_dosage(ndc_data)
+        ndc_data = adjust_units(ndc_data)
+        ndc_data = convert_units(ndc_data)
+        stage['rows_out'] = len(ndc_data)
     logging.info("Processing complete")
 
     # Cleaning up the remaining data to be utilizable for creating the codes
     logging.info("Cleaning up the remaining data to be utilizable for creating the codes...")
-    ndc_data['RXCUI'] = ndc_data['RXCUI'].apply(rxcui_std)
-    ndc_data['DOSAGEFORMNAME2'] = ndc_data['DOSAGEFORMNAME'].apply(dosage_form)
-    ndc_data['ROUTENAME2'] = ndc_data['ROUTENAME'].apply(route)
-    ndc_data = ndc_data.astype(str)
-    ndc_data['DOSE'] = ndc_data['DOSE'].apply(dose_simplified)
-    ndc_data['DOSAGEFORMNAME2'] = ndc_data.apply(route_to_dosage, axis=1)
-    ndc_data = ndc_data.astype(str)
-    ndc_data['RXCUI2'] = ndc_data['RXCUI']
-    ndc_data['Code Dosage'] = ndc_data['DOSAGEFORMNAME2'] + ndc_data['ACTIVE_NUMERATOR_STRENGTH']
-    ndc_data['Package Count'] = ndc_data['PACKAGEDESCRIPTION'].apply(package_count)
+    with stage_metrics.stage('cleanup', len(ndc_data)) as stage:
+        ndc_data['DOSAGEFORMNAME2'] = ndc_data['DOSAGEFORMNAME'].map(dosage_form, na_action='ignore')
+        ndc_data['ROUTENAME2'] = ndc_data['ROUTENAME'].map(route, na_action='ignore')
+        ndc_data['DOSE'] = ndc_data['DOSE'].map(dose_simplified, na_action='ignore')
+        ndc_data['DOSAGEFORMNAME2'] = apply_rows(ndc_data[['DOSAGEFORMNAME2', 'DOSE', 'ROUTENAME2']], route_to_dosage, 
+                                                 workers)
+        ndc_data['RXCUI2'] = ndc_data['RXCUI']
+        ndc_data['Code Dosage'] = ndc_data['DOSAGEFORMNAME2'].fillna(MISSING_TEXT) + \
+            ndc_data['ACTIVE_NUMERATOR_STRENGTH']
+        ndc_data['New Code'] = ndc_data['RXCUI2'].fillna(MISSING_TEXT) + ndc_data['Code Dosage']
+        ndc_data['NDC Row'] = ndc_data.groupby('NDC', sort=False).cumcount()
+        stage['rows_out'] = len(ndc_data)
     logging.info("Clean up complete")
+    return ndc_data
+
+# The only columns RXCUI ambiguity handling reads, so rows outside an incremental update can be carried as keys alone
+AMBIGUITY_COLUMNS = ['NDC', 'NDC Row', 'RXCUI', 'RXCUI2', 'Code Dosage', 'New Code', 'PROPRIETARYNAME', 'SUBSTANCENAME']
 
-    # Handling RXCUI ambiguity
+# Picks one row per NDC and settles ambiguous RXCUI, which depends on the counts across all rows
+def resolve_ambiguity(ndc_data):
     logging.info("Handling RXCUI ambiguity...")
-    ndc_data['New Code'] = ndc_data['RXCUI2'] + ndc_data['Code Dosage']
-    ndc_data = ndc_data.drop_duplicates(keep='first')
-    ndc_data = rxcui_chooser(ndc_data, 'New Code')
-    ndc_data_update = fix_ambiguity(ndc_data, 'PROPRIETARYNAME')
-    ndc_data_update = fix_ambiguity(ndc_data_update, 'SUBSTANCENAME')
-    ndc_data.reset_index(drop=True, inplace=True)
-    ndc_data_update.reset_index(drop=True, inplace=True)
-    fix_mask = (ndc_data['RXCUI'].str[-1] == '9') | (ndc_data['RXCUI'] == "nan")
-    ndc_data.loc[fix_mask] = ndc_data_update.loc[fix_mask]
-    ndc_data['RXCUI2'] = ndc_data.apply(rxcui_nine, axis=1)
-    ndc_data['RXCUI2'] = ndc_data['RXCUI2'].apply(rxcui_two)
-    ndc_data['New Code'] = ndc_data['RXCUI2'] + ndc_data['Code Dosage']
+    with stage_metrics.stage('ambiguity', len(ndc_data)) as stage:
+        ndc_data = rxcui_chooser(ndc_data, 'New Code')
+        ndc_data['PROPRIETARYNAME'] = ndc_data['PROPRIETARYNAME'].str.lower()
+        rxcui = rxcui_integers(ndc_data['RXCUI'])
+        rxcui_two = rxcui_integers(ndc_data['RXCUI2'])
+        fixed = fix_ambiguity(rxcui_two, ndc_data[['Code Dosage', 'PROPRIETARYNAME']])
+        fixed = fix_ambiguity(fixed, ndc_data[['Code Dosage', 'SUBSTANCENAME']])
+        # Only a missing RXCUI or one with a last digit of 9 is ambiguous, and a 9 keeps its own RXCUI unless the fix
+        # moved it into the next range of 10
+        nine = (rxcui >= 0) & (rxcui % 10 == 9)
+        rxcui_two = np.where(nine | (rxcui < 0), fixed, rxcui_two)
+        rxcui_two = np.where(nine & (rxcui // 10 + 1 != rxcui_two // 10), rxcui, rxcui_two)
+        # Ensures ambiguous RXCUI within a range of 10 can be accounted for
+        ndc_data['RXCUI2'] = pd.Series(rxcui_two).astype(TEXT_DTYPE).where(rxcui_two >= 0).str[:-1]
+        ndc_data['New Code'] = ndc_data['RXCUI2'].fillna(MISSING_TEXT) + ndc_data['Code Dosage']
+        stage['rows_out'] = len(ndc_data)
     logging.info("Handling complete")
+    return ndc_data
+
+# Refines the resolved rows with the RxNorm data and builds their descriptions and QUMI Codes
+def finalize_codes(ndc_data, rxnorm_refined, workers=1):
+    # Merging the refinement data from RxNorm together
+    logging.info("Merging the refinement data from RxNorm together...")
+    with stage_metrics.stage('refinement merge', len(ndc_data)) as stage:
+        logging.debug("Gather all useful columns...")
+        rxnorm_ndc = ndc_data[['NDC', 'RXCUI', 'DOSE']].drop_duplicates(subset='NDC', keep='first')
+        rxnorm_ndc = pd.merge(rxnorm_ndc, rxnorm_refined, on='RXCUI', how='left')
+        rxnorm_ndc['DFG'] = rxnorm_ndc['DFG'].map(dfg_std, na_action='ignore')
+        logging.debug("Done")
+        logging.debug("Finalizing formatting...")
+        rxnorm_ndc['Dosage Form'] = apply_rows(rxnorm_ndc[['DF', 'DOSE']], dosage_form_std, workers)
+        has_desc = rxnorm_ndc['Description'].notna()
+        if has_desc.any():
+            replace_columns = ['DF', 'Description', 'Dosage Form']
+            rxnorm_ndc.loc[has_desc, 'Description'] = apply_rows(rxnorm_ndc.loc[has_desc, replace_columns], replace_df, 
+                                                                 workers)
+        rxnorm_ndc = rxnorm_ndc[['NDC', 'DF', 'DFG', 'Description', 'Dosage Form']]
+        logging.debug("Done")
+        logging.info("Merging complete")
+
+        # Merging the refinement data with the NDC data
+        logging.info("Merging the refinement data with the NDC data...")
+        ndc_data = pd.merge(ndc_data, rxnorm_ndc, on='NDC', how='left')
+        ndc_data['Dosage Route'] = ndc_data['DOSAGEFORMNAME2']
+        has_dfg = ndc_data['DFG'].notna()
+        if has_dfg.any():
+            ndc_data.loc[has_dfg, 'Dosage Route'] = apply_rows(ndc_data.loc[has_dfg, ['DFG', 'Dosage Route']], use_dfg, 
+                                                               workers)
+        ndc_data['New Code'] = apply_rows(ndc_data[['ACTIVE_NUMERATOR_STRENGTH', 'DOSE', 'Dosage Form', 'Dosage Route', 
+                                                    'PROPRIETARYNAME', 'RXCUI2', 'SUBSTANCENAME']], use_df, workers)
+        ndc_data['API Measure'] = map_unique(ndc_data['ACTIVE_INGRED_UNIT'], api_measure_std)
+        stage['rows_out'] = len(ndc_data)
+
+    # Filling in missing descriptions and standardizing the displayed information
+    with stage_metrics.stage('description', len(ndc_data)) as stage:
+        no_desc_mask = ndc_data['Description'].isna()
+        if no_desc_mask.any():
+            desc_columns = ['ACTIVE_NUMERATOR_STRENGTH', 'API Measure', 'Dosage Form', 'NONPROPRIETARYNAME', 
+                            'PROPRIETARYNAME', 'SUBSTANCENAME']
+            ndc_data.loc[no_desc_mask, 'Description'] = apply_rows(ndc_data.loc[no_desc_mask, desc_columns], make_desc, 
+                                                                   workers)
+        for column in set(DEBUG_OUTPUT_COLUMNS).intersection(ndc_data.columns):
+            hcl = ndc_data[column].isin(HCL_VALUES)
+            if hcl.any():
+                ndc_data[column] = ndc_data[column].astype(object).mask(hcl, "HCl")
+        ndc_data['DEASCHEDULE'] = ndc_data['DEASCHEDULE'].map(dea_std, na_action='ignore')
+        ndc_data['ACTIVE_NUMERATOR_STRENGTH'] = map_unique(ndc_data['ACTIVE_NUMERATOR_STRENGTH'], strength_std)
+        ndc_data['API Measure'] = map_unique(ndc_data['API Measure'], measure_std)
+        ndc_data['SUBSTANCENAME'] = map_unique(ndc_data['SUBSTANCENAME'], to_hcl)
+        ndc_data['Description'] = map_unique(ndc_data['Description'], description_std, workers)
+        stage['rows_out'] = len(ndc_data)
+
+    # Hashing the pre-hash codes into QUMI Codes, which no whole-frame replacement above can match
+    with stage_metrics.stage('hash', len(ndc_data)) as stage:
+        ndc_data['QUMI Code'], collisions = get_qsrx_codes_from_gcps(ndc_data['New Code'])
+        if len(collisions):
+            examples = ", ".join(f"{code} <- {gcp}" for code, gcp in collisions.head(10).itertuples(index=False))
+            logging.warning(f"{collisions['QUMI Code'].nunique()} QUMI Codes are shared by distinct pre-hash codes: "
+                            f"{examples}")
+        stage['rows_out'] = ndc_data['QUMI Code'].nunique()
+    logging.info("Merging complete")
+    return ndc_data
+
+# The published columns and their names in the output CSV, where debug runs also include the pre-hash code
+OUTPUT_COLUMNS = ['NDC', 'RXCUI', 'QUMI Code', 'Package Count', 'LABELERNAME', 'Description', 'Dosage Form', 'Dosage Route', 'ACTIVE_NUMERATOR_STRENGTH', 'API Measure', 'APPLICATIONNUMBER', 'SUBSTANCENAME', 'DEASCHEDULE']
+DEBUG_OUTPUT_COLUMNS = ['NDC', 'RXCUI', 'New Code', 'QUMI Code', 'Package Count', 'LABELERNAME', 'Description', 'Dosage Form', 'Dosage Route', 'ACTIVE_NUMERATOR_STRENGTH', 'API Measure', 'APPLICATIONNUMBER', 'SUBSTANCENAME', 'DEASCHEDULE']
+OUTPUT_NAMES = {'New Code': 'Pre-Hash Code', 'LABELERNAME': 'Supplier', 'ACTIVE_NUMERATOR_STRENGTH': 'Strength', 'API Measure': 'Measure', 'APPLICATIONNUMBER': 'ANDA', 'SUBSTANCENAME': 'Generic Description', 'DEASCHEDULE': 'DEA'}
+
+# Selects and renames the published columns
+def output_codes(ndc_data, log_level):
+    qsrx_data = ndc_data[DEBUG_OUTPUT_COLUMNS if log_level == 'debug' else OUTPUT_COLUMNS]
+    return qsrx_data.rename(columns=OUTPUT_NAMES)
+
+# The output formats by file extension, longest extensions first, where any other extension is written as CSV
+OUTPUT_FORMATS = {'.csv.gz': 'csv.gz', '.csv.zst': 'csv.zst', '.csv': 'csv', '.parquet': 'parquet', '.feather': 'feather', 
+                  '.arrow': 'feather', '.sqlite3': 'sqlite', '.sqlite': 'sqlite', '.db': 'sqlite'}
+CSV_FORMATS = ['csv', 'csv.gz', 'csv.zst']
+
+# Rows per chunk when streaming a compressed CSV
+CSV_CHUNK_ROWS = 100000
+
+# The compression of each compressed CSV format
+CSV_COMPRESSION = {'csv.gz': 'gzip', 'csv.zst': 'zstd'}
+
+# The table and indexed columns of an SQLite output
+SQLITE_TABLE = 'qumi_codes'
+SQLITE_INDEXES = {'idx_qumi_codes_ndc': 'NDC', 'idx_qumi_codes_qumi_code': 'QUMI Code'}
+
+# Picks the output format from the file extension unless one is given
+def output_format(filename, file_format=None):
+    if file_format:
+        return file_format
+    for extension, extension_format in OUTPUT_FORMATS.items():
+        if filename.lower().endswith(extension):
+            return extension_format
+    return 'csv'
+
+# Opens a CSV file for reading, decompressing gzip and zstd with pyarrow when it is installed
+def csv_source(filename):
+    if pa is not None and output_format(filename) != 'csv':
+        return pa.input_stream(filename, compression='detect')
+    return filename
+
+# Splits a frame into chunks of CSV_CHUNK_ROWS rows, with one empty chunk for an empty frame so its header is written
+def frame_chunks(df):
+    return (df.iloc[start:start + CSV_CHUNK_ROWS] for start in range(0, max(len(df), 1), CSV_CHUNK_ROWS))
+
+# Streams a CSV one chunk of rows at a time, through gzip or zstd compression for a compressed format, so the whole
+# text is never held at once
+def write_csv(chunks, filename, file_format):
+    if file_format in CSV_COMPRESSION:
+        stream = pa.output_stream(filename, compression=CSV_COMPRESSION[file_format])
+    else:
+        stream = open(filename, 'wb')
+    with stream:
+        for i, chunk in enumerate(chunks):
+            stream.write(chunk.to_csv(index=False, header=i == 0).encode())
+
+# Writes a Parquet dataset with one directory per Dosage Route, replacing any previous dataset at once
+def write_parquet(chunks, filename):
+    staging = filename + '.tmp'
+    shutil.rmtree(staging, ignore_errors=True)
+    for chunk in chunks:
+        pq.write_to_dataset(pa.Table.from_pandas(chunk, preserve_index=False), staging, 
+                            partition_cols=['Dosage Route'])
+    if os.path.isdir(filename):
+        shutil.rmtree(filename)
+    os.replace(staging, filename)
+
+# Writes an uncompressed Arrow IPC (Feather) file, which readers can memory-map without copying
+def write_feather(chunks, filename):
+    writer = None
+    try:
+        for chunk in chunks:
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if writer is None:
+                writer = pa.ipc.new_file(filename + '.tmp', table.schema, 
+                                         options=pa.ipc.IpcWriteOptions(compression=None))
+            writer.write_table(table)
+    finally:
+        if writer is not None:
+            writer.close()
+    os.replace(filename + '.tmp', filename)
+
+# Writes the codes table of an SQLite database with indexes on NDC and QUMI Code, swapping the whole file in at once
+def write_sqlite(chunks, filename):
+    staging = filename + '.tmp'
+    if os.path.exists(staging):
+        os.remove(staging)
+    conn = sqlite3.connect(staging)
+    try:
+        with conn:
+            for chunk in chunks:
+                chunk.to_sql(SQLITE_TABLE, conn, index=False, if_exists='append')
+            for index, column in SQLITE_INDEXES.items():
+                conn.execute(f'CREATE INDEX {index} ON {SQLITE_TABLE} ("{column}")')
+    finally:
+        conn.close()
+    os.replace(staging, filename)
+
+# Writes chunks of already sorted rows as one output in the given format
+def write_chunks(chunks, filename, file_format):
+    if file_format in CSV_FORMATS:
+        write_csv(chunks, filename, file_format)
+    elif file_format == 'parquet':
+        write_parquet(chunks, filename)
+    elif file_format == 'feather':
+        write_feather(chunks, filename)
+    else:
+        write_sqlite(chunks, filename)
+
+# Creates the output file in the format its extension or the given format names, with rows in NDC order before
+# sorting as resolve_ambiguity leaves them
+def write_codes(qsrx_data, filename, file_format=None):
+    file_format = output_format(filename, file_format)
+    if file_format not in CSV_FORMATS and pa is None:
+        logging.error(f"pyarrow is required to write {file_format} output, install it or write a CSV")
+        raise ImportError(f"pyarrow is required to write {file_format} output")
+    logging.info(f"Creating the output {file_format.upper()}...")
+    with stage_metrics.stage('write', len(qsrx_data)) as stage:
+        qsrx_data = qsrx_data.sort_values(by=['Dosage Route','QUMI Code'])
+        #output_list = ["INJECTABLE", "INTRATRACHEAL", "IRRIGATION"]
+        #qsrx_data = qsrx_data[qsrx_data['Dosage Route'].isin(output_list)]
+        if file_format == 'csv':
+            qsrx_data.to_csv(filename, index=False)
+        elif pa is None:
+            qsrx_data.to_csv(filename, index=False, compression=CSV_COMPRESSION[file_format])
+        else:
+            write_chunks(frame_chunks(qsrx_data) if file_format in CSV_FORMATS else [qsrx_data], filename, file_format)
+        stage['rows_out'] = len(qsrx_data)
+    logging.info(f'{filename} has been successfully created')
+
+# Hashes the source of this script and the unit corrections, so any change to the rules invalidates every fingerprint
+@functools.lru_cache(maxsize=None)
+def pipeline_version():
+    version_hash = hashlib.sha256()
+    for path in [os.path.abspath(__file__), UNIT_CORRECTIONS_FILE]:
+        with open(path, 'rb') as f:
+            version_hash.update(f.read())
+    return version_hash.digest()
+
+# Fingerprints every NDC from its unified rows, the RxNorm refinement data of their RXCUI and the pipeline version
+def ndc_fingerprints(ndc_data, rxnorm_refined):
+    hashed = ndc_data.assign(REFINED_RXCUI=ndc_data['RXCUI'])
+    hashed = pd.merge(hashed, rxnorm_refined.rename(columns={'RXCUI': 'REFINED_RXCUI'}), on='REFINED_RXCUI', 
+                      how='left')
+    row_hashes = pd.util.hash_pandas_object(hashed, index=False).to_numpy()
+    codes, ndcs = pd.factorize(hashed['NDC'])
+    order = np.argsort(codes, kind='stable')
+    groups = np.split(row_hashes[order], np.cumsum(np.bincount(codes))[:-1])
+    version = pipeline_version()
+    return pd.Series([hashlib.sha256(version + group.tobytes()).hexdigest()[:32] for group in groups], index=ndcs, 
+                     name='Fingerprint')
+
+# Names the file holding the per-NDC fingerprints and ambiguity keys next to an output CSV
+def fingerprints_filename(filename):
+    for extension in OUTPUT_FORMATS:
+        if filename.lower().endswith(extension):
+            return filename[:-len(extension)] + '.fingerprints.csv'
+    return os.path.splitext(filename)[0] + '.fingerprints.csv'
+
+# Records each NDC's fingerprint, ambiguity keys and resolved row so the next release can be generated incrementally
+def write_fingerprints(fingerprints, ambiguity_keys, resolved, filename):
+    state = pd.merge(ambiguity_keys, fingerprints.rename_axis('NDC').reset_index(), on='NDC', how='left')
+    resolved = resolved[['NDC', 'NDC Row', 'RXCUI2']].rename(columns={'NDC Row': 'Resolved Row', 
+                                                                      'RXCUI2': 'Resolved RXCUI2'})
+    state = pd.merge(state, resolved, on='NDC', how='left')
+    state.to_csv(fingerprints_filename(filename), index=False)
+    logging.debug(f'{fingerprints_filename(filename)} has been successfully created')
+
+# Regenerates only the NDCs whose inputs or RXCUI ambiguity resolution changed since a previous release
+def generate_incremental(ndc_data, rxnorm_refined, filename, previous, log_level, workers=1, file_format=None):
+    logging.info(f"Generating incrementally against {previous}...")
+    if output_format(previous) not in CSV_FORMATS:
+        logging.warning(f"Cannot generate incrementally, {previous} is not a CSV release")
+        return False
+    try:
+        state = pd.read_csv(fingerprints_filename(previous), dtype=str, keep_default_na=False, na_values=[''])
+        previous_codes = pd.read_csv(csv_source(previous), dtype=str, keep_default_na=False, na_values=[''])
+    except FileNotFoundError as e:
+        logging.warning(f"Cannot generate incrementally, {e.filename} not found")
+        return False
+    columns = DEBUG_OUTPUT_COLUMNS if log_level == 'debug' else OUTPUT_COLUMNS
+    if list(previous_codes.columns) != [OUTPUT_NAMES.get(column, column) for column in columns]:
+        logging.warning(f"Cannot generate incrementally, {previous} has different columns than this run writes")
+        return False
+    state = apply_schema(state, {**NDC_SCHEMA, 'Resolved Row': 'int64'})
+
+    # Finding the NDCs whose inputs changed
+    fingerprints = ndc_fingerprints(ndc_data, rxnorm_refined)
+    previous_fingerprints = state.drop_duplicates(subset='NDC').set_index('NDC')['Fingerprint']
+    changed = fingerprints.index[(fingerprints != previous_fingerprints.reindex(fingerprints.index)).fillna(True)]
+    logging.info(f"{len(changed)} of {len(fingerprints)} NDCs have changed inputs")
+    fresh = prepare_codes(ndc_data[ndc_data['NDC'].isin(changed)].reset_index(drop=True), workers) if len(changed) \
+        else None
+
+    # Resolving ambiguity over every row to find the NDCs whose resolution changed
+    kept_keys = state[state['NDC'].isin(fingerprints.index.difference(changed))][AMBIGUITY_COLUMNS]
+    ambiguity_keys = pd.concat([kept_keys] + ([fresh[AMBIGUITY_COLUMNS]] if fresh is not None else []))
+    ndc_order = pd.Series(np.arange(len(fingerprints)), index=fingerprints.index)
+    ambiguity_keys = ambiguity_keys.iloc[np.lexsort([ambiguity_keys['NDC Row'], 
+                                                     ndc_order[ambiguity_keys['NDC']].to_numpy()])]
+    resolved = resolve_ambiguity(ambiguity_keys).set_index('NDC')
+    previous_resolved = state.drop_duplicates(subset='NDC').set_index('NDC').reindex(resolved.index)
+    same_rxcui2 = (resolved['RXCUI2'] == previous_resolved['Resolved RXCUI2']).fillna(False) | \
+        (resolved['RXCUI2'].isna() & previous_resolved['Resolved RXCUI2'].isna())
+    moved = (resolved['NDC Row'] != previous_resolved['Resolved Row']) | ~same_rxcui2
+    affected = resolved.index[moved | resolved.index.isin(changed) | ~resolved.index.isin(previous_codes['NDC'])]
+    logging.info(f"Regenerating {len(affected)} NDCs, reusing {len(resolved) - len(affected)} from {previous}")
+
+    # Regenerating the affected NDCs with their full data alongside the keys of every other row
+    qsrx_data = previous_codes[previous_codes['NDC'].isin(resolved.index.difference(affected))]
+    if len(affected):
+        reprocessed = ndc_data['NDC'].isin(affected.difference(changed))
+        if reprocessed.any():
+            reprocessed = prepare_codes(ndc_data[reprocessed].reset_index(drop=True), workers)
+            fresh = pd.concat([frame for frame in [fresh, reprocessed] if frame is not None])
+        full_keys = pd.concat([fresh, ambiguity_keys[~ambiguity_keys['NDC'].isin(affected)]])
+        full_keys = full_keys.iloc[np.lexsort([full_keys['NDC Row'], ndc_order[full_keys['NDC']].to_numpy()])]
+        regenerated = resolve_ambiguity(full_keys)
+        regenerated = regenerated[regenerated['NDC'].isin(affected)].astype({'Package Count': 
+                                                                             NDC_SCHEMA['Package Count']})
+        regenerated = finalize_codes(regenerated, rxnorm_refined, workers)
+        qsrx_data = pd.concat([qsrx_data, output_codes(regenerated, log_level)])
+    write_codes(qsrx_data.sort_values(by='NDC', kind='stable'), filename, file_format)
+    write_fingerprints(fingerprints, ambiguity_keys, resolved.reset_index(), filename)
+    return True
+
+# Reads a frame saved as Parquet, back in the text dtype the stages run on
+def load_frame(path, columns=None):
+    df = pd.read_parquet(path, columns=columns)
+    return df.astype({column: TEXT_DTYPE for column in df.columns if isinstance(df[column].dtype, pd.StringDtype)})
+
+# The working memory a unified row takes through every stage, as measured with -profile, which sizes the partitions of
+# a memory-budgeted run
+PARTITION_ROW_BYTES = 2048
+
+# Reads the labeler of each NDC as the first five digits of its 11-digit form, shared by all of its FDA and RxNorm rows
+def ndc_labelers(ndcs):
+    return ndcs.str[:5].fillna('')
+
+# Splits the labelers, in NDC order, into partitions of about max_rows FDA rows each without splitting any labeler, and
+# returns the partition of each labeler
+def labeler_partitions(labelers, max_rows):
+    counts = labelers.value_counts(sort=False).sort_index()
+    return pd.Series(pd.factorize((counts.cumsum() - counts) // max_rows)[0], index=counts.index)
+
+# Warns of the QUMI Codes shared by distinct pre-hash codes from different partitions, which the hash stage of no single
+# partition can see
+def partition_collisions(hashed):
+    hashed = pd.concat(hashed).drop_duplicates(subset=['QUMI Code', 'Pre-Hash Code'])
+    hashed = hashed[hashed['QUMI Code'].duplicated(keep=False)]
+    collisions = hashed[hashed.groupby('QUMI Code')['Partition'].transform('nunique') > 1]
+    if len(collisions):
+        collisions = collisions.sort_values(['QUMI Code', 'Pre-Hash Code'])
+        examples = ", ".join(f"{code} <- {gcp}" for code, gcp in collisions[['QUMI Code', 'Pre-Hash Code']].head(10)
+                             .itertuples(index=False))
+        logging.warning(f"{collisions['QUMI Code'].nunique()} QUMI Codes are shared by distinct pre-hash codes across "
+                        f"partitions: {examples}")
+
+# Gathers rows of the memory-mapped spill files by their position across all of them, in the order given, taking from
+# each file separately since taking from them as one table would first copy them all into memory
+def take_spilled(tables, offsets, positions):
+    spill = np.searchsorted(offsets, positions, side='right') - 1
+    by_spill = np.argsort(spill, kind='stable')
+    pieces = [tables[i].take(positions[by_spill][spill[by_spill] == i] - offsets[i]) for i in np.unique(spill)]
+    gathered = pa.concat_tables(pieces).combine_chunks() if pieces else tables[0].slice(0, 0)
+    return gathered.take(np.argsort(by_spill)).to_pandas()
+
+# Writes the codes spilled by every partition as one output sorted the way write_codes sorts, gathering chunk_rows rows
+# at a time from the memory-mapped spill files so only the sort keys of the whole output are ever held at once.
+# Each partition's rows are in NDC order and the partitions follow each other in NDC order, so a stable sort leaves
+# ties in NDC order as it does for a whole run
+def write_partitioned_codes(spill_files, filename, file_format=None, chunk_rows=CSV_CHUNK_ROWS):
+    file_format = output_format(filename, file_format)
+    logging.info(f"Creating the output {file_format.upper()}...")
+    tables = [feather.read_table(spill_file, memory_map=True) for spill_file in spill_files]
+    offsets = np.cumsum([0] + [table.num_rows for table in tables])
+    with stage_metrics.stage('write', int(offsets[-1])) as stage:
+        keys = pd.concat([table.select(['Dosage Route', 'QUMI Code']).to_pandas() for table in tables], 
+                         ignore_index=True)
+        order = keys.sort_values(by=['Dosage Route','QUMI Code']).index.to_numpy()
+        del keys
+        chunks = (take_spilled(tables, offsets, order[start:start + chunk_rows]) 
+                  for start in range(0, max(len(order), 1), chunk_rows))
+        write_chunks(chunks, filename, file_format)
+        stage['rows_out'] = len(order)
+    logging.info(f'{filename} has been successfully created')
+
+# Generates the codes a partition of labelers at a time, so the working data is bounded by the largest partition rather
+# than the whole catalog. A first pass prepares each partition, spilling its rows to disk and keeping only their
+# ambiguity keys (and fingerprints when kept), which are resolved across every NDC at once as in a whole run. A second
+# pass reloads each partition's resolved rows, finalizes them and spills its codes, which are then merged into the
+# sorted output
+def generate_partitioned(filename, log_level, max_memory, use_cache=True, workers=1, chunksize=None, file_format=None, 
+                         keep_fingerprints=False):
+    fda_package, fda_product, rxnorm_rxcui, rxnorm_refined = load_inputs(use_cache, chunksize)
+    fda, rxnorm_rxcui = format_data(fda_package, fda_product, rxnorm_rxcui)
+    del fda_package, fda_product
+    max_rows = max(1, max_memory * 2**20 // PARTITION_ROW_BYTES)
+    fda_labelers = ndc_labelers(fda['NDC'])
+    partitions = labeler_partitions(fda_labelers, max_rows)
+    fda_partition = fda_labelers.map(partitions).to_numpy()
+    rxnorm_partition = ndc_labelers(rxnorm_rxcui['NDC']).map(partitions).to_numpy()
+    ndc_order = pd.Series(np.arange(len(fda)), index=fda['NDC'])
+    partition_count = partitions.max() + 1 if len(partitions) else 0
+    logging.info(f"Generating {len(fda)} NDCs in {partition_count} partitions of about {max_rows} rows to keep within "
+                 f"{max_memory} MB")
+
+    spill_dir = tempfile.mkdtemp(prefix='.qumi-codes-', dir=os.path.dirname(os.path.abspath(filename)))
+    try:
+        # Preparing every partition, keeping only what resolving RXCUI ambiguity reads
+        fingerprints = []
+        ambiguity_keys = []
+        for partition in range(partition_count):
+            logging.info(f"Preparing partition {partition + 1} of {partition_count}...")
+            ndc_data = join_data(fda.iloc[np.flatnonzero(fda_partition == partition)], 
+                                 rxnorm_rxcui.iloc[np.flatnonzero(rxnorm_partition == partition)])
+            if keep_fingerprints:
+                fingerprints.append(ndc_fingerprints(ndc_data, rxnorm_refined))
+            ndc_data = prepare_codes(ndc_data, workers)
+            ambiguity_keys.append(ndc_data[AMBIGUITY_COLUMNS])
+            ndc_data.to_parquet(os.path.join(spill_dir, f'prepared-{partition}.parquet'))
+        del fda, rxnorm_rxcui, ndc_data
+        ambiguity_keys = pd.concat(ambiguity_keys, ignore_index=True)
+        ambiguity_keys = ambiguity_keys.iloc[np.lexsort([ambiguity_keys['NDC Row'], 
+                                                         ndc_order[ambiguity_keys['NDC']].to_numpy()])]
+        resolved = resolve_ambiguity(ambiguity_keys.reset_index(drop=True))
+        resolved_partition = ndc_labelers(resolved['NDC']).map(partitions).to_numpy()
+
+        # Finalizing every partition's resolved rows
+        spill_files = []
+        hashed = []
+        for partition in range(partition_count):
+            logging.info(f"Finalizing partition {partition + 1} of {partition_count}...")
+            prepared = load_frame(os.path.join(spill_dir, f'prepared-{partition}.parquet'))
+            chosen = resolved.iloc[np.flatnonzero(resolved_partition == partition)]
+            ndc_data = pd.merge(chosen[['NDC', 'NDC Row', 'RXCUI2', 'New Code', 'PROPRIETARYNAME']], 
+                                prepared.drop(columns=['RXCUI2', 'New Code', 'PROPRIETARYNAME']), on=['NDC', 'NDC Row'])
+            ndc_data = finalize_codes(ndc_data[prepared.columns], rxnorm_refined, workers)
+            hashed.append(ndc_data[['QUMI Code', 'New Code']].drop_duplicates()
+                          .rename(columns={'New Code': 'Pre-Hash Code'}).assign(Partition=partition))
+            # Spilling text as plain strings, since categories differ between partitions
+            qsrx_data = output_codes(ndc_data, log_level)
+            qsrx_data = qsrx_data.astype({column: TEXT_DTYPE for column in qsrx_data.columns 
+                                          if qsrx_data[column].dtype in [object, 'category']})
+            spill_files.append(os.path.join(spill_dir, f'codes-{partition}.arrow'))
+            feather.write_feather(qsrx_data, spill_files[-1], compression='uncompressed')
+        del prepared, ndc_data, qsrx_data
+        partition_collisions(hashed)
+        write_partitioned_codes(spill_files, filename, file_format, min(max_rows, CSV_CHUNK_ROWS))
+    finally:
+        shutil.rmtree(spill_dir, ignore_errors=True)
+    if keep_fingerprints:
+        write_fingerprints(pd.concat(fingerprints), ambiguity_keys, resolved, filename)
+
+# The only columns validation reads from either release
+VALIDATE_COLUMNS = ['NDC', 'QUMI Code', 'Description', 'Strength', 'Measure']
 
-    # Querying other data from RxNorm to refine the codes and displayed information
-    logging.info("Querying refinenment data from RxNorm...")
-    logging.debug("Querying the RXNREL and RXNCONSO tables from RxNorm...")
+# The kinds of changes validation reports, in the order they are listed for each NDC
+CHANGE_CATEGORIES = ['new', 'deprecated', 'code_changed', 'description_changed']
+
+# Compares the QUMI Codes and descriptions of a new release against a reference release
+def diff_releases(new_data, reference):
+    merged = pd.merge(reference, new_data, on='NDC', how='outer', suffixes=('_old', '_new'))
+    old_present = merged['QUMI Code_old'].notna()
+    new_present = merged['QUMI Code_new'].notna()
+    both = old_present & new_present
+    # As the summary has always listed them, a description change is reported for new and deprecated NDCs too, and a
+    # missing description never equals another
+    desc_changed = (old_present | new_present) & (merged['Description_old'] != merged['Description_new'])
+    masks = {
+        'new': ~old_present & new_present,
+        'deprecated': old_present & ~new_present,
+        'code_changed': both & (merged['QUMI Code_old'] != merged['QUMI Code_new']),
+        'description_changed': desc_changed,
+    }
+    changes = pd.concat([merged[mask].assign(Change=category, Order=order) 
+                         for order, (category, mask) in enumerate(masks.items())])
+    changes = changes.rename_axis('Row').sort_values(['Row', 'Order']).reset_index(drop=True)
+    changes = changes[['NDC', 'Change', 'QUMI Code_old', 'QUMI Code_new', 'Description_old', 'Description_new', 
+                       'Strength_old', 'Strength_new', 'Measure_old', 'Measure_new']]
+    counts = {category: int(mask.sum()) for category, mask in masks.items()}
+    return changes, counts
+
+# Formats the changes as the one-line-per-change text report
+def diff_summary(changes):
+    text = changes.fillna('nan')
+    ndc = text['NDC'] + ":\t"
+    new_side = "\t" + text['Description_new'] + " \t" + text['Strength_new'] + " " + text['Measure_new']
+    old_side = "\t" + text['Description_old'] + " \t" + text['Strength_old'] + " " + text['Measure_old']
+    lines = pd.Series("", index=text.index)
+    category = text['Change']
+    lines[category == 'new'] = ndc + "New NDC -> " + text['QUMI Code_new'] + new_side
+    lines[category == 'deprecated'] = ndc + text['QUMI Code_old'] + " -> NDC deprecated" + old_side
+    lines[category == 'code_changed'] = ndc + text['QUMI Code_old'] + " -> " + text['QUMI Code_new'] + new_side
+    lines[category == 'description_changed'] = ndc + text['Description_old'] + " -> " + text['Description_new']
+    return lines.tolist()
+
+# Writes the changes and their counts as JSON or CSV, depending on the file extension
+def write_diff(changes, counts, filename, new_data_csv, reference_csv):
+    if filename.lower().endswith('.json'):
+        report = {'new': new_data_csv, 'reference': reference_csv, 'counts': counts, 
+                  'changes': json.loads(changes.to_json(orient='records'))}
+        with open(filename, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        changes.to_csv(filename, index=False)
+    logging.info(f'{filename} has been successfully created')
+
+def validate_csv(new_data_csv, reference_csv='universal-med-ids.csv', diff_file=None, summary=True):
     try:
-        query_d = "SELECT RXCUI1, RXCUI2 FROM RXNREL WHERE SAB = 'RXNORM' AND RELA = 'dose_form_of'"
-        rxnrel_d = pd.read_sql_query(query_d, 'sqlite:///data/rxnorm.db')
-        rxnrel_d = rxnrel_d.rename(columns={'RXCUI1': 'RXCUI'})
-        query_df = "SELECT RXCUI, STR FROM RXNCONSO WHERE SAB = 'RXNORM' AND TTY = 'DF'"
-        rxnconso_df = pd.read_sql_query(query_df, 'sqlite:///data/rxnorm.db')
-        rxnconso_df = rxnconso_df.rename(columns={'RXCUI': 'RXCUI2', 'STR': 'DF'})
-        query_i = "SELECT RXCUI1, RXCUI2 FROM RXNREL WHERE SAB = 'RXNORM' AND RELA = 'inverse_isa'"
-        rxnrel_i = pd.read_sql_query(query_i, 'sqlite:///data/rxnorm.db')
-        query_dfg = "SELECT RXCUI, STR FROM RXNCONSO WHERE SAB = 'RXNORM' AND TTY = 'DFG'"
-        rxnconso_dfg = pd.read_sql_query(query_dfg, 'sqlite:///data/rxnorm.db')
-        rxnconso_dfg = rxnconso_dfg.rename(columns={'RXCUI': 'RXCUI2', 'STR': 'DFG'})
-        query_t = "SELECT RXCUI1, RXCUI2 FROM RXNREL WHERE SAB = 'RXNORM' AND RELA = 'tradename_of'"
-        rxnrel_t = pd.read_sql_query(query_t, 'sqlite:///data/rxnorm.db')
-        rxnrel_t = rxnrel_t.rename(columns={'RXCUI1': 'RXCUI'})
-        query_sbd = "SELECT RXCUI, STR FROM RXNCONSO WHERE SAB = 'RXNORM' AND TTY = 'SBD'"
-        rxnconso_sbd = pd.read_sql_query(query_sbd, 'sqlite:///data/rxnorm.db')
-        rxnconso_sbd = rxnconso_sbd.rename(columns={'RXCUI': 'RXCUI2', 'STR': 'Description'})
-        query_sbd = "SELECT RXCUI, STR FROM RXNCONSO WHERE SAB = 'RXNORM' AND TTY = 'SBD'"
-        rxnconso_sbd = pd.read_sql_query(query_sbd, 'sqlite:///data/rxnorm.db')
-        rxnconso_sbd = rxnconso_sbd.rename(columns={'RXCUI': 'RXCUI2', 'STR': 'Description'})
-        query_scd = "SELECT RXCUI, STR FROM RXNCONSO WHERE SAB = 'RXNORM' AND TTY = 'SCD'"
-        rxnconso_scd = pd.read_sql_query(query_scd, 'sqlite:///data/rxnorm.db')
-        rxnconso_scd = rxnconso_scd.rename(columns={'STR': 'Description'})
+        new_data = pd.read_csv(csv_source(new_data_csv), usecols=VALIDATE_COLUMNS, dtype=str)
     except:
-        logging.error("Querying unsuccessful, ensure the full 'rxnorm.db' is still in the data subdirectory")
+        logging.error(f"'{new_data_csv}' not found, ensure it is in the directory and named the same")
         raise
-    logging.debug("Done")
-    logging.info("Querying complete")
+    reference = pd.read_csv(csv_source(reference_csv), usecols=VALIDATE_COLUMNS, dtype=str)
+    changes, counts = diff_releases(new_data, reference)
+    logging.info(", ".join(f"{count} {category.replace('_', ' ')}" for category, count in counts.items()))
+    if diff_file:
+        write_diff(changes, counts, diff_file, new_data_csv, reference_csv)
+    if summary and len(changes):
+        print("\n".join(diff_summary(changes)))
+    return changes, counts
 
-    # Merging the refinement data from RxNorm together
-    logging.info("Merging the refinement data from RxNorm together...")
-    logging.debug("Gather all useful columns...")
-    rxnorm_ndc = ndc_data[['NDC', 'RXCUI', 'DOSE']].copy()
-    rxnorm_ndc = pd.merge(rxnorm_ndc, rxnrel_d, on='RXCUI', how='left')
-    rxnorm_ndc = pd.merge(rxnorm_ndc, rxnconso_df, on='RXCUI2', how='left')
-    rxnorm_ndc = rxnorm_ndc.rename(columns={'RXCUI2': 'RXCUI1'})
-    rxnorm_ndc = pd.merge(rxnorm_ndc, rxnrel_i, on='RXCUI1', how='left')
-    rxnorm_ndc = pd.merge(rxnorm_ndc, rxnconso_dfg, on='RXCUI2', how='left')
-    rxnorm_ndc = rxnorm_ndc.astype(str)
-    rxnorm_ndc['DFG'] = rxnorm_ndc['DFG'].apply(dfg_std)
-    rxnorm_ndc = rxnorm_ndc[['NDC', 'RXCUI', 'DOSE', 'DF', 'DFG']]
-    rxnorm_ndc = rxnorm_ndc.drop_duplicates(subset='NDC', keep='first')
-    rxnorm_ndc = pd.merge(rxnorm_ndc, rxnrel_t, on='RXCUI', how='left')
-    rxnorm_ndc = pd.merge(rxnorm_ndc, rxnconso_sbd, on='RXCUI2', how='left')
-    rxnorm_ndc = rxnorm_ndc[['NDC', 'RXCUI', 'DOSE', 'DF', 'DFG', 'Description']]
-    rxnorm_ndc = rxnorm_ndc.drop_duplicates(subset='NDC', keep='first')
-    logging.debug("Done")
-    logging.debug("Retrieving the description for SBD RXCUI...")
-    rxnconso_sbd = rxnconso_sbd.rename(columns={'RXCUI2': 'RXCUI'})
-    rxnorm_sbd = pd.merge(rxnorm_ndc[['NDC', 'RXCUI', 'DOSE', 'DF', 'DFG']].copy(), rxnconso_sbd, on='RXCUI', how='left')
-    rxnorm_sbd = rxnorm_sbd.drop_duplicates(subset='NDC', keep='first')
-    rxnorm_ndc.reset_index(drop=True, inplace=True)
-    rxnorm_sbd.reset_index(drop=True, inplace=True)
-    nan_mask = rxnorm_ndc['Description'].isna()
-    rxnorm_ndc.loc[nan_mask] = rxnorm_sbd.loc[nan_mask]
-    logging.debug("Done")
-    logging.debug("Retrieving the description for true SCD RXCUI...")
-    rxnorm_scd = pd.merge(rxnorm_ndc[['NDC', 'RXCUI', 'DOSE', 'DF', 'DFG']].copy(), rxnconso_scd, on='RXCUI', how='left')
-    rxnorm_scd = rxnorm_scd.drop_duplicates(subset='NDC', keep='first')
-    rxnorm_ndc.reset_index(drop=True, inplace=True)
-    rxnorm_scd.reset_index(drop=True, inplace=True)
-    nan_mask = rxnorm_ndc['Description'].isna()
-    rxnorm_ndc.loc[nan_mask] = rxnorm_scd.loc[nan_mask]
-    logging.debug("Done")
-    logging.debug("Finalizing formatting...")
-    rxnorm_ndc = rxnorm_ndc.astype(str)
-    rxnorm_ndc['Dosage Form'] = rxnorm_ndc.apply(dosage_form_std, axis = 1)
-    rxnorm_ndc['Description'] = rxnorm_ndc.apply(replace_df, axis = 1)
-    rxnorm_ndc = rxnorm_ndc[['NDC', 'DF', 'DFG', 'Description', 'Dosage Form']]
+# Prepares every row of the full FDA and RxNorm data and resolves their RXCUI ambiguity, keeping the ambiguity keys of
+# every row and the resolved row of every NDC, so batches can be resolved the way a full run resolves them
+@worker_pools()
+def full_ambiguity(fda_package, fda_product, rxnorm_rxcui, workers=1):
+    ndc_data = prepare_codes(unify_data(fda_package, fda_product, rxnorm_rxcui), workers)
+    ambiguity_keys = ndc_data[AMBIGUITY_COLUMNS].reset_index(drop=True)
+    resolved = resolve_ambiguity(ambiguity_keys.copy())[['NDC', 'NDC Row', 'RXCUI2']]
+    return ambiguity_keys, resolved
+
+# Resolves the RXCUI ambiguity of a prepared batch among every row of the full data rather than the batch alone, since
+# the counts and ties that settle it span every row. When the batch's rows match the full data, the full resolution of
+# its NDCs is reused as is. Otherwise the batch's rows replace their NDCs' keys in the full data, in the order of a full
+# run with any new NDCs last, and the whole is resolved again
+def resolve_batch_ambiguity(ndc_data, ambiguity_keys, resolved):
+    batch_ndcs = ndc_data['NDC'].unique()
+    known_keys = ambiguity_keys[ambiguity_keys['NDC'].isin(batch_ndcs)].sort_values(by=['NDC', 'NDC Row'])
+    batch_keys = ndc_data[AMBIGUITY_COLUMNS].sort_values(by=['NDC', 'NDC Row'])
+    if len(known_keys) == len(batch_keys) and (pd.util.hash_pandas_object(known_keys, index=False).to_numpy() == 
+                                               pd.util.hash_pandas_object(batch_keys, index=False).to_numpy()).all():
+        logging.info("Reusing the full RXCUI ambiguity resolution...")
+        chosen = resolved[resolved['NDC'].isin(batch_ndcs)]
+        ndc_data = pd.merge(ndc_data.drop(columns='RXCUI2'), chosen, on=['NDC', 'NDC Row'])[ndc_data.columns]
+        ndc_data['PROPRIETARYNAME'] = ndc_data['PROPRIETARYNAME'].str.lower()
+        ndc_data['New Code'] = ndc_data['RXCUI2'].fillna(MISSING_TEXT) + ndc_data['Code Dosage']
+        return ndc_data.sort_values(by='NDC').reset_index(drop=True)
+    ndcs = pd.Index(ambiguity_keys['NDC'].unique())
+    ndcs = ndcs.append(pd.Index(batch_ndcs).difference(ndcs, sort=False))
+    ndc_order = pd.Series(np.arange(len(ndcs)), index=ndcs)
+    full_keys = pd.concat([ambiguity_keys[~ambiguity_keys['NDC'].isin(batch_ndcs)], ndc_data])
+    full_keys = full_keys.iloc[np.lexsort([full_keys['NDC Row'], ndc_order[full_keys['NDC']].to_numpy()])]
+    resolved = resolve_ambiguity(full_keys)
+    return resolved[resolved['NDC'].isin(batch_ndcs)].reset_index(drop=True).astype(ndc_data.dtypes.to_dict())
+
+# Computes the published columns of an in-memory batch of FDA packages, one row per package with its product's columns,
+# against already loaded RxNorm data and without reading or writing any file. Strengths are kept as written, as they are
+# in any full product.csv. RXCUI ambiguity is resolved against the ambiguity keys and resolution of the full data from
+# full_ambiguity, so each NDC gets the code a full run gives it
+@worker_pools()
+def compute_codes(fda, rxnorm_rxcui, rxnorm_refined, ambiguity, log_level='info', workers=1):
+    if not len(fda):
+        return output_codes(apply_schema(pd.DataFrame(columns=DEBUG_OUTPUT_COLUMNS)), log_level)
+    fda = apply_schema(fda[FDA_PACKAGE_COLUMNS + FDA_PRODUCT_COLUMNS[1:]].copy(), {})
+    fda_package = fill_fda_package(fda[FDA_PACKAGE_COLUMNS])
+    fda_product = fill_fda_product(fda[FDA_PRODUCT_COLUMNS].drop_duplicates(subset='PRODUCTNDC').copy())
+    ndc_data = unify_data(fda_package, fda_product, rxnorm_rxcui.copy())
+    ndc_data = prepare_codes(ndc_data, workers)
+    ndc_data = resolve_batch_ambiguity(ndc_data, *ambiguity)
+    ndc_data = finalize_codes(ndc_data, rxnorm_refined, workers)
+    return output_codes(ndc_data, log_level).sort_values(by=['Dosage Route','QUMI Code']).reset_index(drop=True)
+
+# The files every checkpoint is keyed by, besides the code of its stage
+CHECKPOINT_INPUTS = ['data/package.csv', 'data/product.csv', 'data/rxnorm.db', UNIT_CORRECTIONS_FILE]
+
+# The checkpointed stages of a full run in order, with the functions each one runs
+CHECKPOINT_STAGES = {
+    'unify': [load_fda_data, load_rxnorm_extract, unify_data],
+    'prepare': [prepare_codes],
+    'ambiguity': [resolve_ambiguity],
+    'finalize': [finalize_codes],
+}
+
+# The frames saved in the checkpoint of each stage
+CHECKPOINT_FRAMES = {
+    'unify': ['ndc_data', 'rxnorm_refined'],
+    'prepare': ['ndc_data'],
+    'ambiguity': ['ndc_data'],
+    'finalize': ['ndc_data'],
+}
+
+# The kinds of module-level values hashed into a stage's code version as rule tables
+RULE_TYPES = (str, bytes, int, float, list, tuple, dict, set, frozenset, re.Pattern, np.ndarray, 
+              pd.api.extensions.ExtensionDtype)
+
+# Names every global a function's code refers to, including from its comprehensions and nested functions
+def referenced_names(code):
+    names = set(code.co_names)
+    for const in code.co_consts:
+        if inspect.iscode(const):
+            names |= referenced_names(const)
+    return names
+
+# Spells a rule table the same way on every run, sorting sets since their order changes between runs
+def rule_text(value):
+    if isinstance(value, (set, frozenset)):
+        return repr(sorted(rule_text(item) for item in value))
+    if isinstance(value, dict):
+        return repr([(rule_text(key), rule_text(item)) for key, item in value.items()])
+    if isinstance(value, (list, tuple)):
+        return repr([rule_text(item) for item in value])
+    return repr(value)
+
+# Hashes the source of the given functions and of every function and rule table of this script they refer to, however
+# indirectly, so editing any rule a stage depends on changes its version and no other stage's
+def code_version(funcs):
+    sources = {}
+    pending = list(funcs)
+    while pending:
+        func = pending.pop()
+        if func.__name__ in sources:
+            continue
+        sources[func.__name__] = inspect.getsource(func)
+        for name in referenced_names(func.__code__):
+            if name.startswith('__'):
+                continue
+            value = globals().get(name)
+            if callable(value):
+                value = inspect.unwrap(value)
+            if inspect.isfunction(value) and value.__module__ == __name__:
+                pending.append(value)
+            elif isinstance(value, RULE_TYPES) and not callable(value):
+                sources[name] = rule_text(value)
+    content = "\n".join(f"{name}\n{source}" for name, source in sorted(sources.items()))
+    return hashlib.sha256(content.encode()).hexdigest()
+
+# Keys each stage's checkpoint by the key of the stage before it and its own code version, starting from the input
+# files, so a changed input invalidates every checkpoint and a changed rule only those from its stage on
+def checkpoint_keys(checkpoint_dir):
+    os.makedirs(checkpoint_dir, exist_ok=True)
+    manifest_file = os.path.join(checkpoint_dir, 'inputs.json')
+    try:
+        with open(manifest_file) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        manifest = {}
+    fingerprints = {}
+    for path in CHECKPOINT_INPUTS:
+        try:
+            fingerprints[path] = file_fingerprint(path, manifest.get(path))
+        except:
+            logging.error(f"'{path}' not found, ensure it is in place and named the same")
+            raise
+    if fingerprints != manifest:
+        with open(manifest_file, 'w') as f:
+            json.dump(fingerprints, f, indent=2)
+    key = hashlib.sha256(json.dumps([pd.__version__] + [fingerprint['sha256'] for fingerprint in fingerprints.values()])
+                         .encode()).hexdigest()
+    keys = {}
+    for stage, funcs in CHECKPOINT_STAGES.items():
+        key = hashlib.sha256((key + stage + code_version(funcs)).encode()).hexdigest()
+        keys[stage] = key[:32]
+    return keys
+
+# Names the Parquet file holding one frame of a stage's checkpoint
+def checkpoint_path(checkpoint_dir, keys, stage, frame):
+    return os.path.join(checkpoint_dir, f'{stage}-{keys[stage]}.{frame}.parquet')
+
+# Finds the latest stage a run can load from its checkpoint instead of running, which is before from_stage when one is
+# given and never past unify for an incremental run. Returns None when the run must start from the FDA files
+def resume_stage(checkpoint_dir, keys, from_stage=None, previous=None):
+    stages = list(CHECKPOINT_STAGES)
+    candidates = stages[:stages.index(from_stage)] if from_stage else stages
+    if previous:
+        candidates = candidates[:1]
+    resume = None
+    for stage in candidates:
+        if not all(os.path.exists(checkpoint_path(checkpoint_dir, keys, stage, frame)) 
+                   for frame in CHECKPOINT_FRAMES[stage]):
+            break
+        resume = stage
+    return resume
+
+# Saves the frames of a stage as Parquet, writing each to a temporary file first so a failed run never leaves a partial
+# checkpoint behind
+def save_checkpoint(checkpoint_dir, keys, stage, **frames):
+    with stage_metrics.stage(f'checkpoint {stage}', len(frames['ndc_data'])):
+        for frame, df in frames.items():
+            path = checkpoint_path(checkpoint_dir, keys, stage, frame)
+            df.to_parquet(path + '.tmp')
+            os.replace(path + '.tmp', path)
+    logging.debug(f"Saved the '{stage}' checkpoint to {checkpoint_dir}")
+
+# Loads one frame of a stage's checkpoint
+def load_checkpoint(checkpoint_dir, keys, stage, frame, columns=None):
+    return load_frame(checkpoint_path(checkpoint_dir, keys, stage, frame), columns)
+
+# Reads the FDA data and the RxNorm extract
+def load_inputs(use_cache=True, chunksize=None):
+    # Converting the NDC-inclusive data to pandas DataFrames
+    logging.info("Converting the NDC-inclusive data to pandas DataFrames...")
+    fda_package, fda_product = load_fda_data(chunksize)
+    logging.debug("Retrieving the RxNorm extract...")
+    with stage_metrics.stage('rxnorm query') as stage:
+        rxnorm_rxcui, rxnorm_refined = load_rxnorm_extract(use_cache=use_cache)
+        stage['rows_out'] = len(rxnorm_rxcui)
     logging.debug("Done")
-    logging.info("Merging complete")
+    logging.info("Data retrieval successful")
+    return fda_package, fda_product, rxnorm_rxcui, rxnorm_refined
 
-    # Merging the refinement data with the NDC data
-    logging.info("Merging the refinement data with the NDC data...")
-    ndc_data = pd.merge(ndc_data, rxnorm_ndc, on='NDC', how='left')
-    ndc_data['Dosage Route'] = ndc_data['DOSAGEFORMNAME2']
-    ndc_data['Dosage Route'] = ndc_data.apply(use_dfg, axis=1)
-    ndc_data['New Code'] = ndc_data.apply(use_df, axis=1)
-    ndc_data['API Measure'] = ndc_data['ACTIVE_INGRED_UNIT'].apply(api_measure_std)
-    ndc_data_desc = ndc_data.copy()
-    ndc_data_desc['Description'] = ndc_data_desc.apply(make_desc, axis=1) 
-    ndc_data.reset_index(drop=True, inplace=True)
-    ndc_data_desc.reset_index(drop=True, inplace=True)
-    no_desc_mask = (ndc_data['Description'] == "nan")
-    ndc_data.loc[no_desc_mask] = ndc_data_desc.loc[no_desc_mask]
-    ndc_data['QUMI Code'] = ndc_data['New Code'].apply(get_qsrx_code_from_gcp)
-    ndc_data.replace("HYDROCHLORIDE", "HCl", inplace=True)
-    ndc_data.replace("hydrochloride", "HCl", inplace=True)
-    ndc_data['DEASCHEDULE'] = ndc_data['DEASCHEDULE'].apply(dea_std)
-    ndc_data['ACTIVE_NUMERATOR_STRENGTH'] = ndc_data['ACTIVE_NUMERATOR_STRENGTH'].apply(strength_std)
-    ndc_data['API Measure'] = ndc_data['API Measure'].apply(measure_std)
-    ndc_data['SUBSTANCENAME'] = ndc_data['SUBSTANCENAME'].apply(to_hcl)
-    ndc_data['Description'] = ndc_data['Description'].apply(description_std) 
-    logging.info("Merging complete")
+# Runs every stage of generating the QUMI Codes CSV, saving a checkpoint after each stage when given a directory to keep
+# them in and picking up from the latest valid one. A from_stage reruns that stage and every one after it. A max_memory
+# in megabytes generates the NDCs in partitions instead, without checkpoints or a previous release. The fingerprints
+# file a later incremental run reads is only written when asked for, or by an incremental run itself
+@worker_pools()
+def generate_codes(filename, log_level, use_cache=True, previous=None, workers=1, chunksize=None, checkpoint_dir=None, 
+                   from_stage=None, file_format=None, max_memory=None, keep_fingerprints=False):
+    keep_fingerprints = keep_fingerprints or bool(previous)
+    if max_memory and feather is None:
+        logging.warning("pyarrow is not installed, generating every NDC at once instead of in partitions")
+        max_memory = None
+    if max_memory:
+        generate_partitioned(filename, log_level, max_memory, use_cache, workers, chunksize, file_format, 
+                             keep_fingerprints)
+        return
+    if checkpoint_dir and feather is None:
+        logging.warning("pyarrow is not installed, running every stage without checkpoints")
+        checkpoint_dir = None
+    keys = checkpoint_keys(checkpoint_dir) if checkpoint_dir else {}
+    resume = resume_stage(checkpoint_dir, keys, from_stage, previous) if checkpoint_dir else None
+    resumed = list(CHECKPOINT_STAGES)[:list(CHECKPOINT_STAGES).index(resume) + 1] if resume else []
 
-    # Creating the output CSV
-    logging.info("Creating the output CSV...")
-    if log_level == 'debug':
-        qsrx_data = ndc_data[['NDC', 'RXCUI', 'New Code', 'QUMI Code', 'Package Count', 'LABELERNAME', 'Description', 'Dosage Form', 'Dosage Route', 'ACTIVE_NUMERATOR_STRENGTH', 'API Measure', 'APPLICATIONNUMBER', 'SUBSTANCENAME', 'DEASCHEDULE']]
-        qsrx_data = qsrx_data.rename(columns={'New Code': 'Pre-Hash Code'})
+    if resume:
+        logging.info(f"Resuming after the '{resume}' stage from its checkpoint in {checkpoint_dir}")
+        with stage_metrics.stage(f'resume {resume}') as stage:
+            rxnorm_refined = load_checkpoint(checkpoint_dir, keys, 'unify', 'rxnorm_refined')
+            unified = load_checkpoint(checkpoint_dir, keys, 'unify', 'ndc_data')
+            ndc_data = unified if resume == 'unify' else load_checkpoint(checkpoint_dir, keys, resume, 'ndc_data')
+            stage['rows_out'] = len(ndc_data)
     else:
-        qsrx_data = ndc_data[['NDC', 'RXCUI', 'QUMI Code', 'Package Count', 'LABELERNAME', 'Description', 'Dosage Form', 'Dosage Route', 'ACTIVE_NUMERATOR_STRENGTH', 'API Measure', 'APPLICATIONNUMBER', 'SUBSTANCENAME', 'DEASCHEDULE']]
-    qsrx_data = qsrx_data.rename(columns={'LABELERNAME': 'Supplier', 'ACTIVE_NUMERATOR_STRENGTH': 'Strength', 'API Measure': 'Measure', 'APPLICATIONNUMBER': 'ANDA', 'SUBSTANCENAME': 'Generic Description', 'DEASCHEDULE': 'DEA'})
-    qsrx_data = qsrx_data.sort_values(by=['Dosage Route','QUMI Code'])
-    qsrx_data.replace("nan", np.nan, inplace=True)
-    #output_list = ["INJECTABLE", "INTRATRACHEAL", "IRRIGATION"]
-    #qsrx_data = qsrx_data[qsrx_data['Dosage Route'].isin(output_list)]
-    qsrx_data.to_csv(filename, index=False)
-    logging.info(f'{filename} has been successfully created')
+        fda_package, fda_product, rxnorm_rxcui, rxnorm_refined = load_inputs(use_cache, chunksize)
+        ndc_data = unify_data(fda_package, fda_product, rxnorm_rxcui)
+        unified = ndc_data
+        if checkpoint_dir:
+            save_checkpoint(checkpoint_dir, keys, 'unify', ndc_data=ndc_data, rxnorm_refined=rxnorm_refined)
+
+    # Generating the codes, reusing a previous release's unchanged NDCs when one is given
+    if previous:
+        if generate_incremental(ndc_data, rxnorm_refined, filename, previous, log_level, workers, file_format):
+            return
+        logging.warning("Falling back to generating every NDC from scratch")
+    fingerprints = ndc_fingerprints(unified, rxnorm_refined) if keep_fingerprints else None
+    if 'prepare' not in resumed:
+        ndc_data = prepare_codes(ndc_data, workers)
+        if checkpoint_dir:
+            save_checkpoint(checkpoint_dir, keys, 'prepare', ndc_data=ndc_data)
+    if not keep_fingerprints:
+        ambiguity_keys = None
+    elif resume in ['ambiguity', 'finalize']:
+        ambiguity_keys = load_checkpoint(checkpoint_dir, keys, 'prepare', 'ndc_data', AMBIGUITY_COLUMNS)
+    else:
+        ambiguity_keys = ndc_data[AMBIGUITY_COLUMNS].copy()
+    if 'ambiguity' not in resumed:
+        ndc_data = resolve_ambiguity(ndc_data)
+        if checkpoint_dir:
+            save_checkpoint(checkpoint_dir, keys, 'ambiguity', ndc_data=ndc_data)
+    if 'finalize' not in resumed:
+        ndc_data = finalize_codes(ndc_data, rxnorm_refined, workers)
+        if checkpoint_dir:
+            save_checkpoint(checkpoint_dir, keys, 'finalize', ndc_data=ndc_data)
+    write_codes(output_codes(ndc_data, log_level), filename, file_format)
+    if keep_fingerprints:
+        write_fingerprints(fingerprints, ambiguity_keys, ndc_data, filename)
+
+def main(operation, filename, log_level, use_cache=True, previous=None, workers=1, reference='universal-med-ids.csv', 
+         diff_file=None, summary=True, profile=None, chunksize=None, checkpoint_dir=None, from_stage=None, 
+         file_format=None, max_memory=None, keep_fingerprints=False):
+    # Set up logging level
+    numeric_level = getattr(logging, log_level.upper(), None)
+    if not isinstance(numeric_level, int):
+        raise ValueError(f'Invalid log level: {log_level}')
+    logging.basicConfig(format='%(asctime)s %(name)s:%(levelname)s: %(message)s', level=numeric_level)
+
+    if operation == "validate":
+        validate_csv(filename, reference, diff_file, summary)
+        return
+
+    if profile:
+        stage_metrics.enable()
+    try:
+        generate_codes(filename, log_level, use_cache, previous, workers, chunksize, checkpoint_dir, from_stage, 
+                       file_format, max_memory, keep_fingerprints)
+    finally:
+        if profile:
+            stage_metrics.write(profile)
 
 # Parse command-line arguments and run main
 if __name__ == "__main__":
@@ -743,8 +1866,41 @@ if __name__ == "__main__":
     # Validate example: ./qumi-codes.py -validate 06-03-2025-updates.csv > test.txt
     parser.add_argument("-level", help="Set logging level", type=str, choices=['debug', 'info', 'error', 'warning', 'critical'], 
                         default='info')
+    parser.add_argument("-no-cache", help="Query rxnorm.db directly instead of using the cached extract in data/rxnorm-cache", 
+                        action='store_true')
+    parser.add_argument("-previous", help="A previously generated CSV, with its .fingerprints.csv alongside, to only regenerate changed NDCs against", 
+                        type=str)
+    parser.add_argument("-fingerprints", help="Also write a .fingerprints.csv next to the output, so a later run can pass it as -previous", 
+                        action='store_true')
+    parser.add_argument("-reference", help="The CSV file to validate against", type=str, 
+                        default='universal-med-ids.csv')
+    parser.add_argument("-diff", help="Write the validation changes and counts to this CSV or JSON file", type=str)
+    parser.add_argument("-quiet", help="Do not print the text summary of the validation changes", action='store_true')
+    parser.add_argument("-workers", help="The number of processes to run the row-wise stages in", type=int, default=1)
+    parser.add_argument("-profile", help="Save the time, memory and row counts of every stage to this JSON or CSV file", 
+                        type=str)
+    parser.add_argument("-chunksize", help="Read the FDA CSVs this many rows at a time instead of whole", type=int)
+    parser.add_argument("-resume", help="Save a checkpoint after every stage and skip the stages whose inputs and rules are unchanged since one was saved", 
+                        action='store_true')
+    parser.add_argument("-from-stage", help="Rerun this stage and every one after it, resuming from the checkpoint before it", 
+                        choices=list(CHECKPOINT_STAGES))
+    parser.add_argument("-checkpoint-dir", help="The directory to keep the stage checkpoints in", type=str, 
+                        default='data/checkpoints')
+    parser.add_argument("-format", help="The format to write the generated codes in, instead of picking it from the file extension (.csv, .csv.gz, .csv.zst, .parquet, .feather or .arrow, .db or .sqlite)", 
+                        choices=sorted(set(OUTPUT_FORMATS.values())))
+    parser.add_argument("-max-memory", help="Generate the NDCs a partition of labelers at a time, spilling each to disk, so the working data stays within about this many megabytes", 
+                        type=int)
     args = parser.parse_args()
+    if args.max_memory is not None:
+        if args.max_memory <= 0:
+            parser.error("-max-memory must be a positive number of megabytes")
+        if args.previous or args.resume or args.from_stage:
+            parser.error("-max-memory cannot be combined with -previous, -resume or -from-stage")
     if args.generate:
-        main("generate", args.generate, args.level)
+        checkpoint_dir = args.checkpoint_dir if args.resume or args.from_stage else None
+        main("generate", args.generate, args.level, not args.no_cache, args.previous, args.workers, 
+             profile=args.profile, chunksize=args.chunksize, checkpoint_dir=checkpoint_dir, from_stage=args.from_stage, 
+             file_format=args.format, max_memory=args.max_memory, keep_fingerprints=args.fingerprints)
     elif args.validate:
-        main("validate", args.validate, args.level)
\ No newline at end of file
+        main("validate", args.validate, args.level, reference=args.reference, diff_file=args.diff, 
+             summary=not args.quiet)
\ No newline at end of file
@@ -0,0 +1,322 @@
+# Benchmark QUMI Code generation and the Medicare Part B merge on synthetic data
+#
+# For each scale, generates synthetic FDA and RxNorm inputs (see synthetic_data.py), then times:
+#   - Each stage of ./qumi-codes.py -generate, through the same stage metrics as -profile
+#   - The full ./qumi-codes.py -generate run, in a fresh process
+#   - The Medicare Part B merge on its bundled CSVs
+#
+# Each run is appended to a JSON Lines results file with the git commit and the SHA-256 of every output.
+# -compare checks the run against the latest earlier result on the same inputs, flagging slower stages
+# and failing if any output changed.
+#
+# Usage: python -m src.benchmarks.run_benchmarks
+#        -ndcs <count> [<count> ...]
+#        -seed <seed>
+#        -work_dir <path>        (synthetic inputs are kept here and reused across runs)
+#        -results_file <path>
+#        -workers <count>
+#        -compare
+#        -threshold <fraction>   (slowdown to flag, 0.25 by default)
+
+import argparse
+import glob
+import hashlib
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+import pandas as pd
+
+from src.benchmarks import synthetic_data
+from src.common.logger_config import logger, stage_metrics
+from src.medicare_part_b import merge_medicare_pricing
+from src.qumi_codes import api
+
+REPO_PATH = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+QUMI_CODES_PATH = api.SCRIPT_PATH
+MEDICARE_DATA_PATH = os.path.join(REPO_PATH, merge_medicare_pricing.DATA_PATH)
+MEDICARE_EFFECTIVE_DATE = "2026-01-01"
+DEFAULT_WORK_DIR = "benchmark-data"
+DEFAULT_RESULTS_FILE = "benchmark-results.jsonl"
+DEFAULT_THRESHOLD = 0.25
+OUTPUT_FILE = "universal-med-ids.csv"
+
+
+def load_qumi_codes():
+    """
+    Import qumi-codes.py as a module, which its dash keeps from a plain import.
+    """
+    return api.load_pipeline()
+
+
+def file_sha256(file_path):
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as output_file:
+        for block in iter(lambda: output_file.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def git_commit():
+    """
+    Return the current commit and whether the working tree has uncommitted changes.
+    """
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=REPO_PATH, capture_output=True, text=True, check=True
+        ).stdout.strip()
+        status = subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"],
+            cwd=REPO_PATH,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+    return commit, bool(status.strip())
+
+
+def prepare_inputs(work_dir, ndc_count, seed):
+    """
+    Generate the synthetic inputs for a scale, reusing them if an earlier run already generated them.
+    """
+    scale_dir = os.path.join(work_dir, f"{ndc_count}-{seed}")
+    manifest_path = os.path.join(scale_dir, "synthetic.json")
+    manifest = {"ndcs": ndc_count, "seed": seed, "generator_version": synthetic_data.GENERATOR_VERSION}
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as manifest_file:
+            existing = json.load(manifest_file)
+        if {key: existing.get(key) for key in manifest} == manifest:
+            return scale_dir, existing["packages"]
+    started = time.perf_counter()
+    manifest["packages"] = synthetic_data.generate(scale_dir, ndc_count, seed)
+    logger.info(f"Generated the {ndc_count} NDC inputs in {time.perf_counter() - started:.1f}s")
+    with open(manifest_path, "w") as manifest_file:
+        json.dump(manifest, manifest_file)
+    return scale_dir, manifest["packages"]
+
+
+def benchmark_stages(qumi_codes, scale_dir, workers):
+    """
+    Run generation in this process with stage metrics enabled and return the stage records.
+    The RxNorm extract cache is bypassed so the RxNorm queries are timed every run.
+    """
+    stage_metrics.enable()
+    stage_metrics.records.clear()
+    cwd = os.getcwd()
+    os.chdir(scale_dir)
+    try:
+        qumi_codes.generate_codes("in-process.csv", "info", use_cache=False, workers=workers)
+        output_sha256 = file_sha256("in-process.csv")
+    finally:
+        os.chdir(cwd)
+    return list(stage_metrics.records), output_sha256
+
+
+def benchmark_generate(scale_dir, workers):
+    """
+    Time a full ./qumi-codes.py -generate run in a fresh process, without the RxNorm extract cache.
+    """
+    command = [sys.executable, QUMI_CODES_PATH, "-generate", OUTPUT_FILE, "-level", "warning", "-no-cache"]
+    if workers > 1:
+        command += ["-workers", str(workers)]
+    started = time.perf_counter()
+    subprocess.run(command, cwd=scale_dir, check=True)
+    seconds = time.perf_counter() - started
+    return round(seconds, 6), file_sha256(os.path.join(scale_dir, OUTPUT_FILE))
+
+
+def find_medicare_file(pattern):
+    matches = sorted(glob.glob(os.path.join(MEDICARE_DATA_PATH, pattern)))
+    if not matches:
+        raise FileNotFoundError(f"No file matching '{pattern}' in {MEDICARE_DATA_PATH}")
+    return matches[-1]
+
+
+def benchmark_medicare_merge(work_dir):
+    """
+    Time the Medicare Part B merge on its bundled CSVs, writing the merged file under work_dir
+    rather than over the bundled one.
+    """
+    crosswalk_file_path = find_medicare_file("*Crosswalk*.csv")
+    asp_file_path = find_medicare_file("*Payment Limit*.csv")
+    addendum_b_file_path = find_medicare_file("*Addendum B*.csv")
+    stage_metrics.enable()
+    stage_metrics.records.clear()
+    cwd = os.getcwd()
+    os.makedirs(os.path.join(work_dir, merge_medicare_pricing.DATA_PATH), exist_ok=True)
+    os.chdir(work_dir)
+    try:
+        started = time.perf_counter()
+        merge_medicare_pricing.merge(
+            crosswalk_file_path, asp_file_path, addendum_b_file_path, MEDICARE_EFFECTIVE_DATE
+        )
+        seconds = time.perf_counter() - started
+        output_sha256 = file_sha256(merge_medicare_pricing.MERGED_FILE_PATH)
+    finally:
+        os.chdir(cwd)
+    return round(seconds, 6), list(stage_metrics.records), output_sha256
+
+
+def run_benchmark(qumi_codes, ndc_count, seed, work_dir, workers=1):
+    """
+    Benchmark one scale and return its result record.
+    """
+    scale_dir, packages = prepare_inputs(work_dir, ndc_count, seed)
+    logger.info(f"Benchmarking {packages} NDCs...")
+    stages, stages_sha256 = benchmark_stages(qumi_codes, scale_dir, workers)
+    generate_seconds, output_sha256 = benchmark_generate(scale_dir, workers)
+    if stages_sha256 != output_sha256:
+        logger.warning("The in-process and -generate outputs differ")
+    medicare_seconds, medicare_stages, medicare_sha256 = benchmark_medicare_merge(work_dir)
+    commit, dirty = git_commit()
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": commit,
+        "dirty": dirty,
+        "ndcs": ndc_count,
+        "seed": seed,
+        "generator_version": synthetic_data.GENERATOR_VERSION,
+        "packages": packages,
+        "workers": workers,
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "stages": stages,
+        "generate_seconds": generate_seconds,
+        "output_sha256": output_sha256,
+        "medicare_merge_seconds": medicare_seconds,
+        "medicare_stages": medicare_stages,
+        "medicare_output_sha256": medicare_sha256,
+    }
+
+
+def load_results(results_file_path):
+    if not os.path.exists(results_file_path):
+        return []
+    with open(results_file_path) as results_file:
+        return [json.loads(line) for line in results_file if line.strip()]
+
+
+def save_result(result, results_file_path):
+    with open(results_file_path, "a") as results_file:
+        results_file.write(json.dumps(result) + "\n")
+    logger.info(f"Saved benchmark results to {results_file_path}")
+
+
+def timings(result):
+    """
+    Flatten a result into {name: wall seconds}.
+    """
+    flat = {"generate": result["generate_seconds"], "medicare total": result["medicare_merge_seconds"]}
+    for stage in result["stages"]:
+        flat[f"stage {stage['stage']}"] = flat.get(f"stage {stage['stage']}", 0) + stage["wall_seconds"]
+    for stage in result["medicare_stages"]:
+        name = f"medicare stage {stage['stage']}"
+        flat[name] = flat.get(name, 0) + stage["wall_seconds"]
+    return flat
+
+
+def compare(result, baseline, threshold=DEFAULT_THRESHOLD):
+    """
+    Compare a result with a baseline on the same inputs.
+    Returns the lines of the comparison and whether every output is unchanged.
+    """
+    lines = [f"{result['ndcs']} NDCs, compared with {baseline['commit'] or 'unknown commit'} ({baseline['timestamp']}):"]
+    baseline_timings = timings(baseline)
+    for name, seconds in timings(result).items():
+        before = baseline_timings.get(name)
+        if not before:
+            lines.append(f"  {name}: {seconds:.3f}s (new)")
+            continue
+        ratio = seconds / before
+        flag = " SLOWER" if ratio > 1 + threshold else " faster" if ratio < 1 - threshold else ""
+        lines.append(f"  {name}: {before:.3f}s -> {seconds:.3f}s ({ratio:.2f}x){flag}")
+    unchanged = True
+    for key, name in [("output_sha256", "QUMI Codes"), ("medicare_output_sha256", "Medicare merge")]:
+        if result[key] != baseline[key]:
+            lines.append(f"  {name} output CHANGED")
+            unchanged = False
+    if unchanged:
+        lines.append("  Outputs unchanged")
+    return lines, unchanged
+
+
+def find_baseline(result, results):
+    """
+    Return the latest earlier result on the same synthetic inputs, or None.
+    """
+    keys = ["ndcs", "seed", "generator_version"]
+    matches = [earlier for earlier in results if all(earlier[key] == result[key] for key in keys)]
+    return matches[-1] if matches else None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark QUMI Code generation on synthetic data.")
+    parser.add_argument(
+        "-ndcs",
+        type=int,
+        nargs="+",
+        default=[10000],
+        help="Number of synthetic NDCs to benchmark at, e.g. 10000 100000 2000000",
+    )
+    parser.add_argument(
+        "-seed",
+        type=int,
+        default=0,
+        help="Random seed of the synthetic data",
+    )
+    parser.add_argument(
+        "-work_dir",
+        default=DEFAULT_WORK_DIR,
+        help="Directory to keep the synthetic inputs and outputs in",
+    )
+    parser.add_argument(
+        "-results_file",
+        default=DEFAULT_RESULTS_FILE,
+        help="JSON Lines file to append the results to",
+    )
+    parser.add_argument(
+        "-workers",
+        type=int,
+        default=1,
+        help="Number of processes for the row-wise stages",
+    )
+    parser.add_argument(
+        "-compare",
+        action="store_true",
+        help="Compare with the latest earlier result on the same inputs, failing if any output changed",
+    )
+    parser.add_argument(
+        "-threshold",
+        type=float,
+        default=DEFAULT_THRESHOLD,
+        help="Fractional slowdown to flag when comparing",
+    )
+    args = parser.parse_args()
+
+    # qumi-codes.py logs through the root logger, so keep it to warnings
+    logging.basicConfig(format="%(asctime)s %(name)s:%(levelname)s: %(message)s", level=logging.WARNING)
+    work_dir = os.path.abspath(args.work_dir)
+    results = load_results(args.results_file)
+    qumi_codes = load_qumi_codes()
+    all_unchanged = True
+    for ndc_count in args.ndcs:
+        result = run_benchmark(qumi_codes, ndc_count, args.seed, work_dir, args.workers)
+        if args.compare:
+            baseline = find_baseline(result, results)
+            if baseline is None:
+                logger.info(f"No earlier result for {ndc_count} NDCs to compare with")
+            else:
+                lines, unchanged = compare(result, baseline, args.threshold)
+                print("\n".join(lines))
+                all_unchanged = all_unchanged and unchanged
+        save_result(result, args.results_file)
+        results.append(result)
+    if not all_unchanged:
+        sys.exit(1)
@@ -0,0 +1,493 @@
+# Generate synthetic FDA and RxNorm inputs for benchmarking QUMI Code generation
+#
+# Writes the three inputs ./qumi-codes.py reads, at any scale and without network access:
+#   - data/package.csv and data/product.csv, shaped like the FDA NDC Directory files
+#   - data/rxnorm.db, a miniature RxNorm with the NDC, RXNCONSO and RXNREL tables
+#
+# The data mimics the patterns the pipeline depends on:
+#   - Nested package descriptions (CARTON / VIAL / mL, KIT with "*" separators, GLASS tray "> ")
+#   - Multi-ingredient strengths and units ("5; 0.0091", "mg/mL; mg/mL"), [iU] and [USP'U] units
+#   - 4-4-2, 5-3-2 and 5-4-1 NDC layouts, and RxNorm NDCs with a leading 12th digit
+#   - NDCs with several RXCUIs, RXCUIs ending in 9 and NDCs missing from RxNorm
+#   - SCD/SBD tradename pairs, DF and DFG relations, and unrelated noise concepts
+#
+# The same scale and seed always produce the same files.
+#
+# Usage: python -m src.benchmarks.synthetic_data
+#        -out_dir <path>
+#        -ndcs <count>
+#        -seed <seed>
+
+import argparse
+import os
+import random
+import sqlite3
+
+import pandas as pd
+
+from src.common.logger_config import logger
+
+# Bump whenever the generated data changes, so benchmark results are only compared on identical inputs
+GENERATOR_VERSION = 1
+MAX_LABELERS = 99998
+
+# (substance, nonproprietary name, brand, [(strength, unit)], form keys)
+SUBSTANCES = [
+    (
+        "POTASSIUM CHLORIDE",
+        "Potassium Chloride",
+        "K-Tab",
+        [("2", "meq/mL"), ("40", "meq/100mL"), ("600", "mg/1"), ("750", "mg/1"), ("7.46", "mg/mL"), ("1.5", "g/1")],
+        ["inj", "tab", "sol"],
+    ),
+    (
+        "SODIUM CHLORIDE",
+        "Sodium Chloride",
+        "Normal Saline",
+        [("9", "mg/mL"), ("0.9", "g/100mL"), ("4", "meq/mL")],
+        ["inj", "irr"],
+    ),
+    (
+        "ACETAMINOPHEN",
+        "Acetaminophen",
+        "Tylenol",
+        [("650", "mg/1"), ("325", "mg/1"), ("160", "mg/5mL"), ("10", "mg/mL")],
+        ["tab", "sol", "inj"],
+    ),
+    ("BLEOMYCIN SULFATE", "Bleomycin", "Blenoxane", [("15", "[iU]/1"), ("30", "[iU]/1")], ["inj"]),
+    (
+        "HUMAN RHO(D) IMMUNE GLOBULIN",
+        "Human Rho(D) Immune Globulin",
+        "RhoGAM",
+        [("1500", "[iU]/mL"), ("300", "ug/1")],
+        ["inj"],
+    ),
+    ("PETROLATUM", "Petrolatum", "Vaseline", [("1", "[USP'U]/g"), ("0.94", "g/g")], ["top"]),
+    (
+        "CASPOFUNGIN ACETATE",
+        "Caspofungin Acetate",
+        "Cancidas",
+        [("5", "mg/mL"), ("7", "mg/mL"), ("50", "mg/10mL")],
+        ["inj"],
+    ),
+    (
+        "GEMCITABINE HYDROCHLORIDE",
+        "Gemcitabine",
+        "Gemzar",
+        [("1", "g/26.3mL"), ("38", "mg/mL"), ("200", "mg/5.26mL")],
+        ["inj"],
+    ),
+    ("CEFAZOLIN SODIUM", "Cefazolin", "Ancef", [("225", "mg/mL"), ("1", "g/1"), ("500", "mg/1")], ["inj"]),
+    ("HYDROCORTISONE", "Hydrocortisone", "Cortaid", [("10", "mg/g"), ("25", "mg/g")], ["top"]),
+    (
+        "LIDOCAINE HYDROCHLORIDE",
+        "Lidocaine Hydrochloride",
+        "Xylocaine",
+        [("10", "mg/mL"), ("20", "mg/mL"), ("40", "mg/mL")],
+        ["inj", "top"],
+    ),
+    (
+        "BUPIVACAINE HYDROCHLORIDE; EPINEPHRINE BITARTRATE",
+        "Bupivacaine Hydrochloride and Epinephrine",
+        "Marcaine with Epinephrine",
+        [("5; 0.0091", "mg/mL; mg/mL"), ("2.5; 0.005", "mg/mL; mg/mL")],
+        ["inj"],
+    ),
+    (
+        "DEXTROSE MONOHYDRATE; POTASSIUM CHLORIDE; SODIUM CHLORIDE",
+        "Dextrose, Potassium Chloride and Sodium Chloride",
+        "Dextrose and KCl",
+        [("5; .745; 4.5", "g/100mL; g/L; g/100mL"), ("50; 2.98; 2.25", "g/L; g/L; g/L")],
+        ["inj"],
+    ),
+    (
+        "METHYLPREDNISOLONE SODIUM SUCCINATE",
+        "Methylprednisolone Sodium Succinate",
+        "Solu-Medrol",
+        [("40", "mg/mL"), ("125", "mg/2mL"), ("1", "g/16mL")],
+        ["inj"],
+    ),
+    (
+        "EPINEPHRINE",
+        "Epinephrine",
+        "EpiPen",
+        [("0.3", "mg/.3mL"), ("1", "mg/mL"), ("0.15", "mg/.3mL")],
+        ["inj", "auto"],
+    ),
+    (
+        "METOPROLOL SUCCINATE",
+        "Metoprolol Succinate",
+        "Toprol XL",
+        [("25", "mg/1"), ("50", "mg/1"), ("100", "mg/1")],
+        ["tab"],
+    ),
+    (
+        "ONDANSETRON HYDROCHLORIDE",
+        "Ondansetron",
+        "Zofran",
+        [("2", "mg/mL"), ("4", "mg/1"), ("8", "mg/1")],
+        ["inj", "tab"],
+    ),
+    ("TOBRAMYCIN SULFATE", "Tobramycin", "Tobrex", [("3", "mg/mL"), ("40", "mg/mL")], ["oph", "inj"]),
+    (
+        "CIPROFLOXACIN; DEXAMETHASONE",
+        "Ciprofloxacin and Dexamethasone",
+        "Ciprodex",
+        [("3; 1", "mg/mL; mg/mL")],
+        ["otic"],
+    ),
+    ("ALBUTEROL SULFATE", "Albuterol Sulfate", "Proventil", [("90", "ug/1"), ("0.83", "mg/mL")], ["inh"]),
+    (
+        "MORPHINE SULFATE",
+        "Morphine Sulfate",
+        "Duramorph",
+        [("2", "mg/mL"), ("4", "mg/mL"), ("10", "mg/mL"), ("15", "mg/1")],
+        ["inj", "tab"],
+    ),
+    (
+        "SODIUM PHOSPHATE, DIBASIC, UNSPECIFIED FORM; SODIUM PHOSPHATE, MONOBASIC, UNSPECIFIED FORM",
+        "Sodium Phosphates",
+        "Fleet",
+        [("7; 19", "g/118mL; g/118mL")],
+        ["rect"],
+    ),
+    (
+        "HEPARIN SODIUM",
+        "Heparin Sodium",
+        "Hep-Lock",
+        [("1000", "[USP'U]/mL"), ("5000", "[USP'U]/mL"), ("10", "[USP'U]/mL")],
+        ["inj"],
+    ),
+    (
+        "CYANOCOBALAMIN",
+        "Cyanocobalamin",
+        "Nascobal",
+        [("1000", "ug/mL"), ("500", "ug/.1mL")],
+        ["inj", "nasal"],
+    ),
+    # Kits list no substance or strength
+    (None, "Kit Components", "Convenience Kit", [(None, None)], ["kit"]),
+]
+
+# Form key -> (FDA dosage form, FDA routes, package kinds)
+FORMS = {
+    "inj": (
+        "INJECTION, SOLUTION",
+        ["INTRAVENOUS", "INTRAMUSCULAR; INTRAVENOUS", "SUBCUTANEOUS", "EPIDURAL", "INFILTRATION; PERINEURAL"],
+        ["vial", "syringe", "ampule", "bag", "vial_carton"],
+    ),
+    "auto": ("INJECTION", ["INTRAMUSCULAR"], ["auto_injector"]),
+    "tab": ("TABLET, FILM COATED", ["ORAL"], ["bottle", "blister"]),
+    "sol": ("SOLUTION", ["ORAL"], ["bottle_ml"]),
+    "irr": ("IRRIGANT", ["IRRIGATION"], ["bag"]),
+    "top": ("CREAM", ["TOPICAL"], ["tube"]),
+    "oph": ("SOLUTION/ DROPS", ["OPHTHALMIC"], ["dropper"]),
+    "otic": ("SUSPENSION/ DROPS", ["AURICULAR (OTIC)"], ["dropper"]),
+    "inh": ("AEROSOL, METERED", ["RESPIRATORY (INHALATION)"], ["inhaler"]),
+    "rect": ("ENEMA", ["RECTAL"], ["bottle_ml"]),
+    "nasal": ("SPRAY, METERED", ["NASAL"], ["dropper"]),
+    "kit": ("KIT", [None, "TOPICAL"], ["kit"]),
+}
+
+# Form key -> RxNorm dose forms (DF)
+DF_NAMES = {
+    "inj": ["Injectable Solution", "Injection", "Prefilled Syringe", "Cartridge"],
+    "auto": ["Auto-Injector"],
+    "tab": ["Oral Tablet", "24 HR Extended Release Oral Tablet"],
+    "sol": ["Oral Solution"],
+    "irr": ["Irrigation Solution"],
+    "top": ["Topical Cream", "Topical Ointment"],
+    "oph": ["Ophthalmic Solution"],
+    "otic": ["Otic Suspension"],
+    "inh": ["Metered Dose Inhaler"],
+    "rect": ["Enema"],
+    "nasal": ["Nasal Spray"],
+    "kit": ["Kit"],
+}
+
+# RxNorm dose form -> dose form groups (DFG)
+DFG_NAMES = {
+    "Injectable Solution": ["Injectable Product"],
+    "Injection": ["Injectable Product"],
+    "Prefilled Syringe": ["Injectable Product", "Prefilled Syringe Product"],
+    "Cartridge": ["Injectable Product"],
+    "Auto-Injector": ["Injectable Product"],
+    "Oral Tablet": ["Pill", "Oral Product"],
+    "24 HR Extended Release Oral Tablet": ["Oral Product", "Pill"],
+    "Oral Solution": ["Oral Liquid Product", "Oral Product"],
+    "Irrigation Solution": ["Irrigation Product"],
+    "Topical Cream": ["Topical Product"],
+    "Topical Ointment": ["Topical Product"],
+    "Ophthalmic Solution": ["Ophthalmic Product"],
+    "Otic Suspension": ["Otic Product"],
+    "Metered Dose Inhaler": ["Inhalant Product"],
+    "Enema": ["Rectal Product"],
+    "Nasal Spray": ["Nasal Product"],
+    "Kit": [],
+}
+
+
+def package_description(rng, kind, ndc):
+    """
+    Build an FDA-style package description of the given package kind.
+    """
+    volume = rng.choice(["1", "2", "5", "10", "20", "30", "50", "0.5", "1.5", "100"])
+    count = rng.choice(["1", "5", "10", "25", "50"])
+    if kind == "vial":
+        return rng.choice(
+            [
+                f"{count} VIAL, SINGLE-DOSE in 1 CARTON ({ndc})  / {volume} mL in 1 VIAL, SINGLE-DOSE",
+                f"{volume} mL in 1 VIAL, MULTI-DOSE ({ndc})",
+                f"{count} VIAL, GLASS in 1 TRAY ({ndc}) > {volume} mL in 1 VIAL, GLASS",
+            ]
+        )
+    if kind == "vial_carton":
+        return f"{count} CARTON in 1 CASE ({ndc})  / 1 VIAL in 1 CARTON / {volume} mL in 1 VIAL"
+    if kind == "syringe":
+        return rng.choice(
+            [
+                f"{count} SYRINGE in 1 CARTON ({ndc})  / {volume} mL in 1 SYRINGE",
+                f"{volume} mL in 1 SYRINGE, GLASS ({ndc})",
+            ]
+        )
+    if kind == "ampule":
+        return f"{count} AMPULE in 1 BOX ({ndc})  / {volume} mL in 1 AMPULE"
+    if kind == "bag":
+        return rng.choice(
+            [
+                f"{count} BAG in 1 CARTON ({ndc})  / {rng.choice(['250', '500', '1000'])} mL in 1 BAG",
+                f"1 L in 1 BAG ({ndc})",
+            ]
+        )
+    if kind == "auto_injector":
+        return f"2 SYRINGE, PLASTIC in 1 CARTON ({ndc})  / .3 mL in 1 SYRINGE, PLASTIC"
+    if kind == "bottle":
+        return rng.choice(
+            [
+                f"{rng.choice(['30', '90', '100', '500', '1000'])} TABLET in 1 BOTTLE ({ndc})",
+                f"{rng.choice(['30', '90'])} TABLET, FILM COATED in 1 BOTTLE, PLASTIC ({ndc})",
+            ]
+        )
+    if kind == "blister":
+        return f"{count} BLISTER PACK in 1 CARTON ({ndc})  / 10 TABLET in 1 BLISTER PACK"
+    if kind == "bottle_ml":
+        return f"{rng.choice(['118', '473', '236', '120'])} mL in 1 BOTTLE ({ndc})"
+    if kind == "tube":
+        return rng.choice(
+            [
+                f"1 TUBE in 1 CARTON ({ndc})  / {rng.choice(['28', '28.35', '30', '454'])} g in 1 TUBE",
+                f"{rng.choice(['28.4', '15', '453.6'])} g in 1 JAR ({ndc})",
+            ]
+        )
+    if kind == "dropper":
+        return (
+            f"1 BOTTLE, DROPPER in 1 CARTON ({ndc})  / {rng.choice(['5', '7.5', '10'])} mL in 1 BOTTLE, DROPPER"
+        )
+    if kind == "inhaler":
+        return f"1 INHALER in 1 CARTON ({ndc})  / 200 AEROSOL, METERED in 1 INHALER"
+    if kind == "kit":
+        return f"1 KIT in 1 KIT ({ndc}) * 5 mL in 1 VIAL * 1 APPLICATOR in 1 POUCH"
+    raise ValueError(f"Unknown package kind: {kind}")
+
+
+def format_ndc(labeler, product, package, layout):
+    """
+    Format a package NDC and its product NDC in one of the 4-4-2, 5-3-2 or 5-4-1 layouts.
+    """
+    if layout == 0:
+        return f"{labeler:04d}-{product:04d}-{package:02d}", f"{labeler:04d}-{product:04d}"
+    if layout == 1:
+        return f"{labeler:05d}-{product:03d}-{package:02d}", f"{labeler:05d}-{product:03d}"
+    return f"{labeler:05d}-{product:04d}-{package:01d}", f"{labeler:05d}-{product:04d}"
+
+
+def eleven_digits(ndc):
+    """
+    Convert a dashed NDC into the plain 11 digits RxNorm stores.
+    """
+    labeler, product, package = ndc.split("-")
+    return labeler.zfill(5) + product.zfill(4) + package.zfill(2)
+
+
+def generate(out_dir, ndc_count, seed=0):
+    """
+    Write data/package.csv, data/product.csv and data/rxnorm.db under out_dir with about ndc_count
+    package NDCs. Returns the number of package NDCs written.
+    """
+    rng = random.Random(seed)
+    data_dir = os.path.join(out_dir, "data")
+    os.makedirs(data_dir, exist_ok=True)
+    products, packages = [], []
+    ndc_rows, conso_rows, rel_rows = [], [], []
+    last_rxcui = 100000
+
+    def new_rxcui(last_digit=None):
+        nonlocal last_rxcui
+        last_rxcui += rng.randint(1, 30)
+        if last_digit is not None:
+            last_rxcui = last_rxcui - last_rxcui % 10 + last_digit
+        return str(last_rxcui)
+
+    # Dose form and dose form group concepts
+    df_rxcuis, dfg_rxcuis = {}, {}
+    for df_names in DF_NAMES.values():
+        for df_name in df_names:
+            if df_name not in df_rxcuis:
+                df_rxcuis[df_name] = new_rxcui()
+                conso_rows.append((df_rxcuis[df_name], "RXNORM", "DF", df_name))
+    for df_name, dfg_names in DFG_NAMES.items():
+        for dfg_name in dfg_names:
+            if dfg_name not in dfg_rxcuis:
+                dfg_rxcuis[dfg_name] = new_rxcui()
+                conso_rows.append((dfg_rxcuis[dfg_name], "RXNORM", "DFG", dfg_name))
+            rel_rows.append((df_rxcuis[df_name], dfg_rxcuis[dfg_name], "inverse_isa", "RXNORM"))
+
+    # Products and their packages, about 2.5 packages per product and 4 products per labeler
+    clinical_drugs = {}
+    labelers = rng.sample(range(1, MAX_LABELERS + 1), min(MAX_LABELERS, max(40, ndc_count // 10)))
+    layouts = {labeler: (0 if labeler < 10000 else rng.randint(1, 2)) for labeler in labelers}
+    used_products = set()
+    while len(packages) < ndc_count:
+        substance, nonproprietary, brand, strengths, form_keys = rng.choice(SUBSTANCES)
+        strength, unit = rng.choice(strengths)
+        form_key = rng.choice(form_keys)
+        dosage_form, routes, package_kinds = FORMS[form_key]
+        labeler = rng.choice(labelers)
+        layout = layouts[labeler]
+        product = rng.randint(1, 999 if layout == 1 else 9999)
+        if (labeler, product) in used_products:
+            continue
+        used_products.add((labeler, product))
+        branded = rng.random() < 0.3
+
+        # One SCD and SBD per substance, strength and form, some with RXCUIs ending in 9
+        key = (substance, strength, unit, form_key)
+        if key not in clinical_drugs:
+            scd = new_rxcui(9 if rng.random() < 0.15 else None)
+            df_name = rng.choice(DF_NAMES[form_key])
+            scd_name = f"{nonproprietary.lower()} {strength or ''} {(unit or '').upper().replace('/1', '')} {df_name}"
+            if form_key == "tab" and rng.random() < 0.3:
+                scd_name = f"24 HR {nonproprietary.lower()} {strength} MG Extended Release Oral Tablet"
+            if form_key == "inj" and rng.random() < 0.3:
+                scd_name = f"{rng.choice(['1', '2', '10'])} ML {nonproprietary.lower()} {strength} MG/ML Injection"
+            conso_rows.append((scd, "RXNORM", "SCD", scd_name))
+            conso_rows.append((scd, "MTHSPL", "SCD", scd_name.upper()))
+            rel_rows.append((scd, df_rxcuis[df_name], "dose_form_of", "RXNORM"))
+            if rng.random() < 0.1:
+                rel_rows.append((scd, df_rxcuis[rng.choice(list(df_rxcuis))], "dose_form_of", "RXNORM"))
+            sbd = new_rxcui()
+            conso_rows.append((sbd, "RXNORM", "SBD", f"{scd_name} [{brand}]"))
+            rel_rows.append((sbd, df_rxcuis[df_name], "dose_form_of", "RXNORM"))
+            rel_rows.append((scd, sbd, "tradename_of", "RXNORM"))
+            rel_rows.append((sbd, scd, "has_tradename", "RXNORM"))
+            # A neighbouring RXCUI in the same block of ten, to exercise the ambiguity rules
+            clinical_drugs[key] = (scd, sbd, str(int(scd) + 1))
+        scd, sbd, neighbour = clinical_drugs[key]
+
+        _, product_ndc = format_ndc(labeler, product, 0, layout)
+        product_id = f"{product_ndc}_{rng.getrandbits(64):016x}"
+        products.append(
+            {
+                "PRODUCTID": product_id,
+                "PRODUCTNDC": product_ndc,
+                "PRODUCTTYPENAME": "HUMAN PRESCRIPTION DRUG",
+                "PROPRIETARYNAME": brand if branded else nonproprietary,
+                "PROPRIETARYNAMESUFFIX": None,
+                "NONPROPRIETARYNAME": nonproprietary,
+                "DOSAGEFORMNAME": dosage_form,
+                "ROUTENAME": rng.choice(routes),
+                "STARTMARKETINGDATE": "20200101",
+                "ENDMARKETINGDATE": None,
+                "MARKETINGCATEGORYNAME": "ANDA",
+                "APPLICATIONNUMBER": rng.choice(["ANDA", "NDA", "BLA"]) + f"{rng.randint(1, 999999):06d}",
+                "LABELERNAME": f"Labeler {labeler} Pharmaceuticals, Inc.",
+                "SUBSTANCENAME": substance,
+                "ACTIVE_NUMERATOR_STRENGTH": strength,
+                "ACTIVE_INGRED_UNIT": unit,
+                "PHARM_CLASSES": None,
+                "DEASCHEDULE": rng.choice([None, None, None, "CII", "CIII", "CIV", "CV"]),
+                "NDC_EXCLUDE_FLAG": "N",
+                "LISTING_RECORD_CERTIFIED_THROUGH": "20251231",
+            }
+        )
+        for _ in range(rng.randint(1, 4)):
+            ndc, _ = format_ndc(labeler, product, rng.randint(1, 9 if layout == 2 else 99), layout)
+            if any(package["NDCPACKAGECODE"] == ndc for package in packages[-5:]):
+                continue
+            packages.append(
+                {
+                    "PRODUCTID": product_id,
+                    "PRODUCTNDC": product_ndc,
+                    "NDCPACKAGECODE": ndc,
+                    "PACKAGEDESCRIPTION": package_description(rng, rng.choice(package_kinds), ndc),
+                    "STARTMARKETINGDATE": "20200101",
+                    "ENDMARKETINGDATE": None,
+                    "NDC_EXCLUDE_FLAG": "N",
+                    "SAMPLE_PACKAGE": "N",
+                }
+            )
+            # 10% of NDCs are missing from RxNorm, 2% carry a leading 12th digit and some have several RXCUIs
+            roll = rng.random()
+            if roll < 0.1:
+                continue
+            rxnorm_ndc = eleven_digits(ndc)
+            if roll < 0.12:
+                rxnorm_ndc = "0" + rxnorm_ndc
+            ndc_rows.append((sbd if branded else scd, rxnorm_ndc))
+            if roll > 0.9:
+                ndc_rows.append((neighbour, rxnorm_ndc))
+            if roll > 0.97:
+                ndc_rows.append((new_rxcui(), rxnorm_ndc))
+
+    # Unrelated concepts, which the RxNorm queries have to skip over
+    for _ in range(len(products)):
+        rxcui = new_rxcui()
+        conso_rows.append(
+            (rxcui, rng.choice(["RXNORM", "MMSL", "VANDF"]), rng.choice(["IN", "SCDC", "BN", "SCD"]), f"noise {rxcui}")
+        )
+        rel_rows.append((rxcui, new_rxcui(), rng.choice(["has_ingredient", "constitutes", "isa"]), "RXNORM"))
+
+    pd.DataFrame(products).to_csv(os.path.join(data_dir, "product.csv"), index=False)
+    pd.DataFrame(packages).to_csv(os.path.join(data_dir, "package.csv"), index=False)
+    rxnorm_path = os.path.join(data_dir, "rxnorm.db")
+    if os.path.exists(rxnorm_path):
+        os.remove(rxnorm_path)
+    rng.shuffle(conso_rows)
+    rng.shuffle(rel_rows)
+    conn = sqlite3.connect(rxnorm_path)
+    try:
+        conn.execute("CREATE TABLE NDC (RXCUI VARCHAR(8), NDC VARCHAR(12))")
+        conn.execute("CREATE TABLE RXNCONSO (RXCUI VARCHAR(8), SAB VARCHAR(20), TTY VARCHAR(20), STR VARCHAR(3000))")
+        conn.execute("CREATE TABLE RXNREL (RXCUI1 VARCHAR(8), RXCUI2 VARCHAR(8), RELA VARCHAR(100), SAB VARCHAR(20))")
+        conn.executemany("INSERT INTO NDC VALUES (?, ?)", ndc_rows)
+        conn.executemany("INSERT INTO RXNCONSO VALUES (?, ?, ?, ?)", conso_rows)
+        conn.executemany("INSERT INTO RXNREL VALUES (?, ?, ?, ?)", rel_rows)
+        conn.commit()
+    finally:
+        conn.close()
+    logger.info(f"Generated {len(packages)} NDCs of {len(products)} products in {data_dir}")
+    return len(packages)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate synthetic FDA and RxNorm inputs.")
+    parser.add_argument(
+        "-out_dir",
+        required=True,
+        help="Directory to write data/package.csv, data/product.csv and data/rxnorm.db under",
+    )
+    parser.add_argument(
+        "-ndcs",
+        type=int,
+        default=10000,
+        help="Number of package NDCs to generate",
+    )
+    parser.add_argument(
+        "-seed",
+        type=int,
+        default=0,
+        help="Random seed",
+    )
+    args = parser.parse_args()
+
+    generate(args.out_dir, args.ndcs, args.seed)
@@ -1,9 +1,23 @@
+import csv
+import json
 import logging
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:
+    resource = None
 
 # Create a logger
 logger = logging.getLogger('app_logger')
 logger.setLevel(logging.DEBUG)
 
+# Keep records out of the root logger, whose handlers would print them a second time
+logger.propagate = False
+
 # Create console handler and set level to debug
 console_handler = logging.StreamHandler()
 console_handler.setLevel(logging.INFO)
@@ -16,3 +30,86 @@ console_handler.setFormatter(formatter)
 
 # Add console handler to logger
 logger.addHandler(console_handler)
+
+
+class StageMetrics:
+    """
+    Records wall time, CPU time, memory and row counts for each named stage of a pipeline.
+    Disabled by default, in which case stages cost nothing beyond the context manager.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.records = []
+
+    def enable(self, trace_memory=True):
+        """
+        Start recording stages, tracing Python allocations with tracemalloc unless trace_memory is False.
+        """
+        self.enabled = True
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @contextmanager
+    def stage(self, name, rows_in=None):
+        """
+        Measure the enclosed block as one stage. The yielded record accepts a "rows_out" count.
+        """
+        record = {"stage": name, "rows_in": rows_in, "rows_out": None}
+        if not self.enabled:
+            yield record
+            return
+        tracing = tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.reset_peak()
+            traced_start = tracemalloc.get_traced_memory()[0]
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        try:
+            yield record
+        finally:
+            record["wall_seconds"] = round(time.perf_counter() - wall_start, 6)
+            record["cpu_seconds"] = round(time.process_time() - cpu_start, 6)
+            record["traced_peak_delta_bytes"] = (
+                tracemalloc.get_traced_memory()[1] - traced_start if tracing else None
+            )
+            record["peak_rss_bytes"] = peak_rss_bytes()
+            self.records.append(record)
+            logger.debug(
+                "Stage %s: %.3fs wall, %.3fs CPU, rows %s -> %s",
+                name,
+                record["wall_seconds"],
+                record["cpu_seconds"],
+                record["rows_in"],
+                record["rows_out"],
+            )
+
+    def write(self, file_path):
+        """
+        Save the recorded stages as JSON or CSV, depending on the file extension.
+        """
+        if file_path.lower().endswith(".json"):
+            with open(file_path, "w") as metrics_file:
+                json.dump(self.records, metrics_file, indent=2)
+        else:
+            columns = list(dict.fromkeys(key for record in self.records for key in record))
+            with open(file_path, "w", newline="") as metrics_file:
+                writer = csv.DictWriter(metrics_file, fieldnames=columns)
+                writer.writeheader()
+                writer.writerows(self.records)
+        logger.info(f"Saved stage metrics to {file_path}")
+
+
+def peak_rss_bytes():
+    """
+    Return the peak resident set size of this process so far, or None where it is unavailable.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+# Shared stage metrics, enabled by the scripts' -profile options
+stage_metrics = StageMetrics()
@@ -12,24 +12,41 @@
 #        -asp_file <path>
 #        -addendum_b_file <path>
 #        -effective_date <YYYY-MM-DD>
+#        -profile <path>       (optional, saves per-stage metrics as JSON or CSV)
+#        -history_db <path>    (optional, also appends the merged quarter to a pricing history)
+#
+# Batch usage: python -m src.medicare_part_b.merge_medicare_pricing
+#        -batch <path>         (directory with one YYYY-MM-DD subdirectory of files per quarter, or a manifest CSV
+#                               with effective_date, crosswalk_file, asp_file and addendum_b_file columns)
+#        -workers <count>      (optional, quarters merged in parallel, defaults to the CPU count)
+#        -output_file <path>   (optional, defaults to MERGED_PERIODS_FILE_PATH)
+#        -profile <path>
+#        -history_db <path>    (optional, also appends every merged quarter to a pricing history)
 
 import argparse
+import concurrent.futures
+import csv
+import itertools
+import os
+import re
+
 import pandas as pd
 
-from src.common.logger_config import logger
+from src.common.logger_config import logger, stage_metrics
+from src.medicare_part_b import pricing_history
 
 DATA_PATH = "src/medicare_part_b/data"
 MERGED_FILE_PATH = f"{DATA_PATH}/medicare-pricing-merged.csv"
+MERGED_PERIODS_FILE_PATH = f"{DATA_PATH}/medicare-pricing-merged-periods.csv"
 FILE_ENCODING = "ISO-8859-1"
-ASP_HEADER_ROW = 8  # 0-indexed
-CROSSWALK_HEADER_ROW = 8  # 0-indexed
-ADDENDUM_B_HEADER_ROW = 4  # 0-indexed
+HEADER_SCAN_ROWS = 50
+# The crosswalk names its HCPCS Code column after the payment year, e.g. _2026_CODE
+CODE_COLUMN_PATTERN = re.compile(r"^_\d{4}_CODE$")
 ASP_COLUMNS = [
     "HCPCS Code",
     "Payment Limit",
 ]
 CROSSWALK_COLUMNS = [
-    "_2026_CODE",
     "NDC2",
     "Short Description",
     "Drug Name",
@@ -41,6 +58,12 @@ ADDENDUM_B_COLUMNS = [
     "HCPCS Code",
     "SI",
 ]
+FILE_KINDS = {
+    "crosswalk": CROSSWALK_COLUMNS,
+    "asp": ASP_COLUMNS,
+    "addendum_b": ADDENDUM_B_COLUMNS,
+}
+MANIFEST_COLUMNS = ["effective_date"] + [f"{kind}_file" for kind in FILE_KINDS]
 
 
 def validate_ndc_format(df):
@@ -75,24 +98,61 @@ def calculate_asp(payment_limit, markup_percentage=0.06):
     return payment_limit / (1 + markup_percentage)
 
 
-def merge(crosswalk_file_path, asp_file_path, addendum_b_file_path, effective_date):
+def detect_header(file_path):
+    """
+    Find the header row of a crosswalk, ASP or Addendum B file, since CMS moves it between releases.
+    Returns the kind of file, the 0-indexed header row as pandas counts it (skipping blank lines)
+    and, for the crosswalk, its year-specific HCPCS Code column.
+    """
+    with open(file_path, encoding=FILE_ENCODING, newline="") as file:
+        rows = (row for row in csv.reader(file) if row)
+        for header_row, row in enumerate(itertools.islice(rows, HEADER_SCAN_ROWS)):
+            code_columns = [cell for cell in row if CODE_COLUMN_PATTERN.match(cell)]
+            for kind, columns in FILE_KINDS.items():
+                if kind == "crosswalk" and len(code_columns) != 1:
+                    continue
+                if set(columns) <= set(row):
+                    return kind, header_row, code_columns[0] if kind == "crosswalk" else None
+    raise ValueError(
+        f"No crosswalk, ASP or Addendum B header found in the first {HEADER_SCAN_ROWS} rows of {file_path}"
+    )
+
+
+def detect_file_set(file_paths):
+    """
+    Detect the header of every file of a quarter, which must be one crosswalk, one ASP and one Addendum B file.
+    Returns the file path, header row and code column of each kind of file.
+    """
+    file_set = {}
+    for file_path in file_paths:
+        kind, header_row, code_column = detect_header(file_path)
+        if kind in file_set:
+            raise ValueError(f"Found more than one {kind} file: {file_set[kind][0]}, {file_path}")
+        file_set[kind] = (file_path, header_row, code_column)
+    missing = [kind for kind in FILE_KINDS if kind not in file_set]
+    if missing:
+        raise ValueError(f"Missing {', '.join(missing)} file(s) among: {', '.join(map(str, file_paths))}")
+    return file_set
+
+
+def read_crosswalk(file_path, header_row, code_column):
     crosswalk_df = pd.read_csv(
-        crosswalk_file_path,
+        file_path,
         encoding=FILE_ENCODING,
-        header=CROSSWALK_HEADER_ROW,
-        usecols=CROSSWALK_COLUMNS,
+        header=header_row,
+        usecols=[code_column] + CROSSWALK_COLUMNS,
     )
 
     # Strip whitespace from crosswalk text columns to normalize values
-    crosswalk_df["_2026_CODE"] = crosswalk_df["_2026_CODE"].str.strip()
+    crosswalk_df[code_column] = crosswalk_df[code_column].str.strip()
     crosswalk_df["NDC2"] = crosswalk_df["NDC2"].str.strip()
     crosswalk_df["Drug Name"] = crosswalk_df["Drug Name"].str.strip()
     crosswalk_df["Short Description"] = crosswalk_df["Short Description"].str.strip()
 
     # Rename crosswalk columns for consistency
-    crosswalk_df_renamed = crosswalk_df.rename(
+    return crosswalk_df.rename(
         columns={
-            "_2026_CODE": "HCPCS Code",
+            code_column: "HCPCS Code",
             "NDC2": "NDC",
             "Short Description": "Description",
             "PKG SIZE": "Pkg Size",
@@ -101,22 +161,28 @@ def merge(crosswalk_file_path, asp_file_path, addendum_b_file_path, effective_da
         }
     )
 
-    asp_df = pd.read_csv(
-        asp_file_path,
+
+def read_asp(file_path, header_row):
+    return pd.read_csv(
+        file_path,
         encoding=FILE_ENCODING,
-        header=ASP_HEADER_ROW,
+        header=header_row,
         usecols=ASP_COLUMNS,
     )
 
-    addendum_b_df = pd.read_csv(
-        addendum_b_file_path,
+
+def read_addendum_b(file_path, header_row):
+    return pd.read_csv(
+        file_path,
         encoding=FILE_ENCODING,
-        header=ADDENDUM_B_HEADER_ROW,
+        header=header_row,
         usecols=ADDENDUM_B_COLUMNS,
     )
 
+
+def merge_frames(crosswalk_df, asp_df, addendum_b_df, effective_date):
     # Merge crosswalk with ASP DataFrames on HCPCS Code
-    merged_df = pd.merge(crosswalk_df_renamed, asp_df, on="HCPCS Code")
+    merged_df = pd.merge(crosswalk_df, asp_df, on="HCPCS Code")
 
     # Add Average Sales Price (ASP) column
     merged_df["ASP"] = calculate_asp(merged_df["Payment Limit"]).round(3)
@@ -125,40 +191,208 @@ def merge(crosswalk_file_path, asp_file_path, addendum_b_file_path, effective_da
     merged_df = pd.merge(merged_df, addendum_b_df, on="HCPCS Code", how="left")
 
     # Add Effective Start Date column
-    merged_df["Effective Start Date"] = pd.to_datetime(effective_date).strftime(
-        "%Y-%m-%d"
-    )
+    merged_df["Effective Start Date"] = pd.to_datetime(effective_date).strftime("%Y-%m-%d")
+    return merged_df
+
+
+def append_history(history_db_path, merged_dfs, source):
+    """
+    Append merged quarters to the pricing history in order, returning the number of rows written.
+    """
+    written_count = 0
+    history_conn = pricing_history.connect(history_db_path)
+    try:
+        for merged_df in merged_dfs:
+            changed_count, removed_count = pricing_history.ingest(history_conn, merged_df, source=source)
+            written_count += changed_count + removed_count
+    finally:
+        history_conn.close()
+    return written_count
+
+
+def merge(crosswalk_file_path, asp_file_path, addendum_b_file_path, effective_date, history_db_path=None):
+    file_set = detect_file_set([crosswalk_file_path, asp_file_path, addendum_b_file_path])
+
+    with stage_metrics.stage("read crosswalk") as stage:
+        crosswalk_df = read_crosswalk(*file_set["crosswalk"])
+        stage["rows_out"] = len(crosswalk_df)
+
+    with stage_metrics.stage("read asp") as stage:
+        asp_df = read_asp(*file_set["asp"][:2])
+        stage["rows_out"] = len(asp_df)
+
+    with stage_metrics.stage("read addendum b") as stage:
+        addendum_b_df = read_addendum_b(*file_set["addendum_b"][:2])
+        stage["rows_out"] = len(addendum_b_df)
+
+    with stage_metrics.stage("merge", len(crosswalk_df)) as stage:
+        merged_df = merge_frames(crosswalk_df, asp_df, addendum_b_df, effective_date)
+        stage["rows_out"] = len(merged_df)
 
     # Validation
-    validate_ndc_format(merged_df)
+    with stage_metrics.stage("validate", len(merged_df)):
+        validate_ndc_format(merged_df)
 
     # Save the result to a CSV file
-    merged_df.to_csv(MERGED_FILE_PATH, index=False)
+    with stage_metrics.stage("write", len(merged_df)) as stage:
+        merged_df.to_csv(MERGED_FILE_PATH, index=False)
+        stage["rows_out"] = len(merged_df)
     logger.info(f"Saved merged data to {MERGED_FILE_PATH}")
 
+    # Append the quarter to the pricing history
+    if history_db_path:
+        with stage_metrics.stage("history", len(merged_df)) as stage:
+            stage["rows_out"] = append_history(history_db_path, [merged_df], MERGED_FILE_PATH)
+
+
+def find_periods(batch_path):
+    """
+    List the quarters of a batch as (effective date, file paths) pairs in date order, from either:
+      - a manifest CSV with effective_date, crosswalk_file, asp_file and addendum_b_file columns,
+        where relative file paths are relative to the manifest
+      - a directory with one subdirectory per quarter, named by its effective date (YYYY-MM-DD)
+        and holding that quarter's CSV files
+    """
+    periods = []
+    if os.path.isdir(batch_path):
+        for name in sorted(os.listdir(batch_path)):
+            period_path = os.path.join(batch_path, name)
+            if not os.path.isdir(period_path):
+                continue
+            file_paths = sorted(
+                os.path.join(period_path, file_name)
+                for file_name in os.listdir(period_path)
+                if file_name.lower().endswith(".csv")
+            )
+            periods.append((name, file_paths))
+    else:
+        manifest_df = pd.read_csv(batch_path, dtype=str)
+        missing = [column for column in MANIFEST_COLUMNS if column not in manifest_df.columns]
+        if missing:
+            raise ValueError(f"Manifest {batch_path} is missing column(s): {', '.join(missing)}")
+        manifest_dir = os.path.dirname(batch_path)
+        for row in manifest_df[MANIFEST_COLUMNS].itertuples(index=False):
+            periods.append((row[0], [os.path.join(manifest_dir, file_path.strip()) for file_path in row[1:]]))
+
+    dated_periods = []
+    for effective_date, file_paths in periods:
+        try:
+            effective_date = pd.to_datetime(effective_date, format="%Y-%m-%d").strftime("%Y-%m-%d")
+        except ValueError:
+            raise ValueError(f"Expected a YYYY-MM-DD effective date for quarter {effective_date} of {batch_path}")
+        dated_periods.append((effective_date, file_paths))
+    dated_periods.sort()
+    dates = [effective_date for effective_date, _ in dated_periods]
+    duplicated = sorted({effective_date for effective_date in dates if dates.count(effective_date) > 1})
+    if duplicated:
+        raise ValueError(f"Found more than one quarter effective {', '.join(duplicated)} in {batch_path}")
+    return dated_periods
+
+
+def merge_period(effective_date, file_paths):
+    """
+    Detect, read, merge and validate the files of one quarter.
+    Runs in a worker process when quarters are merged in parallel.
+    """
+    file_set = detect_file_set(file_paths)
+    merged_df = merge_frames(
+        read_crosswalk(*file_set["crosswalk"]),
+        read_asp(*file_set["asp"][:2]),
+        read_addendum_b(*file_set["addendum_b"][:2]),
+        effective_date,
+    )
+    validate_ndc_format(merged_df)
+    return merged_df
+
+
+def merge_periods(batch_path, workers=None, output_file_path=MERGED_PERIODS_FILE_PATH, history_db_path=None):
+    """
+    Merge every quarter of a batch into one CSV, in Effective Start Date order.
+    """
+    periods = find_periods(batch_path)
+    if not periods:
+        raise ValueError(f"No quarters found in {batch_path}")
+    workers = min(workers or os.cpu_count() or 1, len(periods))
+
+    with stage_metrics.stage("merge periods") as stage:
+        if workers <= 1:
+            merged_dfs = list(itertools.starmap(merge_period, periods))
+        else:
+            with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+                merged_dfs = list(pool.map(merge_period, *zip(*periods)))
+        merged_df = pd.concat(merged_dfs, ignore_index=True)
+        stage["rows_out"] = len(merged_df)
+
+    with stage_metrics.stage("write", len(merged_df)) as stage:
+        merged_df.to_csv(output_file_path, index=False)
+        stage["rows_out"] = len(merged_df)
+    logger.info(f"Saved merged data of {len(periods)} quarters to {output_file_path}")
+
+    # Append the quarters to the pricing history
+    if history_db_path:
+        with stage_metrics.stage("history", len(merged_df)) as stage:
+            stage["rows_out"] = append_history(history_db_path, merged_dfs, output_file_path)
+
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Merge Medicare Pricing files.")
     parser.add_argument(
         "-crosswalk_file",
-        required=True,
         help="Path to the NDC-HCPCS Crosswalk file",
     )
     parser.add_argument(
         "-asp_file",
-        required=True,
         help="Path to the ASP Pricing file",
     )
     parser.add_argument(
         "-addendum_b_file",
-        required=True,
         help="Path to the Addendum B file",
     )
     parser.add_argument(
         "-effective_date",
-        required=True,
         help="Effective date for the pricing data (YYYY-MM-DD)",
     )
+    parser.add_argument(
+        "-batch",
+        help="Directory of YYYY-MM-DD quarter subdirectories, or manifest CSV, of quarters to merge into one file",
+    )
+    parser.add_argument(
+        "-workers",
+        type=int,
+        help="Number of quarters to merge in parallel in -batch mode (default: CPU count)",
+    )
+    parser.add_argument(
+        "-output_file",
+        default=MERGED_PERIODS_FILE_PATH,
+        help="Path to the consolidated CSV written in -batch mode",
+    )
+    parser.add_argument(
+        "-profile",
+        help="Path to a JSON or CSV file to save per-stage time, memory and row counts to",
+    )
+    parser.add_argument(
+        "-history_db",
+        help="Path to a SQLite pricing history to append the merged quarters to",
+    )
     args = parser.parse_args()
 
-    merge(args.crosswalk_file, args.asp_file, args.addendum_b_file, args.effective_date)
+    single_args = [args.crosswalk_file, args.asp_file, args.addendum_b_file, args.effective_date]
+    if args.batch and any(single_args):
+        parser.error("-batch cannot be combined with -crosswalk_file, -asp_file, -addendum_b_file or -effective_date")
+    if not args.batch and not all(single_args):
+        parser.error("-crosswalk_file, -asp_file, -addendum_b_file and -effective_date are required without -batch")
+
+    if args.profile:
+        stage_metrics.enable()
+    if args.batch:
+        merge_periods(args.batch, args.workers, args.output_file, args.history_db)
+    else:
+        merge(
+            args.crosswalk_file,
+            args.asp_file,
+            args.addendum_b_file,
+            args.effective_date,
+            args.history_db,
+        )
+    if args.profile:
+        stage_metrics.write(args.profile)
@@ -0,0 +1,283 @@
+# Keep an effective-dated history of merged Medicare pricing
+#
+# Each quarter's merged crosswalk/ASP/Addendum B data is appended to a SQLite database, which stores:
+#   - Only the HCPCS Code/NDC pairs whose price, status or package data changed since the last quarter
+#   - A removal marker for every pair that dropped out of the quarter
+#
+# Pricing can then be read as of any date, or as the series of changes of an NDC, without re-merging
+# old files.
+#
+# Usage: python -m src.medicare_part_b.pricing_history
+#        -history_db <path>
+#        -ingest <path> [<path> ...]   (merged CSVs to append, in Effective Start Date order)
+#        -as_of <YYYY-MM-DD>           (pricing as of a date, optionally for one -ndc or -hcpcs_code)
+#        -ndc <ndc> -series            (every change to the pricing of an NDC)
+#        -output_file <path>           (optional, saves query results as CSV instead of printing them)
+
+import argparse
+import sqlite3
+from datetime import datetime, timezone
+
+import pandas as pd
+
+from src.common.logger_config import logger
+from src.qumi_codes.lookup_index import pack_ndc, unpack_ndc
+
+HISTORY_DB_PATH = "src/medicare_part_b/data/medicare-pricing-history.db"
+DATE_COLUMN = "Effective Start Date"
+KEY_COLUMNS = {
+    "HCPCS Code": "hcpcs_code",
+    "NDC": "ndc",
+}
+VALUE_COLUMNS = {
+    "Description": "description",
+    "Drug Name": "drug_name",
+    "Pkg Size": "pkg_size",
+    "Pkg Qty": "pkg_qty",
+    "BUPP": "bupp",
+    "Payment Limit": "payment_limit",
+    "ASP": "asp",
+    "SI": "si",
+}
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pricing_history (
+    hcpcs_code TEXT NOT NULL,
+    ndc TEXT NOT NULL,
+    effective_start TEXT NOT NULL,
+    description TEXT,
+    drug_name TEXT,
+    pkg_size REAL,
+    pkg_qty INTEGER,
+    bupp REAL,
+    payment_limit REAL,
+    asp REAL,
+    si TEXT,
+    removed INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (hcpcs_code, ndc, effective_start)
+);
+CREATE INDEX IF NOT EXISTS idx_pricing_history_ndc ON pricing_history (ndc, effective_start);
+CREATE TABLE IF NOT EXISTS ingested_periods (
+    effective_start TEXT PRIMARY KEY,
+    source TEXT,
+    row_count INTEGER NOT NULL,
+    changed_count INTEGER NOT NULL,
+    removed_count INTEGER NOT NULL,
+    ingested_at TEXT NOT NULL
+);
+"""
+
+# The latest version of every pair as of a date, which the primary key answers per pair
+AS_OF_QUERY = """
+SELECT h.* FROM pricing_history h
+WHERE h.effective_start = (
+    SELECT MAX(effective_start) FROM pricing_history
+    WHERE hcpcs_code = h.hcpcs_code AND ndc = h.ndc AND effective_start <= :as_of
+)
+"""
+
+
+def connect(history_db_path=HISTORY_DB_PATH):
+    """
+    Open the history database, creating its tables and indexes if they do not exist yet.
+    """
+    conn = sqlite3.connect(history_db_path)
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def normalize_ndc(ndc):
+    """
+    Format an NDC as #####-####-## when it has 11 digits, as the crosswalk spells them.
+    Any other value is only stripped.
+    """
+    packed = pack_ndc(ndc)
+    return str(ndc).strip() if packed is None else unpack_ndc(packed)
+
+
+def _to_frame(history_df, include_removed=False):
+    if not include_removed:
+        history_df = history_df[history_df["removed"] == 0]
+    renames = {column: name for name, column in {**KEY_COLUMNS, **VALUE_COLUMNS}.items()}
+    renames["effective_start"] = DATE_COLUMN
+    columns = list(KEY_COLUMNS.values()) + list(VALUE_COLUMNS.values()) + ["effective_start"]
+    if include_removed:
+        columns.append("removed")
+    return history_df[columns].rename(columns=renames).reset_index(drop=True)
+
+
+def latest_period(conn):
+    """
+    Return the Effective Start Date of the latest ingested quarter, or None if the history is empty.
+    """
+    return conn.execute("SELECT MAX(effective_start) FROM ingested_periods").fetchone()[0]
+
+
+def price_as_of(conn, as_of, ndc=None, hcpcs_code=None, include_removed=False):
+    """
+    Return the pricing in effect on a date, optionally for one NDC or HCPCS Code.
+    Pairs removed by then are left out unless include_removed is set.
+    """
+    query = AS_OF_QUERY
+    params = {"as_of": pd.to_datetime(as_of).strftime("%Y-%m-%d")}
+    if ndc is not None:
+        query += " AND h.ndc = :ndc"
+        params["ndc"] = normalize_ndc(ndc)
+    if hcpcs_code is not None:
+        query += " AND h.hcpcs_code = :hcpcs_code"
+        params["hcpcs_code"] = str(hcpcs_code).strip()
+    query += " ORDER BY h.hcpcs_code, h.ndc"
+    return _to_frame(pd.read_sql_query(query, conn, params=params), include_removed)
+
+
+def price_series(conn, ndc):
+    """
+    Return every stored version of an NDC's pricing in date order, including removals.
+    """
+    query = "SELECT * FROM pricing_history WHERE ndc = :ndc ORDER BY effective_start, hcpcs_code"
+    return _to_frame(pd.read_sql_query(query, conn, params={"ndc": normalize_ndc(ndc)}), True)
+
+
+def ingest(conn, merged_df, source=None):
+    """
+    Append one quarter of merged pricing, keeping only the pairs whose values changed since the
+    previous quarter and marking the pairs no longer present as removed.
+    Quarters must be ingested in Effective Start Date order, since the history is append-only.
+    Returns the number of changed and removed pairs.
+    """
+    dates = merged_df[DATE_COLUMN].dropna().unique()
+    if len(dates) != 1:
+        raise ValueError(f"Expected one {DATE_COLUMN} per quarter, found {len(dates)}")
+    effective_start = pd.to_datetime(dates[0]).strftime("%Y-%m-%d")
+    latest = latest_period(conn)
+    if latest is not None and effective_start <= latest:
+        raise ValueError(
+            f"Cannot ingest pricing effective {effective_start}, the history already runs to {latest}"
+        )
+
+    quarter_df = merged_df[list(KEY_COLUMNS) + list(VALUE_COLUMNS)].copy()
+    quarter_df["NDC"] = quarter_df["NDC"].map(normalize_ndc)
+    duplicated = quarter_df.duplicated(subset=list(KEY_COLUMNS))
+    if duplicated.any():
+        logger.warning(
+            "Keeping the first of %d duplicated HCPCS Code/NDC row(s) effective %s",
+            int(duplicated.sum()),
+            effective_start,
+        )
+        quarter_df = quarter_df[~duplicated]
+
+    # Comparing with the latest version of every pair, where a value missing on both sides is unchanged
+    previous_df = price_as_of(conn, effective_start, include_removed=True)
+    compared_df = pd.merge(
+        quarter_df,
+        previous_df,
+        on=list(KEY_COLUMNS),
+        how="outer",
+        suffixes=("", " previous"),
+        indicator=True,
+    )
+    is_new = compared_df["_merge"] == "left_only"
+    is_gone = (compared_df["_merge"] == "right_only") & (compared_df["removed"] == 0)
+    changed = is_new | ((compared_df["_merge"] == "both") & (compared_df["removed"] == 1))
+    for column in VALUE_COLUMNS:
+        current = compared_df[column]
+        previous = compared_df[f"{column} previous"]
+        same = (current == previous) | (current.isna() & previous.isna())
+        changed |= (compared_df["_merge"] == "both") & ~same
+
+    changed_df = compared_df.loc[changed, list(KEY_COLUMNS) + list(VALUE_COLUMNS)].assign(removed=0)
+    removed_df = compared_df.loc[is_gone, list(KEY_COLUMNS)].assign(removed=1)
+    rows_df = pd.concat([changed_df, removed_df], ignore_index=True)
+    rows_df = rows_df.rename(columns={**KEY_COLUMNS, **VALUE_COLUMNS}).assign(
+        effective_start=effective_start
+    )
+    with conn:
+        rows_df.to_sql("pricing_history", conn, if_exists="append", index=False)
+        conn.execute(
+            "INSERT INTO ingested_periods VALUES (?, ?, ?, ?, ?, ?)",
+            (
+                effective_start,
+                source,
+                len(quarter_df),
+                len(changed_df),
+                len(removed_df),
+                datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            ),
+        )
+    logger.info(
+        f"Ingested pricing effective {effective_start}: {len(changed_df)} of {len(quarter_df)} pairs changed, "
+        f"{len(removed_df)} removed"
+    )
+    return len(changed_df), len(removed_df)
+
+
+def ingest_files(history_db_path, merged_file_paths):
+    """
+    Append merged CSVs to the history in Effective Start Date order.
+    """
+    merged_dfs = [
+        (pd.read_csv(path, dtype={"HCPCS Code": str, "NDC": str}), path) for path in merged_file_paths
+    ]
+    merged_dfs.sort(key=lambda item: pd.to_datetime(item[0][DATE_COLUMN]).min())
+    conn = connect(history_db_path)
+    try:
+        for merged_df, path in merged_dfs:
+            ingest(conn, merged_df, source=path)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Keep and query an effective-dated Medicare pricing history.")
+    parser.add_argument(
+        "-history_db",
+        default=HISTORY_DB_PATH,
+        help="Path to the SQLite pricing history",
+    )
+    parser.add_argument(
+        "-ingest",
+        nargs="+",
+        help="Paths to merged Medicare pricing CSVs to append to the history",
+    )
+    parser.add_argument(
+        "-as_of",
+        help="Date to read the pricing in effect on (YYYY-MM-DD)",
+    )
+    parser.add_argument(
+        "-ndc",
+        help="NDC to read the pricing of",
+    )
+    parser.add_argument(
+        "-hcpcs_code",
+        help="HCPCS Code to read the pricing of",
+    )
+    parser.add_argument(
+        "-series",
+        action="store_true",
+        help="Read every change to the pricing of -ndc",
+    )
+    parser.add_argument(
+        "-output_file",
+        help="Path to a CSV file to save the query results to",
+    )
+    args = parser.parse_args()
+
+    if args.ingest:
+        ingest_files(args.history_db, args.ingest)
+    if args.series and not args.ndc:
+        parser.error("-series requires -ndc")
+    if args.series or args.as_of:
+        history_conn = connect(args.history_db)
+        try:
+            if args.series:
+                result_df = price_series(history_conn, args.ndc)
+            else:
+                result_df = price_as_of(history_conn, args.as_of, args.ndc, args.hcpcs_code)
+        finally:
+            history_conn.close()
+        if args.output_file:
+            result_df.to_csv(args.output_file, index=False)
+            logger.info(f"Saved {len(result_df)} row(s) to {args.output_file}")
+        else:
+            print(result_df.to_string(index=False))
+    elif not args.ingest:
+        parser.error("one of -ingest, -as_of or -series is required")
@@ -0,0 +1,190 @@
+# Build per-QUMI Code Medicare pricing aggregates
+#
+# Joins the merged Medicare pricing file to a generated QUMI Codes CSV on 11-digit NDCs and writes two
+# indexed SQLite tables:
+#   - ndc_pricing: every priced NDC/HCPCS Code pair with its QUMI Code and package and unit costs
+#   - qumi_pricing: per QUMI Code NDC counts, min/median ASP per billing unit, min/median package cost,
+#     the lowest cost per unit and the NDC offering it
+#
+# Package cost is the ASP per billing unit times the billing units per package (BUPP), and unit cost
+# is the package cost over its Pkg Size times Pkg Qty.
+#
+# Usage: python -m src.medicare_part_b.qumi_pricing
+#        -codes_file <path>
+#        -pricing_file <path>
+#        -output_db <path>
+#        -qumi_code <code>     (optional, prints the aggregates of one QUMI Code instead of building)
+
+import argparse
+import sqlite3
+
+import numpy as np
+import pandas as pd
+
+from src.common.logger_config import logger
+from src.medicare_part_b.merge_medicare_pricing import MERGED_FILE_PATH
+from src.qumi_codes.lookup_index import pack_ndc
+
+CODES_FILE_PATH = "universal-med-ids.csv"
+OUTPUT_DB_PATH = "src/medicare_part_b/data/qumi-pricing.db"
+NDC_PRICING_COLUMNS = {
+    "QUMI Code": "qumi_code",
+    "NDC": "ndc",
+    "HCPCS Code": "hcpcs_code",
+    "Pkg Size": "pkg_size",
+    "Pkg Qty": "pkg_qty",
+    "BUPP": "bupp",
+    "ASP": "asp",
+    "Package Cost": "package_cost",
+    "Unit Cost": "unit_cost",
+    "Effective Start Date": "effective_start",
+}
+INDEXES = {
+    "ndc_pricing": [["qumi_code", "unit_cost"], ["ndc"]],
+    "qumi_pricing": [["qumi_code"]],
+}
+
+
+def _packed_ndcs(df, source):
+    """
+    Pack the NDC column into 11-digit integers, dropping the rows without an 11-digit NDC.
+    """
+    packed = df["NDC"].map(pack_ndc)
+    unpackable = packed.isna()
+    if unpackable.any():
+        logger.warning(
+            "Skipping %d %s row(s) whose NDC does not have 11 digits. Example(s): %s",
+            int(unpackable.sum()),
+            source,
+            ", ".join(df.loc[unpackable, "NDC"].astype(str).unique()[:10]),
+        )
+    return df[~unpackable].assign(_packed=packed[~unpackable].astype(np.int64))
+
+
+def ndc_pricing(codes_df, pricing_df):
+    """
+    Join the Medicare pricing to the QUMI Codes on 11-digit NDCs and cost each package.
+    """
+    codes_df = _packed_ndcs(codes_df[["NDC", "QUMI Code"]].dropna(subset=["QUMI Code"]), "QUMI Code")
+    pricing_df = _packed_ndcs(pricing_df, "Medicare pricing")
+    joined_df = pd.merge(
+        codes_df[["_packed", "NDC", "QUMI Code"]],
+        pricing_df.drop(columns="NDC"),
+        on="_packed",
+    )
+    joined_df["Package Cost"] = (joined_df["ASP"] * joined_df["BUPP"]).round(3)
+    package_amount = (joined_df["Pkg Size"] * joined_df["Pkg Qty"]).where(lambda amount: amount > 0)
+    joined_df["Unit Cost"] = (joined_df["Package Cost"] / package_amount).round(6)
+    return joined_df[list(NDC_PRICING_COLUMNS)].sort_values(["QUMI Code", "NDC", "HCPCS Code"], kind="stable")
+
+
+def qumi_pricing(codes_df, ndc_pricing_df):
+    """
+    Aggregate the costed NDCs per QUMI Code, counting every NDC of the code, priced or not.
+    """
+    ndc_counts = codes_df.dropna(subset=["QUMI Code"]).groupby("QUMI Code")["NDC"].nunique()
+    grouped = ndc_pricing_df.groupby("QUMI Code")
+    aggregates_df = pd.DataFrame(
+        {
+            "ndc_count": ndc_counts,
+            "priced_ndc_count": grouped["NDC"].nunique(),
+            "hcpcs_count": grouped["HCPCS Code"].nunique(),
+            "min_asp": grouped["ASP"].min(),
+            "median_asp": grouped["ASP"].median(),
+            "min_package_cost": grouped["Package Cost"].min(),
+            "median_package_cost": grouped["Package Cost"].median(),
+            "min_unit_cost": grouped["Unit Cost"].min(),
+        }
+    ).loc[lambda df: df["priced_ndc_count"].notna()]
+    lowest = ndc_pricing_df.sort_values(["QUMI Code", "Unit Cost", "NDC"], kind="stable").drop_duplicates(
+        subset="QUMI Code"
+    )
+    aggregates_df["lowest_cost_ndc"] = lowest.set_index("QUMI Code")["NDC"]
+    aggregates_df["effective_start"] = grouped["Effective Start Date"].max()
+    for column in ["priced_ndc_count", "hcpcs_count"]:
+        aggregates_df[column] = aggregates_df[column].astype(np.int64)
+    return aggregates_df.rename_axis("qumi_code").reset_index()
+
+
+def build(codes_file_path, pricing_file_path, output_db_path):
+    """
+    Build the ndc_pricing and qumi_pricing tables, replacing any from an earlier release.
+    """
+    codes_df = pd.read_csv(codes_file_path, usecols=["NDC", "QUMI Code"], dtype=str)
+    pricing_df = pd.read_csv(pricing_file_path, dtype={"HCPCS Code": str, "NDC": str})
+    ndc_pricing_df = ndc_pricing(codes_df, pricing_df)
+    qumi_pricing_df = qumi_pricing(codes_df, ndc_pricing_df)
+
+    conn = sqlite3.connect(output_db_path)
+    try:
+        with conn:
+            ndc_pricing_df.rename(columns=NDC_PRICING_COLUMNS).to_sql(
+                "ndc_pricing", conn, if_exists="replace", index=False
+            )
+            qumi_pricing_df.to_sql("qumi_pricing", conn, if_exists="replace", index=False)
+            for table, indexes in INDEXES.items():
+                for columns in indexes:
+                    unique = "UNIQUE " if table == "qumi_pricing" else ""
+                    conn.execute(
+                        f"CREATE {unique}INDEX idx_{table}_{'_'.join(columns)} ON {table} ({', '.join(columns)})"
+                    )
+    finally:
+        conn.close()
+    logger.info(
+        f"Saved pricing of {len(qumi_pricing_df)} QUMI Codes ({len(ndc_pricing_df)} priced NDC/HCPCS Code pairs) "
+        f"to {output_db_path}"
+    )
+
+
+def lookup(output_db_path, qumi_code):
+    """
+    Return the aggregates of a QUMI Code and its priced NDCs, cheapest per unit first.
+    """
+    conn = sqlite3.connect(f"file:{output_db_path}?mode=ro", uri=True)
+    try:
+        aggregates_df = pd.read_sql_query(
+            "SELECT * FROM qumi_pricing WHERE qumi_code = ?", conn, params=(qumi_code,)
+        )
+        ndcs_df = pd.read_sql_query(
+            "SELECT * FROM ndc_pricing WHERE qumi_code = ? ORDER BY unit_cost IS NULL, unit_cost, ndc",
+            conn,
+            params=(qumi_code,),
+        )
+    finally:
+        conn.close()
+    return aggregates_df, ndcs_df
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build per-QUMI Code Medicare pricing aggregates.")
+    parser.add_argument(
+        "-codes_file",
+        default=CODES_FILE_PATH,
+        help="Path to a generated QUMI Codes CSV",
+    )
+    parser.add_argument(
+        "-pricing_file",
+        default=MERGED_FILE_PATH,
+        help="Path to the merged Medicare pricing CSV",
+    )
+    parser.add_argument(
+        "-output_db",
+        default=OUTPUT_DB_PATH,
+        help="Path to the SQLite database to write the pricing tables to",
+    )
+    parser.add_argument(
+        "-qumi_code",
+        help="QUMI Code to print the pricing of from -output_db instead of building",
+    )
+    args = parser.parse_args()
+
+    if args.qumi_code:
+        qumi_aggregates_df, qumi_ndcs_df = lookup(args.output_db, args.qumi_code)
+        if qumi_aggregates_df.empty:
+            logger.warning(f"No Medicare pricing for QUMI Code {args.qumi_code}")
+        else:
+            print(qumi_aggregates_df.T.to_string(header=False))
+            print()
+            print(qumi_ndcs_df.to_string(index=False))
+    else:
+        build(args.codes_file, args.pricing_file, args.output_db)
@@ -0,0 +1,135 @@
+# Use the QUMI Code pipeline as a library
+#
+# qumi-codes.py can't be imported by name because of its dash. This module loads it on first use instead, so importing
+# this module is instant and pandas, NumPy and pyarrow are only imported once a pipeline function is first used:
+#   - Every pipeline function by name, e.g. ndc_eleven_digits, process_unit and get_qsrx_code_from_gcp
+#   - generate and validate, the -generate and -validate entry points
+#   - compute_codes, which computes the codes of an in-memory batch of FDA packages without touching disk, against
+#     RxNorm data and full FDA ambiguity keys loaded once per process
+#
+# Usage:
+#   from src.qumi_codes import api
+#   api.ndc_eleven_digits("1234-5678-90")
+#   codes_df = api.compute_codes(fda_df)
+
+import functools
+import importlib.util
+import os
+import sys
+
+REPO_PATH = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+SCRIPT_PATH = os.path.join(REPO_PATH, "qumi-codes.py")
+MODULE_NAME = "qumi_codes"
+PIPELINE_NAMES = [
+    "ndc_eleven_digits",
+    "ndc_eleven_digits_column",
+    "process_unit",
+    "convert_units",
+    "get_qsrx_code_from_gcp",
+    "get_qsrx_codes_from_gcps",
+    "unify_data",
+    "prepare_codes",
+    "resolve_ambiguity",
+    "finalize_codes",
+    "output_codes",
+    "load_fda_data",
+    "load_rxnorm_extract",
+    "generate_codes",
+    "validate_csv",
+    "FDA_PACKAGE_COLUMNS",
+    "FDA_PRODUCT_COLUMNS",
+    "OUTPUT_COLUMNS",
+]
+
+
+@functools.lru_cache(maxsize=None)
+def load_pipeline():
+    """
+    Import qumi-codes.py once per process, registered under MODULE_NAME so worker processes can unpickle its
+    functions.
+    """
+    if MODULE_NAME in sys.modules:
+        return sys.modules[MODULE_NAME]
+    spec = importlib.util.spec_from_file_location(MODULE_NAME, SCRIPT_PATH)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[MODULE_NAME] = module
+    try:
+        spec.loader.exec_module(module)
+    except BaseException:
+        del sys.modules[MODULE_NAME]
+        raise
+    return module
+
+
+def __getattr__(name):
+    if name in PIPELINE_NAMES:
+        return getattr(load_pipeline(), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(set(globals()) | set(PIPELINE_NAMES))
+
+
+def generate(filename, log_level="info", **options):
+    """
+    Generate the QUMI Codes file from the FDA and RxNorm files in data/, as -generate does.
+    Options are the keyword arguments of generate_codes, e.g. previous, workers or file_format.
+    """
+    load_pipeline().generate_codes(filename, log_level, **options)
+
+
+def validate(new_data_csv, reference_csv="universal-med-ids.csv", diff_file=None, summary=False):
+    """
+    Compare a generated release against a reference release, as -validate does.
+    Returns the changes and their counts per category instead of only printing them.
+    """
+    return load_pipeline().validate_csv(new_data_csv, reference_csv, diff_file, summary)
+
+
+@functools.lru_cache(maxsize=None)
+def _rxnorm_data(rxnorm_db_path, cache_dir):
+    pipeline = load_pipeline()
+    rxnorm_rxcui, rxnorm_refined = pipeline.load_rxnorm_extract(rxnorm_db_path, cache_dir)
+    # Positions of the rows of each NDC, keyed by its digits once formatted as #####-####-##
+    ndcs = pipeline.ndc_eleven_digits_column(rxnorm_rxcui["NDC"].astype(str), "RxNorm NDC")
+    ndc_rows = rxnorm_rxcui.groupby(ndcs.str.replace("-", "").to_numpy(), sort=False).indices
+    return rxnorm_rxcui, rxnorm_refined, ndc_rows
+
+
+# The ambiguity keys and resolution of the full FDA and RxNorm data, by RxNorm database and cache
+_ambiguity_data = {}
+
+
+def _full_ambiguity(rxnorm_db_path, cache_dir, workers):
+    if (rxnorm_db_path, cache_dir) not in _ambiguity_data:
+        pipeline = load_pipeline()
+        rxnorm_rxcui, _, _ = _rxnorm_data(rxnorm_db_path, cache_dir)
+        fda_package, fda_product = pipeline.load_fda_data()
+        _ambiguity_data[rxnorm_db_path, cache_dir] = pipeline.full_ambiguity(
+            fda_package, fda_product, rxnorm_rxcui.copy(), workers
+        )
+    return _ambiguity_data[rxnorm_db_path, cache_dir]
+
+
+def compute_codes(
+    fda_df,
+    log_level="info",
+    workers=1,
+    rxnorm_db_path="data/rxnorm.db",
+    cache_dir="data/rxnorm-cache",
+):
+    """
+    Compute the published columns of a batch of FDA packages in memory, where each row holds the
+    FDA_PACKAGE_COLUMNS of a package and the FDA_PRODUCT_COLUMNS of its product.
+    The RxNorm extract is loaded on the first call only, and each call merges just the RxNorm rows of its own NDCs.
+    RXCUI ambiguity is resolved across every row of the full FDA data in data/ (package.csv and product.csv), which
+    is prepared on the first call, so each NDC gets the same code as from -generate on that data.
+    """
+    pipeline = load_pipeline()
+    rxnorm_rxcui, rxnorm_refined, ndc_rows = _rxnorm_data(rxnorm_db_path, cache_dir)
+    ambiguity = _full_ambiguity(rxnorm_db_path, cache_dir, workers)
+    ndcs = pipeline.ndc_eleven_digits_column(fda_df["NDCPACKAGECODE"].astype(object), "FDA NDC")
+    digits = {str(ndc).replace("-", "") for ndc in ndcs}
+    rows = sorted(row for ndc in digits for row in ndc_rows.get(ndc, []))
+    return pipeline.compute_codes(fda_df, rxnorm_rxcui.iloc[rows], rxnorm_refined, ambiguity, log_level, workers)
@@ -0,0 +1,304 @@
+# Build and serve a memory-mapped NDC <-> QUMI Code lookup index
+#
+# The index is a single binary file built from a generated QUMI Codes CSV:
+#   - NDCs packed as 11-digit integers, sorted, each pointing at its record
+#   - Records holding every CSV column of an NDC
+#   - QUMI Codes, sorted, each pointing at the sorted list of its NDCs
+#
+# Lookups binary search the memory-mapped arrays, so a process only pages in what it reads.
+#
+# Usage: python -m src.qumi_codes.lookup_index
+#        -csv_file <path>      (build the index from a generated CSV)
+#        -index_file <path>
+#        -serve                (serve the index over HTTP instead)
+#        -host <host> -port <port>
+
+import argparse
+import json
+import mmap
+import struct
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote
+
+import numpy as np
+import pandas as pd
+
+from src.common.logger_config import logger
+
+MAGIC = b"QUMIIDX\x00"
+VERSION = 1
+PREAMBLE = struct.Struct("<8sII")  # magic, version, header length
+ALIGNMENT = 8
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8080
+
+
+def pack_ndc(ndc):
+    """
+    Pack an NDC into an integer from its 11 digits, e.g. 51662-1341-03 -> 51662134103.
+    Returns None when the NDC does not have exactly 11 digits.
+    """
+    digits = "".join(character for character in str(ndc) if character.isdigit())
+    if len(digits) != 11:
+        return None
+    return int(digits)
+
+
+def unpack_ndc(packed):
+    """
+    Format a packed NDC back into the #####-####-## layout.
+    """
+    digits = f"{int(packed):011d}"
+    return f"{digits[:5]}-{digits[5:9]}-{digits[9:]}"
+
+
+def _aligned(offset):
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def build_index(csv_file_path, index_file_path):
+    """
+    Build the lookup index file from a generated QUMI Codes CSV.
+    """
+    codes_df = pd.read_csv(csv_file_path, dtype=str)
+    codes_df = codes_df.astype(object).where(codes_df.notna(), None)
+    packed = codes_df["NDC"].map(pack_ndc)
+    unpackable = packed.isna()
+    if unpackable.any():
+        samples = ", ".join(codes_df.loc[unpackable, "NDC"].astype(str).unique()[:10])
+        logger.warning(
+            "Skipping %d row(s) whose NDC does not have 11 digits. Example(s): %s",
+            int(unpackable.sum()),
+            samples,
+        )
+        codes_df = codes_df[~unpackable]
+        packed = packed[~unpackable]
+    codes_df = codes_df.assign(_packed=packed.astype(np.uint64)).sort_values(
+        "_packed", kind="stable"
+    )
+    if codes_df["_packed"].duplicated().any():
+        duplicates = codes_df.loc[codes_df["_packed"].duplicated(), "NDC"].unique()[:10]
+        raise ValueError(f"Duplicate NDCs in {csv_file_path}: {', '.join(duplicates)}")
+
+    # NDC keys and their records
+    columns = [column for column in codes_df.columns if column != "_packed"]
+    ndc_keys = codes_df["_packed"].to_numpy(dtype="<u8")
+    records = [
+        json.dumps(row, separators=(",", ":")).encode("utf-8")
+        for row in codes_df[columns].itertuples(index=False, name=None)
+    ]
+    record_offsets = np.zeros(len(records) + 1, dtype="<u8")
+    np.cumsum([len(record) for record in records], out=record_offsets[1:])
+
+    # QUMI Codes and their NDC posting lists, which stay sorted since the NDC keys are
+    qumi_codes = codes_df["QUMI Code"].to_numpy(dtype=object)
+    has_code = np.array([code is not None for code in qumi_codes], dtype=bool)
+    positions = np.flatnonzero(has_code)
+    code_values = qumi_codes[has_code].astype(str)
+    order = np.argsort(code_values, kind="stable")
+    unique_codes, counts = np.unique(code_values[order], return_counts=True)
+    code_width = max([len(code.encode("utf-8")) for code in unique_codes] + [1])
+    qumi_keys = np.array([code.encode("utf-8") for code in unique_codes], dtype=f"S{code_width}")
+    posting_offsets = np.zeros(len(unique_codes) + 1, dtype="<u4")
+    np.cumsum(counts, out=posting_offsets[1:])
+    postings = positions[order].astype("<u4")
+
+    sections = {
+        "ndc_keys": ndc_keys.tobytes(),
+        "record_offsets": record_offsets.tobytes(),
+        "records": b"".join(records),
+        "qumi_keys": qumi_keys.tobytes(),
+        "posting_offsets": posting_offsets.tobytes(),
+        "postings": postings.tobytes(),
+    }
+    header = {
+        "columns": columns,
+        "ndc_count": len(ndc_keys),
+        "qumi_count": len(unique_codes),
+        "qumi_width": code_width,
+        "sections": {},
+    }
+    # Section offsets depend on the header length, so lay them out until the header stops growing
+    header_bytes = b""
+    while True:
+        offset = _aligned(PREAMBLE.size + len(header_bytes))
+        for name, data in sections.items():
+            header["sections"][name] = [offset, len(data)]
+            offset = _aligned(offset + len(data))
+        new_header_bytes = json.dumps(header).encode("utf-8")
+        if len(new_header_bytes) == len(header_bytes):
+            break
+        header_bytes = new_header_bytes
+
+    with open(index_file_path, "wb") as index_file:
+        index_file.write(PREAMBLE.pack(MAGIC, VERSION, len(header_bytes)))
+        index_file.write(header_bytes)
+        for name, data in sections.items():
+            start, _ = header["sections"][name]
+            index_file.write(b"\x00" * (start - index_file.tell()))
+            index_file.write(data)
+    logger.info(
+        f"Saved lookup index of {len(ndc_keys)} NDCs and {len(unique_codes)} QUMI Codes to {index_file_path}"
+    )
+
+
+class LookupIndex:
+    """
+    Read-only, memory-mapped view of a lookup index file.
+    """
+
+    def __init__(self, index_file_path):
+        with open(index_file_path, "rb") as index_file:
+            self._mmap = mmap.mmap(index_file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, header_length = PREAMBLE.unpack_from(self._mmap)
+        if magic != MAGIC or version != VERSION:
+            self._mmap.close()
+            raise ValueError(f"{index_file_path} is not a version {VERSION} QUMI lookup index")
+        header = json.loads(self._mmap[PREAMBLE.size : PREAMBLE.size + header_length])
+        self.columns = header["columns"]
+        dtypes = {
+            "ndc_keys": "<u8",
+            "record_offsets": "<u8",
+            "records": "u1",
+            "qumi_keys": f"S{header['qumi_width']}",
+            "posting_offsets": "<u4",
+            "postings": "<u4",
+        }
+        for name, (offset, length) in header["sections"].items():
+            dtype = np.dtype(dtypes[name])
+            setattr(
+                self,
+                f"_{name}",
+                np.frombuffer(self._mmap, dtype=dtype, count=length // dtype.itemsize, offset=offset),
+            )
+
+    def __len__(self):
+        return len(self._ndc_keys)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        for name in ["ndc_keys", "record_offsets", "records", "qumi_keys", "posting_offsets", "postings"]:
+            setattr(self, f"_{name}", None)
+        self._mmap.close()
+
+    def _ndc_position(self, ndc):
+        packed = pack_ndc(ndc)
+        if packed is None:
+            return None
+        position = int(np.searchsorted(self._ndc_keys, np.uint64(packed)))
+        if position < len(self._ndc_keys) and self._ndc_keys[position] == packed:
+            return position
+        return None
+
+    def _record(self, position):
+        start, end = self._record_offsets[position : position + 2]
+        return dict(zip(self.columns, json.loads(self._records[start:end].tobytes())))
+
+    def record(self, ndc):
+        """
+        Return every column of an NDC as a dict, or None if the NDC is not in the index.
+        """
+        position = self._ndc_position(ndc)
+        return None if position is None else self._record(position)
+
+    def qumi_code(self, ndc):
+        """
+        Return the QUMI Code of an NDC, or None if the NDC is not in the index.
+        """
+        record = self.record(ndc)
+        return None if record is None else record["QUMI Code"]
+
+    def ndcs(self, qumi_code):
+        """
+        Return the sorted NDCs sharing a QUMI Code, empty if the code is not in the index.
+        """
+        encoded = qumi_code.encode("utf-8")
+        # A fixed-width key would silently truncate a longer code, or drop trailing NULs, into one in the index
+        if len(encoded) > self._qumi_keys.dtype.itemsize or b"\0" in encoded:
+            return []
+        key = np.array(encoded, dtype=self._qumi_keys.dtype)
+        position = int(np.searchsorted(self._qumi_keys, key))
+        if position == len(self._qumi_keys) or self._qumi_keys[position] != key:
+            return []
+        start, end = self._posting_offsets[position : position + 2]
+        return [unpack_ndc(packed) for packed in self._ndc_keys[self._postings[start:end]]]
+
+
+def serve(index_file_path, host=DEFAULT_HOST, port=DEFAULT_PORT):
+    """
+    Serve the lookup index over HTTP as a local stand-in for the lookup service:
+      - GET /ndc/<ndc>   -> the NDC's record
+      - GET /qumi/<code> -> the QUMI Code and its NDCs
+    """
+    index = LookupIndex(index_file_path)
+
+    class LookupHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            parts = [unquote(part) for part in self.path.split("?")[0].strip("/").split("/")]
+            body = None
+            if len(parts) == 2 and parts[0] == "ndc":
+                body = index.record(parts[1])
+            elif len(parts) == 2 and parts[0] == "qumi":
+                ndcs = index.ndcs(parts[1])
+                body = {"QUMI Code": parts[1], "NDC": ndcs} if ndcs else None
+            payload = json.dumps(body if body is not None else {"error": "not found"}).encode("utf-8")
+            self.send_response(200 if body is not None else 404)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            logger.debug("%s - %s", self.address_string(), format % args)
+
+    server = ThreadingHTTPServer((host, port), LookupHandler)
+    logger.info(f"Serving {index_file_path} ({len(index)} NDCs) on http://{host}:{server.server_port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        index.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build or serve the NDC <-> QUMI Code lookup index.")
+    parser.add_argument(
+        "-csv_file",
+        help="Path to a generated QUMI Codes CSV to build the index from",
+    )
+    parser.add_argument(
+        "-index_file",
+        required=True,
+        help="Path to the lookup index file",
+    )
+    parser.add_argument(
+        "-serve",
+        action="store_true",
+        help="Serve the index over HTTP",
+    )
+    parser.add_argument(
+        "-host",
+        default=DEFAULT_HOST,
+        help="Host to serve on",
+    )
+    parser.add_argument(
+        "-port",
+        type=int,
+        default=DEFAULT_PORT,
+        help="Port to serve on",
+    )
+    args = parser.parse_args()
+
+    if args.csv_file:
+        build_index(args.csv_file, args.index_file)
+    if args.serve:
+        serve(args.index_file, args.host, args.port)
+    elif not args.csv_file:
+        parser.error("either -csv_file or -serve is required")
@@ -0,0 +1,23 @@
+import importlib.util
+import os
+import sys
+
+import pytest
+
+REPO_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPT_PATH = os.path.join(REPO_PATH, "qumi-codes.py")
+
+# The src modules import each other as src.*, from the repository root
+if REPO_PATH not in sys.path:
+    sys.path.insert(0, REPO_PATH)
+
+
+@pytest.fixture(scope="session")
+def qumi_codes():
+    """
+    qumi-codes.py as a module, which its dash keeps from a plain import.
+    """
+    spec = importlib.util.spec_from_file_location("qumi_codes_under_test", SCRIPT_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
@@ -0,0 +1,80 @@
+import pandas as pd
+import pytest
+
+# Prepared rows of seven NDCs. The first NDC keeps its row whose code the most rows share, and the missing RXCUI and
+# those ending in 9 are settled by the most common RXCUI of their Code Dosage and name across every NDC, so the fifth
+# NDC moves into the next range of 10 only when resolved alongside the sixth and seventh
+PREPARED = pd.DataFrame(
+    {
+        "NDC": ["00001-0001-01", "00001-0001-01", "00002-0002-02", "00003-0003-03", "00004-0004-04", "00005-0005-05",
+                "00006-0006-06", "00007-0007-07"],
+        "NDC Row": [0, 1, 0, 0, 0, 0, 0, 0],
+        "RXCUI": ["1009", "2001", None, "2001", "2001", "1009", "1010", "1010"],
+        "Code Dosage": ["TABLET10", "TABLET10", "TABLET10", "TABLET10", "TABLET10", "CAPSULE5", "CAPSULE5", "CAPSULE5"],
+        "PROPRIETARYNAME": ["Alpha", "Alpha", "Alpha", "Alpha", "Beta", "Gamma", "Gamma", "Gamma"],
+        "SUBSTANCENAME": ["ALPHAZINE"] * 5 + ["GAMMAZINE"] * 3,
+        "Package Count": [1, 1, 2, 1, 1, 3, 1, 1],
+    }
+)
+RESOLVED_RXCUI2 = {
+    "00001-0001-01": "200",
+    "00002-0002-02": "200",
+    "00003-0003-03": "200",
+    "00004-0004-04": "200",
+    "00005-0005-05": "101",
+    "00006-0006-06": "101",
+    "00007-0007-07": "101",
+}
+
+
+def test_apply_rows_empty(qumi_codes):
+    rows = pd.DataFrame(columns=["DOSAGEFORMNAME2", "DOSE", "ROUTENAME2"])
+    result = qumi_codes.apply_rows(rows, qumi_codes.route_to_dosage)
+    assert isinstance(result, pd.Series)
+    assert len(result) == 0
+
+
+def test_map_unique_empty(qumi_codes):
+    result = qumi_codes.map_unique(pd.Series([], dtype=object), qumi_codes.strength_std)
+    assert isinstance(result, pd.Series)
+    assert len(result) == 0
+
+
+def test_compute_codes_empty_batch(qumi_codes):
+    fda = pd.DataFrame(columns=qumi_codes.FDA_PACKAGE_COLUMNS + qumi_codes.FDA_PRODUCT_COLUMNS[1:])
+    rxnorm_rxcui = pd.DataFrame(columns=["NDC", "RXCUI"])
+    rxnorm_refined = pd.DataFrame(columns=["RXCUI", "DF", "DFG", "Description"])
+    codes = qumi_codes.compute_codes(fda, rxnorm_rxcui, rxnorm_refined, None)
+    assert codes.empty
+    assert list(codes.columns) == [qumi_codes.OUTPUT_NAMES.get(column, column) for column in qumi_codes.OUTPUT_COLUMNS]
+
+
+def prepared(qumi_codes, rows):
+    rows = rows.assign(RXCUI2=rows["RXCUI"])
+    rows["New Code"] = rows["RXCUI2"].fillna(qumi_codes.MISSING_TEXT) + rows["Code Dosage"]
+    return qumi_codes.apply_schema(rows[qumi_codes.AMBIGUITY_COLUMNS + ["Package Count"]].copy())
+
+
+@pytest.mark.parametrize("ndcs", [["00002-0002-02"], ["00001-0001-01", "00005-0005-05"], list(RESOLVED_RXCUI2)])
+def test_batch_ambiguity_matches_full_run(qumi_codes, ndcs):
+    full = prepared(qumi_codes, PREPARED)
+    ambiguity_keys = full[qumi_codes.AMBIGUITY_COLUMNS]
+    resolved = qumi_codes.resolve_ambiguity(ambiguity_keys.copy())[["NDC", "NDC Row", "RXCUI2"]]
+    expected = qumi_codes.resolve_ambiguity(full.copy())
+    expected = expected[expected["NDC"].isin(ndcs)].reset_index(drop=True)
+    batch = full[full["NDC"].isin(ndcs)].reset_index(drop=True)
+    result = qumi_codes.resolve_batch_ambiguity(batch, ambiguity_keys, resolved)
+    pd.testing.assert_frame_equal(result, expected)
+    assert result["RXCUI2"].tolist() == [RESOLVED_RXCUI2[ndc] for ndc in ndcs]
+
+
+def test_batch_ambiguity_with_changed_rows(qumi_codes):
+    full = prepared(qumi_codes, PREPARED)
+    ambiguity_keys = full[qumi_codes.AMBIGUITY_COLUMNS]
+    resolved = qumi_codes.resolve_ambiguity(ambiguity_keys.copy())[["NDC", "NDC Row", "RXCUI2"]]
+    changed = prepared(qumi_codes, PREPARED.assign(RXCUI=PREPARED["RXCUI"].where(PREPARED["NDC Row"] == 0, "3001")))
+    expected = qumi_codes.resolve_ambiguity(changed.copy())
+    expected = expected[expected["NDC"] == "00001-0001-01"].reset_index(drop=True)
+    batch = changed[changed["NDC"] == "00001-0001-01"].reset_index(drop=True)
+    result = qumi_codes.resolve_batch_ambiguity(batch, ambiguity_keys, resolved)
+    pd.testing.assert_frame_equal(result, expected)
@@ -0,0 +1,42 @@
+import pandas as pd
+
+# Ingredient unit, strength, dose unit, dose unit value and substance, with the converted unit and strength
+GOLDEN = [
+    (("mg/mL", "10", "mL", "5", "LIDOCAINE"), ("mg/", "50.0")),
+    (("g/100mL", "0.9", "mL", "1000", "SODIUM CHLORIDE"), ("mg/", "9000.0")),
+    (("ug/1", "500", None, None, "CYANOCOBALAMIN"), ("mg/", "0.5")),
+    (("mg/1; mg/1", "10; 20", None, None, "AMLODIPINE; BENAZEPRIL"), ("mg/; mg/", "10.0; 20.0")),
+    (("mg/1", "650", None, None, "ACETAMINOPHEN"), ("mg/", "649.6")),
+    (("mg/1", "20.65", None, None, "ACETIC ACID"), ("mg/", "20.0")),
+    (("mg/mL", "5", "mL", "10", "CASPOFUNGIN ACETATE"), ("mg/", "50.0")),
+    (("mg/mL", "38", "mL", "0", "GEMCITABINE HYDROCHLORIDE"), ("mg/mL", "38.02")),
+    (("g/26.3mL", "1", "mL", "26.3", "GEMCITABINE HYDROCHLORIDE"), ("mg/", "1000.0")),
+    (("mg/5mL", "250", "mL", "0", "AMOXICILLIN"), ("mg/mL", "50.0")),
+    (("%", "2", None, None, "LIDOCAINE"), ("%", "2.0")),
+    (("[iU]/mL", "100", "mL", "10", "INSULIN GLARGINE"), ("[iU]/", "1000.0")),
+    (("meq/mL", "2", "mL", "20", "POTASSIUM CHLORIDE"), ("mg/", "2980.0")),
+    (("mg/g", "10", "g", "28.35", "HYDROCORTISONE"), ("mg/", "300.0")),
+    (("mg/1", "0.175", None, None, "LEVOTHYROXINE SODIUM"), ("mg/", "0.18")),
+    (("[USP'U]/g", "1", "g", "30", "PETROLATUM"), ("mg/", "30000.0")),
+    (("mg/mL", "10", "mL", "5", "LIDOCAINE"), ("mg/", "50.0")),
+]
+COLUMNS = ["ACTIVE_INGRED_UNIT", "ACTIVE_NUMERATOR_STRENGTH", "DOSE_UNIT", "DOSE_UNIT_VALUE", "SUBSTANCENAME"]
+
+
+def golden_frame(qumi_codes):
+    df = pd.DataFrame([inputs for inputs, _ in GOLDEN], columns=COLUMNS)
+    # The FDA columns are typed text while the dose units parsed from package descriptions stay objects
+    return df.astype({column: qumi_codes.TEXT_DTYPE for column in ["ACTIVE_INGRED_UNIT", "ACTIVE_NUMERATOR_STRENGTH",
+                                                                   "SUBSTANCENAME"]})
+
+
+def test_convert_units_golden(qumi_codes):
+    df = qumi_codes.convert_units(golden_frame(qumi_codes))
+    converted = list(zip(df["ACTIVE_INGRED_UNIT"], df["ACTIVE_NUMERATOR_STRENGTH"]))
+    assert converted == [expected for _, expected in GOLDEN]
+
+
+def test_convert_units_matches_process_unit(qumi_codes):
+    df = qumi_codes.convert_units(golden_frame(qumi_codes))
+    converted = list(zip(df["ACTIVE_INGRED_UNIT"], df["ACTIVE_NUMERATOR_STRENGTH"]))
+    assert converted == [qumi_codes.process_unit(*inputs) for inputs, _ in GOLDEN]
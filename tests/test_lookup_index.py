@@ -0,0 +1,51 @@
+import pandas as pd
+import pytest
+
+from src.qumi_codes.lookup_index import LookupIndex, build_index, pack_ndc, unpack_ndc
+
+CODES = pd.DataFrame(
+    {
+        "NDC": ["51662-1341-03", "00002-7510-01", "12345-6789-01", "00002-7510-02", "1234-5678-9"],
+        "QUMI Code": ["p0ed22r", "abc1234", "p0ed22r", "abc1234", "xyz9876"],
+        "Description": ["Heparin 1000 unit/mL", "Insulin 100 unit/mL", "Heparin 1000 unit/mL", None, "Short NDC"],
+    }
+)
+
+
+@pytest.fixture
+def index(tmp_path):
+    csv_file_path = tmp_path / "codes.csv"
+    CODES.to_csv(csv_file_path, index=False)
+    build_index(csv_file_path, tmp_path / "codes.qidx")
+    with LookupIndex(tmp_path / "codes.qidx") as lookup_index:
+        yield lookup_index
+
+
+def test_pack_ndc_round_trip():
+    assert pack_ndc("51662-1341-03") == 51662134103
+    assert unpack_ndc(2751001) == "00002-7510-01"
+    assert pack_ndc("1234-5678-9") is None
+
+
+def test_records(index):
+    assert len(index) == 4
+    assert index.record("51662134103") == {
+        "NDC": "51662-1341-03",
+        "QUMI Code": "p0ed22r",
+        "Description": "Heparin 1000 unit/mL",
+    }
+    assert index.record("00002-7510-02")["Description"] is None
+    assert index.qumi_code("00002-7510-01") == "abc1234"
+    assert index.record("99999-9999-99") is None
+    assert index.record("1234-5678-9") is None
+
+
+def test_ndcs(index):
+    assert index.ndcs("p0ed22r") == ["12345-6789-01", "51662-1341-03"]
+    assert index.ndcs("abc1234") == ["00002-7510-01", "00002-7510-02"]
+    assert index.ndcs("xyz9876") == []
+
+
+@pytest.mark.parametrize("qumi_code", ["p0ed22rzzz", "p0ed22", "p0ed22r\0", ""])
+def test_ndcs_match_whole_codes_only(index, qumi_code):
+    assert index.ndcs(qumi_code) == []
@@ -0,0 +1,29 @@
+import pandas as pd
+import pytest
+
+# One value of every layout ndc_eleven_digits_column handles, with its 5-4-2 form
+LAYOUTS = {
+    "12345678901": "12345-6789-01",
+    "012345678901": "12345-6789-01",
+    "1234-5678-90": "01234-5678-90",
+    "12345-678-90": "12345-0678-90",
+    "12345-6789-0": "12345-6789-00",
+    "12345-6789-01": "12345-6789-01",
+}
+
+
+@pytest.mark.parametrize("ndc, expected", LAYOUTS.items())
+def test_single_layout_column(qumi_codes, ndc, expected):
+    ndcs = pd.Series([ndc, ndc, ndc])
+    assert qumi_codes.ndc_eleven_digits_column(ndcs).tolist() == [expected] * 3
+
+
+def test_single_value(qumi_codes):
+    assert qumi_codes.ndc_eleven_digits_column(pd.Series(["1234-5678-90"])).tolist() == ["01234-5678-90"]
+
+
+def test_mixed_layouts_match_per_value(qumi_codes):
+    ndcs = pd.Series(list(LAYOUTS) + ["1234-567-89", None])
+    expected = [qumi_codes.ndc_eleven_digits(ndc) for ndc in ndcs[:-1]] + [None]
+    assert qumi_codes.ndc_eleven_digits_column(ndcs).tolist() == expected
+    assert qumi_codes.ndc_eleven_digits_column(ndcs)[:len(LAYOUTS)].tolist() == list(LAYOUTS.values())
@@ -0,0 +1,96 @@
+import pandas as pd
+import pytest
+
+from src.medicare_part_b.pricing_history import connect, ingest, latest_period, price_as_of, price_series
+
+COLUMNS = ["HCPCS Code", "NDC", "Description", "Drug Name", "Pkg Size", "Pkg Qty", "BUPP", "Payment Limit", "ASP", "SI"]
+
+
+def quarter(effective_start, rows):
+    return pd.DataFrame(rows, columns=COLUMNS).assign(**{"Effective Start Date": effective_start})
+
+
+# Three quarters of merged pricing: the second changes J0001's price, drops J0003 and adds J0004 under an 11-digit
+# NDC spelled without dashes and listed twice, and the third brings J0003 back unchanged
+QUARTERS = [
+    quarter(
+        "2024-01-01",
+        [
+            ["J0001", "00002-7510-01", "Insulin", "Humulin", 10.0, 1, 1000.0, 1.25, 1.18, "K"],
+            ["J0002", "51662-1341-03", "Heparin", "Heparin", 1.0, 25, 1000.0, 0.5, None, "N"],
+            ["J0003", "12345-6789-01", "Saline", "Saline", 100.0, 1, 100.0, 0.1, 0.09, None],
+        ],
+    ),
+    quarter(
+        "2024-04-01",
+        [
+            ["J0001", "00002-7510-01", "Insulin", "Humulin", 10.0, 1, 1000.0, 1.30, 1.22, "K"],
+            ["J0002", "51662-1341-03", "Heparin", "Heparin", 1.0, 25, 1000.0, 0.5, None, "N"],
+            ["J0004", "00409488810", "Lidocaine", "Xylocaine", 5.0, 10, 50.0, 0.02, 0.02, "N"],
+            ["J0004", "00409-4888-10", "Lidocaine", "Xylocaine", 5.0, 10, 50.0, 0.03, 0.03, "N"],
+        ],
+    ),
+    quarter(
+        "2024-07-01",
+        [
+            ["J0001", "00002-7510-01", "Insulin", "Humulin", 10.0, 1, 1000.0, 1.30, 1.22, "K"],
+            ["J0002", "51662-1341-03", "Heparin", "Heparin", 1.0, 25, 1000.0, 0.5, None, "N"],
+            ["J0003", "12345-6789-01", "Saline", "Saline", 100.0, 1, 100.0, 0.1, 0.09, None],
+            ["J0004", "00409-4888-10", "Lidocaine", "Xylocaine", 5.0, 10, 50.0, 0.02, 0.02, "N"],
+        ],
+    ),
+]
+
+
+@pytest.fixture
+def conn():
+    conn = connect(":memory:")
+    yield conn
+    conn.close()
+
+
+def test_ingest_golden(conn):
+    assert [ingest(conn, quarter_df) for quarter_df in QUARTERS] == [(3, 0), (2, 1), (1, 0)]
+    assert latest_period(conn) == "2024-07-01"
+    rows = conn.execute(
+        "SELECT hcpcs_code, ndc, effective_start, payment_limit, removed FROM pricing_history "
+        "ORDER BY effective_start, hcpcs_code"
+    ).fetchall()
+    assert rows == [
+        ("J0001", "00002-7510-01", "2024-01-01", 1.25, 0),
+        ("J0002", "51662-1341-03", "2024-01-01", 0.5, 0),
+        ("J0003", "12345-6789-01", "2024-01-01", 0.1, 0),
+        ("J0001", "00002-7510-01", "2024-04-01", 1.30, 0),
+        ("J0003", "12345-6789-01", "2024-04-01", None, 1),
+        ("J0004", "00409-4888-10", "2024-04-01", 0.02, 0),
+        ("J0003", "12345-6789-01", "2024-07-01", 0.1, 0),
+    ]
+
+
+def test_price_as_of(conn):
+    for quarter_df in QUARTERS:
+        ingest(conn, quarter_df)
+    assert price_as_of(conn, "2023-12-31").empty
+    as_of = price_as_of(conn, "2024-05-15")
+    assert as_of["HCPCS Code"].tolist() == ["J0001", "J0002", "J0004"]
+    assert as_of["Payment Limit"].tolist() == [1.30, 0.5, 0.02]
+    assert as_of["Effective Start Date"].tolist() == ["2024-04-01", "2024-01-01", "2024-04-01"]
+    assert price_as_of(conn, "2024-07-01", ndc="12345678901")["Payment Limit"].tolist() == [0.1]
+    assert price_as_of(conn, "2024-05-15", hcpcs_code="J0003").empty
+    assert price_as_of(conn, "2024-05-15", hcpcs_code="J0003", include_removed=True)["removed"].tolist() == [1]
+
+
+def test_price_series(conn):
+    for quarter_df in QUARTERS:
+        ingest(conn, quarter_df)
+    series = price_series(conn, "12345-6789-01")
+    assert series["Effective Start Date"].tolist() == ["2024-01-01", "2024-04-01", "2024-07-01"]
+    assert series["removed"].tolist() == [0, 1, 0]
+
+
+def test_ingest_rejects_out_of_order_and_mixed_quarters(conn):
+    ingest(conn, QUARTERS[1])
+    with pytest.raises(ValueError, match="already runs to 2024-04-01"):
+        ingest(conn, QUARTERS[0])
+    with pytest.raises(ValueError, match="one Effective Start Date per quarter"):
+        ingest(conn, pd.concat([QUARTERS[0], QUARTERS[2]]))
@@ -0,0 +1,51 @@
+import pandas as pd
+import pytest
+
+# Pre-hash codes with their QUMI Codes as published
+GOLDEN_CODES = {
+    "10147CREAM30000.0": "20b00ac",
+    "10291IRRIGATION117000.0": "9vxw1f1",
+    "10308INJECTABLE5000.0": "qz7zked",
+    "10198INJECTABLE312.5AMPULE": "18c4wcf",
+    "10199INJECTABLE125.0SYRINGEsolu-medrol": "8mds7fc",
+    "10101INJECTABLE2500.0; 2.5": "gd78k9k",
+    "nanTABLET10": "j7zttfq",
+    "": "8twxtar",
+}
+
+# 40-bit hashes with their encodings, including the short codes of small values and the truncation of long ones
+GOLDEN_ENCODINGS = {
+    0: "0",
+    1: "1",
+    31: "z",
+    32: "10",
+    2**35 - 1: "zzzzzzz",
+    2**35: "1000000",
+    0x123456789A: "28t5cy4",
+    2**40 - 1: "zzzzzzz",
+}
+
+
+@pytest.mark.parametrize("generic_code_plus, expected", GOLDEN_CODES.items())
+def test_qumi_code_golden(qumi_codes, generic_code_plus, expected):
+    assert qumi_codes.get_qsrx_code_from_gcp(generic_code_plus) == expected
+
+
+def test_qumi_codes_golden(qumi_codes):
+    generic_codes_plus = pd.Series(list(GOLDEN_CODES) * 2, index=range(10, 10 + 2 * len(GOLDEN_CODES)))
+    codes, collisions = qumi_codes.get_qsrx_codes_from_gcps(generic_codes_plus)
+    assert codes.tolist() == list(GOLDEN_CODES.values()) * 2
+    assert codes.index.equals(generic_codes_plus.index)
+    assert collisions.empty
+
+
+@pytest.mark.parametrize("gcp_int, expected", GOLDEN_ENCODINGS.items())
+def test_encoding_golden(qumi_codes, gcp_int, expected):
+    assert qumi_codes.encode_custom_alphanumeric(f"{gcp_int:x}") == expected
+    assert qumi_codes.encode_custom_alphanumeric_array([gcp_int]).tolist() == [expected]
+
+
+def test_encoding_array_matches_per_value(qumi_codes):
+    gcp_ints = list(GOLDEN_ENCODINGS) + [7**k for k in range(15)] + [2**40 - 32**k for k in range(1, 8)]
+    expected = [qumi_codes.encode_custom_alphanumeric(f"{gcp_int:x}") for gcp_int in gcp_ints]
+    assert qumi_codes.encode_custom_alphanumeric_array(gcp_ints).tolist() == expected
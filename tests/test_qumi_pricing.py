@@ -0,0 +1,73 @@
+import logging
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.common.logger_config import logger
+from src.medicare_part_b.qumi_pricing import ndc_pricing, qumi_pricing
+
+CODES = pd.DataFrame(
+    {
+        "NDC": ["00001-0001-01", "00001-0001-02", "00001-0001-03", "00002-0002-01", "1234-5678-9"],
+        "QUMI Code": ["q100000", "q100000", "q100000", "q200000", "q300000"],
+    }
+)
+# The first QUMI Code has two NDCs costing the same per unit, listed cheaper NDC last, plus a pair with no Pkg Size.
+# The second only has a pair with no package amount, and the last NDC is the 12-digit one of the bundled merged CSV
+PRICING = pd.DataFrame(
+    {
+        "HCPCS Code": ["J0001", "J0002", "J0001", "J0003", "J0004"],
+        "NDC": ["00001-0001-02", "00001-0001-02", "00001000101", "00002-0002-01", "888867413689"],
+        "Pkg Size": [5.0, 0.0, 10.0, 0.0, 1.0],
+        "Pkg Qty": [4, 1, 2, 0, 1],
+        "BUPP": [8.0, 1.0, 4.0, 2.0, 1.0],
+        "ASP": [1.25, 3.0, 2.5, 1.0, 9.0],
+        "Effective Start Date": ["2024-01-01", "2024-04-01", "2024-01-01", "2024-01-01", "2024-01-01"],
+    }
+)
+
+
+@pytest.fixture
+def warnings(caplog):
+    logger.addHandler(caplog.handler)
+    yield caplog
+    logger.removeHandler(caplog.handler)
+
+
+def test_ndc_pricing_golden(warnings):
+    priced = ndc_pricing(CODES, PRICING)
+    assert priced[["NDC", "HCPCS Code", "Package Cost"]].values.tolist() == [
+        ["00001-0001-01", "J0001", 10.0],
+        ["00001-0001-02", "J0001", 10.0],
+        ["00001-0001-02", "J0002", 3.0],
+        ["00002-0002-01", "J0003", 2.0],
+    ]
+    assert priced["QUMI Code"].tolist() == ["q100000", "q100000", "q100000", "q200000"]
+    np.testing.assert_array_equal(priced["Unit Cost"].to_numpy(), [0.5, 0.5, np.nan, np.nan])
+    skipped = [record.getMessage() for record in warnings.records if record.levelno == logging.WARNING]
+    assert skipped == [
+        "Skipping 1 QUMI Code row(s) whose NDC does not have 11 digits. Example(s): 1234-5678-9",
+        "Skipping 1 Medicare pricing row(s) whose NDC does not have 11 digits. Example(s): 888867413689",
+    ]
+
+
+def test_qumi_pricing_golden():
+    aggregates = qumi_pricing(CODES, ndc_pricing(CODES, PRICING)).set_index("qumi_code")
+    assert aggregates.index.tolist() == ["q100000", "q200000"]
+    assert aggregates.loc["q100000"].to_dict() == {
+        "ndc_count": 3,
+        "priced_ndc_count": 2,
+        "hcpcs_count": 2,
+        "min_asp": 1.25,
+        "median_asp": 2.5,
+        "min_package_cost": 3.0,
+        "median_package_cost": 10.0,
+        "min_unit_cost": 0.5,
+        "lowest_cost_ndc": "00001-0001-01",
+        "effective_start": "2024-04-01",
+    }
+    q2 = aggregates.loc["q200000"]
+    assert (q2["ndc_count"], q2["priced_ndc_count"], q2["min_package_cost"]) == (1, 1, 2.0)
+    assert np.isnan(q2["min_unit_cost"])
+    assert q2["lowest_cost_ndc"] == "00002-0002-01"
@@ -0,0 +1,58 @@
+from src.benchmarks.run_benchmarks import compare, timings
+
+
+def result(generate, medicare, merge, output_sha256="aaaa"):
+    return {
+        "ndcs": 1000,
+        "commit": "abc1234",
+        "timestamp": "2024-01-01T00:00:00+00:00",
+        "stages": [
+            {"stage": "format", "wall_seconds": 0.5},
+            {"stage": "hash", "wall_seconds": 0.25},
+            {"stage": "hash", "wall_seconds": 0.25},
+        ],
+        "generate_seconds": generate,
+        "output_sha256": output_sha256,
+        "medicare_merge_seconds": medicare,
+        "medicare_stages": [
+            {"stage": "load", "wall_seconds": 0.5},
+            {"stage": "merge", "wall_seconds": merge},
+            {"stage": "write", "wall_seconds": 0.25},
+        ],
+        "medicare_output_sha256": "bbbb",
+    }
+
+
+def test_timings_keeps_the_medicare_total_apart_from_its_merge_stage():
+    assert timings(result(2.0, 0.885, 0.041)) == {
+        "generate": 2.0,
+        "medicare total": 0.885,
+        "stage format": 0.5,
+        "stage hash": 0.5,
+        "medicare stage load": 0.5,
+        "medicare stage merge": 0.041,
+        "medicare stage write": 0.25,
+    }
+
+
+def test_compare():
+    lines, unchanged = compare(result(2.0, 1.0, 0.5), result(1.0, 1.0, 0.25), threshold=0.1)
+    assert unchanged
+    assert lines == [
+        "1000 NDCs, compared with abc1234 (2024-01-01T00:00:00+00:00):",
+        "  generate: 1.000s -> 2.000s (2.00x) SLOWER",
+        "  medicare total: 1.000s -> 1.000s (1.00x)",
+        "  stage format: 0.500s -> 0.500s (1.00x)",
+        "  stage hash: 0.500s -> 0.500s (1.00x)",
+        "  medicare stage load: 0.500s -> 0.500s (1.00x)",
+        "  medicare stage merge: 0.250s -> 0.500s (2.00x) SLOWER",
+        "  medicare stage write: 0.250s -> 0.250s (1.00x)",
+        "  Outputs unchanged",
+    ]
+
+
+def test_compare_flags_changed_outputs():
+    lines, unchanged = compare(result(1.0, 1.0, 0.25, "cccc"), result(2.0, 1.0, 0.25))
+    assert not unchanged
+    assert lines[1] == "  generate: 2.000s -> 1.000s (0.50x) faster"
+    assert lines[-1] == "  QUMI Codes output CHANGED"
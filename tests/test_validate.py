@@ -0,0 +1,46 @@
+import pandas as pd
+
+COLUMNS = ["NDC", "QUMI Code", "Description", "Strength", "Measure"]
+REFERENCE = pd.DataFrame(
+    [
+        ["00001-0001-01", "aaaaaaa", "Same 10 mg Tablet", "10", "mg/"],
+        ["00002-0002-02", "bbbbbbb", "Old 5 mg Tablet", "5", "mg/"],
+        ["00003-0003-03", "ccccccc", "Renamed 1 mg Tablet", "1", "mg/"],
+        ["00004-0004-04", "ddddddd", "Dropped 2 mg Capsule", "2", "mg/"],
+        ["00005-0005-05", "eeeeeee", None, "3", "mg/"],
+        ["00007-0007-07", "ggggggg", None, "4", "mg/"],
+    ],
+    columns=COLUMNS,
+    dtype=object,
+)
+NEW = pd.DataFrame(
+    [
+        ["00001-0001-01", "aaaaaaa", "Same 10 mg Tablet", "10", "mg/"],
+        ["00002-0002-02", "bbbbbbc", "Old 5 mg Tablet", "5", "mg/"],
+        ["00003-0003-03", "ccccccc", "Renamed 1 mg Oral Tablet", "1", "mg/"],
+        ["00005-0005-05", "eeeeeee", None, "3", "mg/"],
+        ["00006-0006-06", "fffffff", "Added 7 mg/mL Vial", "7", "mg/mL"],
+        ["00007-0007-07", "ggggggg", "Described 4 mg Tablet", "4", "mg/"],
+    ],
+    columns=COLUMNS,
+    dtype=object,
+)
+
+# The summary as validation has always printed it, where new and deprecated NDCs also get a description line and a
+# missing description never equals another
+SUMMARY = [
+    "00002-0002-02:\tbbbbbbb -> bbbbbbc\tOld 5 mg Tablet \t5 mg/",
+    "00003-0003-03:\tRenamed 1 mg Tablet -> Renamed 1 mg Oral Tablet",
+    "00004-0004-04:\tddddddd -> NDC deprecated\tDropped 2 mg Capsule \t2 mg/",
+    "00004-0004-04:\tDropped 2 mg Capsule -> nan",
+    "00005-0005-05:\tnan -> nan",
+    "00006-0006-06:\tNew NDC -> fffffff\tAdded 7 mg/mL Vial \t7 mg/mL",
+    "00006-0006-06:\tnan -> Added 7 mg/mL Vial",
+    "00007-0007-07:\tnan -> Described 4 mg Tablet",
+]
+
+
+def test_diff_summary_golden(qumi_codes):
+    changes, counts = qumi_codes.diff_releases(NEW, REFERENCE)
+    assert qumi_codes.diff_summary(changes) == SUMMARY
+    assert counts == {"new": 1, "deprecated": 1, "code_changed": 1, "description_changed": 5}
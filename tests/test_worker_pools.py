@@ -0,0 +1,24 @@
+import multiprocessing
+
+import pandas as pd
+
+from src.qumi_codes import api
+
+VALUES = pd.Series(["a", "b", None, "d", "e", "f", "g", "h"])
+
+
+def test_pools_outside_a_run_are_shut_down():
+    pipeline = api.load_pipeline()
+    assert pipeline.apply_rows(VALUES, pipeline.as_text, workers=2).tolist() == VALUES.fillna("nan").tolist()
+    assert multiprocessing.active_children() == []
+
+
+def test_run_pools_are_shared_and_shut_down_when_the_run_ends():
+    pipeline = api.load_pipeline()
+    with pipeline.worker_pools():
+        pipeline.apply_rows(VALUES, pipeline.as_text, workers=2)
+        children = multiprocessing.active_children()
+        with pipeline.worker_pools():
+            pipeline.apply_rows(VALUES, pipeline.as_text, workers=2)
+        assert multiprocessing.active_children() == children != []
+    assert multiprocessing.active_children() == []